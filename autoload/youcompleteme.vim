@@ -35,6 +35,8 @@ let s:completion_stopped = 0
 " These two variables are initialized in youcompleteme#Enable.
 let s:default_completion = {}
 let s:completion = s:default_completion
+" Index of the item selected in the completion menu, -1 if none.
+let s:last_selected_completion = -1
 let s:default_signature_help = {}
 let s:signature_help = s:default_completion
 let s:previous_allowed_buffer_number = 0
@@ -73,6 +75,20 @@ let s:pollers = {
       \     'wait_milliseconds': 100,
       \   },
       \ }
+" Pollers whose timers are fired as soon as a request is done when Vim is
+" connected to the wakeup channel. Their timers are then only a fallback and use
+" the longer s:wakeup_fallback_milliseconds delay.
+let s:wakeup_pollers = [
+      \   'completion',
+      \   'signature_help',
+      \   'file_parse_response',
+      \   'command',
+      \   'semantic_highlighting',
+      \   'inlay_hints',
+      \ ]
+let s:wakeup_fallback_milliseconds = 1000
+" Delays of the pollers before the wakeup channel was opened.
+let s:polling_milliseconds = {}
 let s:buftype_blacklist = {
       \   'help': 1,
       \   'terminal': 1,
@@ -182,6 +198,7 @@ function! youcompleteme#Enable()
   endif
 
   call s:SetUpOptions()
+  call s:SetUpWakeupChannel()
 
   py3 ycm_semantic_highlighting.Initialise()
   let s:enable_inlay_hints = py3eval( 'ycm_inlay_hints.Initialise()' ) ? 1 : 0
@@ -198,9 +215,25 @@ function! youcompleteme#Enable()
     " filetype) and if so, the FileType event has triggered before and thus the
     " buffer is already parsed.
     autocmd BufWritePost,FileWritePost * call s:OnFileSave()
+    " Must be defined before the FileType autocommand below so that the new
+    " filetype is sent to the server.
+    autocmd BufUnload,BufWipeout,FileType * call s:InvalidateBufferData()
     autocmd FileType * call s:OnFileTypeSet()
     autocmd BufEnter,CmdwinEnter,WinEnter * call s:OnBufferEnter()
     autocmd BufUnload * call s:OnBufferUnload()
+    if exists( '##BufModifiedSet' )
+      " Keep track of the modified buffers instead of checking all of them on
+      " each request.
+      py3 vimsupport.TrackModifiedBuffers()
+      autocmd BufModifiedSet * call s:OnBufferModifiedSet( v:true )
+      " The changes of an unloaded buffer are lost.
+      autocmd BufUnload,BufWipeout * call s:OnBufferModifiedSet( v:false )
+    endif
+    " Cache the buffer numbers of the files in diagnostics and the like. BufNew
+    " is used instead of BufAdd since the latter is not triggered for unlisted
+    " buffers.
+    py3 vimsupport.TrackBufferNumbers()
+    autocmd BufNew,BufFilePost,BufWipeout * call s:InvalidateBufferNumber()
     autocmd InsertLeave * call s:OnInsertLeave()
     autocmd VimLeave * call s:OnVimLeave()
     autocmd CompleteDone * call s:OnCompleteDone()
@@ -242,6 +275,7 @@ function! youcompleteme#EnableCursorMovedAutocommands()
     autocmd TextChangedI * call s:OnTextChangedInsertMode( v:false )
     autocmd TextChangedP * call s:OnTextChangedInsertMode( v:true )
     autocmd InsertCharPre * call s:OnInsertChar()
+    autocmd CursorHoldI * call s:OnCursorHoldInsertMode()
     if exists( '##WinScrolled' )
       autocmd WinScrolled * call s:OnWinScrolled()
     endif
@@ -651,6 +685,66 @@ function! s:EnableCompletingInCurrentBuffer()
 endfunction
 
 
+function! s:SetUpWakeupChannel()
+  if s:is_neovim || !exists( '*ch_open' )
+    return
+  endif
+
+  let wakeup_channel = py3eval( 'ycm_state.OpenWakeupChannel()' )
+  if empty( wakeup_channel )
+    return
+  endif
+
+  let channel = ch_open( wakeup_channel.address, {
+        \   'mode': 'raw',
+        \   'waittime': 1000,
+        \   'callback': function( 's:OnWakeup' ),
+        \   'close_cb': function( 's:OnWakeupChannelClosed' ),
+        \ } )
+  if ch_status( channel ) !=# 'open'
+    py3 ycm_state.CloseWakeupChannel()
+    return
+  endif
+
+  call ch_sendraw( channel, wakeup_channel.token . "\n" )
+  if !py3eval( 'ycm_state.AcceptWakeupChannel()' )
+    call ch_close( channel )
+    return
+  endif
+
+  for poller in s:wakeup_pollers
+    let s:polling_milliseconds[ poller ] = s:pollers[ poller ].wait_milliseconds
+    let s:pollers[ poller ].wait_milliseconds = s:wakeup_fallback_milliseconds
+  endfor
+endfunction
+
+
+function! s:OnWakeup( channel, message )
+  " A request is done. Fire the timers of the pollers now instead of waiting for
+  " them to expire.
+  for poller in s:wakeup_pollers
+    let timer_id = s:pollers[ poller ].id
+    if timer_id < 0
+      continue
+    endif
+    let timer = timer_info( timer_id )
+    if empty( timer )
+      continue
+    endif
+    call s:StopPoller( s:pollers[ poller ] )
+    call call( timer[ 0 ].callback, [ timer_id ] )
+  endfor
+endfunction
+
+
+function! s:OnWakeupChannelClosed( channel )
+  for [ poller, wait_milliseconds ] in items( s:polling_milliseconds )
+    let s:pollers[ poller ].wait_milliseconds = wait_milliseconds
+  endfor
+  let s:polling_milliseconds = {}
+endfunction
+
+
 function s:StopPoller( poller ) abort
   call timer_stop( a:poller.id )
   let a:poller.id = -1
@@ -689,10 +783,39 @@ function! s:OnCompleteChanged()
     call s:ResolveCompletionItem( v:event.completed_item )
   endif
 
+  call s:ShowNextCompletionPageIfNeeded( v:event.size )
   call s:UpdateSignatureHelp()
 endfunction
 
 
+function! s:ShowNextCompletionPageIfNeeded( size )
+  " The server may only have returned a page of the completions. When the user
+  " scrolls past the end of the menu, show the next one instead of going back
+  " to the original text.
+  let selected = complete_info( [ 'selected' ] ).selected
+  let scrolled_past_end = selected == -1 &&
+        \ s:last_selected_completion == a:size - 1
+  let s:last_selected_completion = selected
+  if !scrolled_past_end
+    return
+  endif
+
+  let complete_mode = complete_info( [ 'mode' ] ).mode
+  if complete_mode !=# 'eval' && complete_mode !=# 'function'
+    return
+  endif
+
+  if py3eval( 'ycm_state.ShowNextCompletionPage()' )
+    " complete() can't be called while the completion menu is being changed.
+    let s:current_cursor_position = getpos( '.' )
+    call s:StopPoller( s:pollers.completion )
+    let s:pollers.completion.id = timer_start(
+          \ 0,
+          \ function( 's:PollCompletion' ) )
+  endif
+endfunction
+
+
 function! s:ResolveCompletionItem( item )
   if s:resolve_completions != s:RESOLVE_ON_DEMAND
     return
@@ -709,6 +832,11 @@ function! s:ResolveCompletionItem( item )
   else
     call s:ShowInfoPopup( a:item )
   endif
+
+  " The items around the selected one are likely to be selected next.
+  let selected = complete_info( [ 'selected' ] ).selected
+  py3 ycm_state.ResolveCompletionItemsAhead(
+        \ vimsupport.GetIntValue( 'selected' ) )
 endfunction
 
 
@@ -811,8 +939,37 @@ function! s:OnBufferUnload()
 endfunction
 
 
+function! s:OnBufferModifiedSet( loaded )
+  let buffer_number = str2nr( expand( '<abuf>' ) )
+  let modified = a:loaded && getbufvar( buffer_number, '&modified' )
+  py3 vimsupport.SetBufferModified(
+        \ vimsupport.GetIntValue( 'buffer_number' ),
+        \ vimsupport.GetBoolValue( 'modified' ) )
+endfunction
+
+
+function! s:InvalidateBufferNumber()
+  let buffer_number = str2nr( expand( '<abuf>' ) )
+  py3 vimsupport.InvalidateBufferNumber(
+        \ vimsupport.GetIntValue( 'buffer_number' ) )
+endfunction
+
+
+function! s:InvalidateBufferData()
+  let buffer_number = str2nr( expand( '<abuf>' ) )
+  py3 vimsupport.InvalidateBufferData(
+        \ vimsupport.GetIntValue( 'buffer_number' ) )
+endfunction
+
+
 function! s:PollServerReady( timer_id )
   if !py3eval( 'ycm_state.IsServerAlive()' )
+    if py3eval( 'ycm_state.RestartServerOverTcpIfNeeded()' )
+      let s:pollers.server_ready.id = timer_start(
+            \ s:pollers.server_ready.wait_milliseconds,
+            \ function( 's:PollServerReady' ) )
+      return
+    endif
     py3 ycm_state.NotifyUserIfServerCrashed()
     " Server crashed. Don't poll it again.
     return
@@ -1001,6 +1158,7 @@ function! s:OnWinScrolled()
   let bufnr = winbufnr( expand( '<afile>' ) )
   call s:UpdateSemanticHighlighting( bufnr, 0, 0 )
   call s:UpdateInlayHints( bufnr, 0, 0 )
+  py3 ycm_state.Buffer( vimsupport.GetIntValue( 'bufnr' ) ).OnWinScrolled()
 endfunction
 
 
@@ -1049,6 +1207,9 @@ function! s:OnTextChangedInsertMode( popup_is_visible )
         \ !s:OnBlankLine()
     call s:RequestCompletion()
     call s:RequestSignatureHelp()
+    if g:ycm_speculative_completion
+      py3 ycm_state.SendSpeculativeCompletionRequest()
+    endif
   endif
 
   py3 ycm_state.OnCursorMoved()
@@ -1059,6 +1220,20 @@ function! s:OnTextChangedInsertMode( popup_is_visible )
 endfunction
 
 
+function! s:OnCursorHoldInsertMode()
+  if !s:AllowedToCompleteInCurrentBuffer()
+    return
+  endif
+
+  if g:ycm_speculative_completion &&
+        \ get( b:, 'ycm_completing' ) &&
+        \ !pumvisible() &&
+        \ !s:InsideCommentOrStringAndShouldStop()
+    py3 ycm_state.SendSpeculativeCompletionRequest( idle = True )
+  endif
+endfunction
+
+
 function! s:OnInsertEnter() abort
   let s:current_cursor_position = getpos( '.' )
   py3 ycm_state.OnInsertEnter()
@@ -1258,6 +1433,9 @@ function! s:PollCompletion( ... )
   let s:completion = py3eval( 'ycm_state.GetCompletionResponse()' )
   if s:current_cursor_position == getpos( '.' )
     call s:Complete()
+    if s:resolve_completions == s:RESOLVE_ON_DEMAND
+      py3 ycm_state.ResolveCompletionItemsAhead()
+    endif
   endif
 endfunction
 
@@ -1356,6 +1534,7 @@ function! s:Complete()
           \ col( '.' ) - s:completion.column
   endif
   if len( s:completion.completions )
+    let s:last_selected_completion = -1
     let old_completeopt = &completeopt
     set completeopt+=noselect
     call complete( s:completion.completion_start_column,
@@ -1496,15 +1675,17 @@ function! youcompleteme#GetCommandResponseAsync( callback, ... ) abort
 endfunction
 
 
+" Returns the id of the request, which can be passed to
+" youcompleteme#CancelCommandRequest, or -1 if no request was sent.
 function! youcompleteme#GetRawCommandResponseAsync( callback, ... ) abort
   if !s:AllowedToCompleteInCurrentBuffer()
     eval a:callback( { 'error': 'ycm not allowed in buffer' } )
-    return
+    return -1
   endif
 
   if !get( b:, 'ycm_completing' )
     eval a:callback( { 'error': 'ycm disabled in buffer' } )
-    return
+    return -1
   endif
 
   let request_id = py3eval(
@@ -1519,6 +1700,18 @@ function! youcompleteme#GetRawCommandResponseAsync( callback, ... ) abort
     let s:pollers.command.id = timer_start( s:pollers.command.wait_milliseconds,
                                           \ function( 's:PollCommands' ) )
   endif
+  return request_id
+endfunction
+
+
+" Cancel a request sent by youcompleteme#GetRawCommandResponseAsync. Its
+" callback is not called.
+function! youcompleteme#CancelCommandRequest( request_id ) abort
+  if has_key( s:pollers.command.requests, a:request_id )
+    call remove( s:pollers.command.requests, a:request_id )
+  endif
+  py3 ycm_state.CancelCommandRequest(
+        \ vimsupport.GetIntValue( 'a:request_id' ) )
 endfunction
 
 
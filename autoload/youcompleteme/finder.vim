@@ -66,13 +66,14 @@ scriptencoding utf-8
 " slightly different steps involved in the process:
 "
 " * for 'document' requests, as soon as the popup is opened, we issue a
-"   GoToDocumentOutline request, storing the results as `raw_results`, then
-"   then immediately start filtering it with filter_and_sort_candidates, storing
-"   the filtered results in `results`
+"   GoToDocumentOutline request, storing the results as `raw_results` and in a
+"   Python-side index referenced by its id in `index`, then immediately start
+"   filtering the index, storing the filtered results in `results`
 " * for 'workspace' requests, as soon as the popup is opened, we issue a
 "   GoToSymbol request with an empty query. This usually returns nothing, but if
 "   any servers return anything then it would be stored in 'results'. As the
-"   user types, we repeat the GoToSymbol request and update the 'results'
+"   user types, we repeat the GoToSymbol request, add the results of each
+"   filetype to a new index as they arrive, and update the 'results'
 "
 " In order to simplify the re-query code, we put the function used to filter
 " results in the state variable as 'query_func'.
@@ -93,13 +94,14 @@ scriptencoding utf-8
 "  - RequestDocumentSymbols - perform the GoToDocumentOutline request and store
 "    the results in 'raw_results'
 "
-"  - SearchDocument - perform filter_and_sort_candidates request on the
-"    'raw_results', and store the results in 'results', then call
+"  - SearchDocument - filter the symbols of the 'index', and store the results
+"    in 'results', then call
 "    "HandleSymbolSearchResults"
 "
 "  - SearchWorkspace - perform GoToSymbol request for all open filetypes,
 "     and store the results in 'raw_results' as a dict mapping
-"     filetype->results. Merge the results in to 'results', then call
+"     filetype->results. Merge the results in to the 'index' and filter it to
+"     get the 'results', then call
 "     "HandleSymbolSearchResults"
 "
 "  - HandleSymbolSearchResults - redraw the popup with the 'results'
@@ -174,8 +176,9 @@ function! youcompleteme#finder#FindSymbol( scope ) abort
         \ 'query': '',
         \ 'results': [],
         \ 'raw_results': v:none,
+        \ 'index': -1,
         \ 'all_filetypes': v:true,
-        \ 'pending': [],
+        \ 'requests': {},
         \ 'winid': win_getid(),
         \ 'bufnr': bufnr(),
         \ 'prompt_bufnr': -1,
@@ -401,7 +404,9 @@ function! s:PopupClosed( id, selected ) abort
   endif
 
 
+  call s:CancelRequests()
   call s:EndRequest()
+  call s:DeleteIndex()
   let s:find_symbol_status.id = -1
 endfunction
 
@@ -656,6 +661,28 @@ function! s:EndRequest() abort
   call s:SetTitle()
 endfunction
 
+" Replace the Python-side index of the symbols with an empty one
+function! s:ResetIndex() abort
+  call s:DeleteIndex()
+  let s:find_symbol_status.index = py3eval( 'ycm_state.CreateSymbolIndex()' )
+endfunction
+
+function! s:DeleteIndex() abort
+  if s:find_symbol_status.index >= 0
+    py3 ycm_state.DeleteSymbolIndex(
+          \ int( vim.eval( 's:find_symbol_status.index' ) ) )
+    let s:find_symbol_status.index = -1
+  endif
+endfunction
+
+" Cancel the requests whose results are no longer needed
+function! s:CancelRequests() abort
+  for request_id in values( s:find_symbol_status.requests )
+    call youcompleteme#CancelCommandRequest( request_id )
+  endfor
+  let s:find_symbol_status.requests = {}
+endfunction
+
 function! s:TickSpinner( timer_id ) abort
   let s:find_symbol_status.spinner = ( s:find_symbol_status.spinner + 1 ) %
         \ len( s:icon_spinner )
@@ -671,91 +698,70 @@ endfunction
 " Workspace search {{{
 
 function! s:SearchWorkspace( query, new_query ) abort
+  if !a:new_query
+    return
+  endif
 
-  if a:new_query
-    if s:find_symbol_status.raw_results is# v:none
-      let raw_results = {}
-    else
-      let raw_results = copy( s:find_symbol_status.raw_results )
-    endif
+  " The requests for the previous query are superseded by the new ones
+  call s:CancelRequests()
+  let s:find_symbol_status.raw_results = {}
+  call s:ResetIndex()
 
-    let s:find_symbol_status.raw_results = {}
-    " FIXME: We might still get results for any pending results. There is no
-    " cancellation mechanism implemented for the async request!
-    let s:find_symbol_status.pending = []
+  if s:find_symbol_status.all_filetypes
+    let ft_buffer_map = py3eval( 'vimsupport.AllOpenedFiletypes()' )
+  else
+    let current_filetypes = py3eval( 'vimsupport.CurrentFiletypes()' )
+    let ft_buffer_map = {}
+    for ft in current_filetypes
+      let ft_buffer_map[ ft ] = [ bufnr() ]
+    endfor
+  endif
 
-    if s:find_symbol_status.all_filetypes
-      let ft_buffer_map = py3eval( 'vimsupport.AllOpenedFiletypes()' )
-    else
-      let current_filetypes = py3eval( 'vimsupport.CurrentFiletypes()' )
-      let ft_buffer_map = {}
-      for ft in current_filetypes
-        let ft_buffer_map[ ft ] = [ bufnr() ]
-      endfor
+  for ft in keys( ft_buffer_map )
+    if !youcompleteme#filetypes#AllowedForFiletype( ft )
+      continue
     endif
 
-    for ft in keys( ft_buffer_map )
-      if !youcompleteme#filetypes#AllowedForFiletype( ft )
-        continue
-      endif
-
-      let s:find_symbol_status.raw_results[ ft ] = v:none
-      if has_key( raw_results, ft ) && raw_results[ ft ] is# v:none
-        call add( s:find_symbol_status.pending,
-                \ [ ft, ft_buffer_map[ ft ][ 0 ] ] )
-      else
-        call youcompleteme#GetRawCommandResponseAsync(
-              \ function( 's:HandleWorkspaceSymbols', [ ft ] ),
-              \ 'GoToSymbol',
-              \ '--bufnr=' . ft_buffer_map[ ft ][ 0 ],
-              \ 'ft=' . ft,
-              \ a:query )
-      endif
-    endfor
+    let s:find_symbol_status.raw_results[ ft ] = v:none
+    let s:find_symbol_status.requests[ ft ] =
+          \ youcompleteme#GetRawCommandResponseAsync(
+          \   function( 's:HandleWorkspaceSymbols', [ ft ] ),
+          \   'GoToSymbol',
+          \   '--bufnr=' . ft_buffer_map[ ft ][ 0 ],
+          \   'ft=' . ft,
+          \   a:query )
+  endfor
 
-    if !empty( s:find_symbol_status.raw_results )
-      " We sent some requests
-      call s:StartRequest()
-    endif
-  else
-    " Just requery those completer filetypes that we're not currently waiting
-    " for
-    for [ ft, bufnr ] in copy( s:find_symbol_status.pending )
-      if s:find_symbol_status.raw_results[ ft ] isnot# v:none
-        call filter( s:find_symbol_status.pending, { v -> v !=# ft } )
-        let s:find_symbol_status.raw_results[ ft ] = v:none
-        call youcompleteme#GetRawCommandResponseAsync(
-              \ function( 's:HandleWorkspaceSymbols', [ ft ] ),
-              \ 'GoToSymbol',
-              \ '--bufnr=' . bufnr,
-              \ 'ft=' . ft,
-              \ a:query )
-      endif
-    endfor
+  if !empty( s:find_symbol_status.raw_results )
+    " We sent some requests
+    call s:StartRequest()
   endif
 endfunction
 
 
 function! s:HandleWorkspaceSymbols( filetype, results ) abort
+  let results = s:ParseGoToResponse( a:filetype, a:results )
+  let s:find_symbol_status.raw_results[ a:filetype ] = results
 
-  let s:find_symbol_status.raw_results[ a:filetype ] =
-        \ s:ParseGoToResponse( a:filetype, a:results )
+  " Merge the results of this filetype with the ones already received
+  py3 ycm_state.AddToSymbolIndex(
+        \ int( vim.eval( 's:find_symbol_status.index' ) ),
+        \ vim.eval( 'results' ) )
 
-  " Collate the results from each filetype
-  let results = []
   let waiting = 0
   for ft in keys( s:find_symbol_status.raw_results )
     if s:find_symbol_status.raw_results[ ft ] is v:none
       let waiting = 1
-      continue
+      break
     endif
-
-    call extend( results, s:find_symbol_status.raw_results[ ft ] )
   endfor
 
   let query = s:find_symbol_status.query
 
-  if g:ycm_refilter_workspace_symbols && !empty( results )
+  if !g:ycm_refilter_workspace_symbols
+    let results = py3eval( 'ycm_state.GetSymbolIndexItems( '
+          \ . 'int( vim.eval( "s:find_symbol_status.index" ) ) )' )
+  else
     " This is kinda wonky, but seems to work well enough.
     "
     " We get the server to give us a result set, then use our own
@@ -769,17 +775,16 @@ function! s:HandleWorkspaceSymbols( filetype, results ) abort
     "    "" but not all servers actually do
     "
     " So as a compromise we let the server filter the results, then we
-    " _refilter_ and sort them using ycmd's method. This provides consistency
-    " with the filtering and sorting on the completion popup menu, with the
-    " disadvantage of additional latency.
+    " _refilter_ and sort them using ycmd's method, reimplemented in the client
+    " so that it doesn't cost another round trip. This provides consistency
+    " with the filtering and sorting on the completion popup menu.
     "
     " We're not currently sure this is going to be perfecct, so we have a hidden
     " option to disable this re-filter/sort.
     "
-    let results = py3eval(
-          \ 'ycm_state.FilterAndSortItems( vim.eval( "results" ),'
-          \ .                              ' "key",'
-          \ .                              ' vim.eval( "query" ) )' )
+    let results = py3eval( 'ycm_state.FilterAndSortSymbolIndex( '
+          \ . 'int( vim.eval( "s:find_symbol_status.index" ) ), '
+          \ . 'vim.eval( "query" ) )' )
   endif
 
   if !waiting
@@ -805,12 +810,10 @@ function! s:SearchDocument( query, new_query ) abort
 
   " No spinner, because this is actually a synchronous call
 
-  " Call filter_and_sort_candidates on the results (synchronously)
-  let response = py3eval(
-        \ 'ycm_state.FilterAndSortItems( '
-        \ . ' vim.eval( "s:find_symbol_status.raw_results" ),'
-        \ . ' "key",'
-        \ . ' vim.eval( "a:query" ) )' )
+  " Filter the symbols of the index (synchronously)
+  let response = py3eval( 'ycm_state.FilterAndSortSymbolIndex( '
+        \ . 'int( vim.eval( "s:find_symbol_status.index" ) ), '
+        \ . 'vim.eval( "a:query" ) )' )
 
   eval s:HandleSymbolSearchResults( response )
 endfunction
@@ -826,7 +829,16 @@ endfunction
 
 function! s:HandleDocumentSymbols( results ) abort
   call s:EndRequest()
+  if s:find_symbol_status.id < 0
+    " Popup was closed, ignore this event
+    return
+  endif
+
   let s:find_symbol_status.raw_results = s:ParseGoToResponse( '', a:results )
+  call s:ResetIndex()
+  py3 ycm_state.AddToSymbolIndex(
+        \ int( vim.eval( 's:find_symbol_status.index' ) ),
+        \ vim.eval( 's:find_symbol_status.raw_results' ) )
   call s:SearchDocument( '', v:true )
 endfunction
 
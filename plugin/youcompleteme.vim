@@ -198,6 +198,27 @@ let g:ycm_auto_hover =
 let g:ycm_update_diagnostics_in_insert_mode =
       \ get( g:, 'ycm_update_diagnostics_in_insert_mode', 1 )
 
+let g:ycm_incremental_buffer_sync =
+      \ get( g:, 'ycm_incremental_buffer_sync', 1 )
+
+let g:ycm_server_use_unix_socket =
+      \ get( g:, 'ycm_server_use_unix_socket', 0 )
+
+let g:ycm_server_compression_threshold =
+      \ get( g:, 'ycm_server_compression_threshold', 16384 )
+
+let g:ycm_speculative_completion =
+      \ get( g:, 'ycm_speculative_completion', 0 )
+
+let g:ycm_completion_resolve_ahead =
+      \ get( g:, 'ycm_completion_resolve_ahead', 3 )
+
+let g:ycm_completion_page_size =
+      \ get( g:, 'ycm_completion_page_size', 100 )
+
+let g:ycm_highlight_visible_diagnostics_only =
+      \ get( g:, 'ycm_highlight_visible_diagnostics_only', 0 )
+
 "
 " List of ycmd options.
 "
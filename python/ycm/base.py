@@ -102,33 +102,74 @@ def AdjustCandidateInsertionText( candidates ):
   It could be argued that the user actually wants the final buffer state to be
   'foo.zoobar|' (the cursor at the end), but that would be much more difficult
   to implement and is probably not worth doing.
-  """
 
-  def NewCandidateInsertionText( to_insert, text_after_cursor ):
-    overlap_len = OverlapLength( to_insert, text_after_cursor )
-    if overlap_len:
-      return to_insert[ :-overlap_len ]
-    return to_insert
+  Candidates that don't need to be changed, i.e. those that don't overlap with
+  the text after the cursor and already have an abbreviation, are returned as
+  is, not copied.
+  """
 
   text_after_cursor = vimsupport.TextAfterCursor()
   if not text_after_cursor:
     return candidates
 
+  # The text after the cursor is the same for all candidates so its prefix
+  # function is computed once. Finding the overlap of each candidate is then
+  # linear in the length of the candidate.
+  prefix_function = _PrefixFunction( text_after_cursor )
   new_candidates = []
   for candidate in candidates:
-    new_candidate = candidate.copy()
+    word = candidate[ 'word' ]
+    overlap_len = _OverlapLength( word, text_after_cursor, prefix_function )
+    if not overlap_len and candidate.get( 'abbr' ):
+      new_candidates.append( candidate )
+      continue
 
+    new_candidate = candidate.copy()
     if not new_candidate.get( 'abbr' ):
-      new_candidate[ 'abbr' ] = new_candidate[ 'word' ]
-
-    new_candidate[ 'word' ] = NewCandidateInsertionText(
-      new_candidate[ 'word' ],
-      text_after_cursor )
-
+      new_candidate[ 'abbr' ] = word
+    if overlap_len:
+      new_candidate[ 'word' ] = word[ : -overlap_len ]
     new_candidates.append( new_candidate )
   return new_candidates
 
 
+def _PrefixFunction( string ):
+  """Return the list whose i-th element is the length of the longest proper
+  prefix of string[ : i + 1 ] that is also a suffix of it. See the
+  Knuth-Morris-Pratt algorithm."""
+  prefix_function = [ 0 ] * len( string )
+  length = 0
+  for index in range( 1, len( string ) ):
+    while length and string[ index ] != string[ length ]:
+      length = prefix_function[ length - 1 ]
+    if string[ index ] == string[ length ]:
+      length += 1
+    prefix_function[ index ] = length
+  return prefix_function
+
+
+def _OverlapLength( left_string, right_string, prefix_function ):
+  """Same as OverlapLength with |prefix_function| the prefix function of
+  |right_string|."""
+  right_string_length = len( right_string )
+  # Only the last characters of the left string can overlap. The overlap, if
+  # any, starts with the first character of the right string, which is quickly
+  # found or not.
+  start = left_string.find(
+    right_string[ 0 ], max( len( left_string ) - right_string_length, 0 ) )
+  if start < 0:
+    return 0
+
+  length = 0
+  for character in left_string[ start : ]:
+    while length and ( length == right_string_length or
+                       character != right_string[ length ] ):
+      length = prefix_function[ length - 1 ]
+    if character == right_string[ length ]:
+      length += 1
+  return length
+
+
 def OverlapLength( left_string, right_string ):
   """Returns the length of the overlap between two strings.
   Example: "foo baro" and "baro zoo" -> 4
@@ -119,6 +119,10 @@ class Buffer:
     self._diag_interface.OnCursorMoved()
 
 
+  def OnWinScrolled( self ):
+    self._diag_interface.OnWinScrolled()
+
+
   def GetErrorCount( self ):
     return self._diag_interface.GetErrorCount()
 
@@ -0,0 +1,199 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+import threading
+from collections import OrderedDict
+from ycm import vimsupport
+from ycmd.responses import ServerError
+from ycmd.utils import ToUnicode
+
+# Name of the server capability advertising support for incremental file data.
+INCREMENTAL_FILE_DATA_CAPABILITY = 'incremental_file_data'
+# Number of versions of a file waiting to be acknowledged that are kept. Older
+# ones can't be used as the base of a delta anymore.
+_MAX_PENDING_VERSIONS = 8
+
+
+class FileDataVersionMismatch( ServerError ):
+  """Raised when the server rejects a delta because it doesn't hold the version
+  of the file the delta was computed from."""
+  pass
+
+
+class _FileState:
+  def __init__( self, buffer_number ):
+    self.buffer_number = buffer_number
+    self.changedtick = None
+    # Latest version of the file and its lines.
+    self.version = None
+    self.lines = None
+    # Versions sent but not acknowledged yet, oldest first, with their lines.
+    self.pending_versions = OrderedDict()
+    # Latest version the server is known to hold and its lines.
+    self.acknowledged_version = None
+    self.acknowledged_lines = None
+
+
+class BufferSync:
+  """Keeps track of the contents of each file the server is known to hold so
+  that only the lines changed since then are sent in the file_data part of the
+  requests.
+
+  Each distinct contents of a file gets a new version number. Until the server
+  acknowledged a version of a file, by successfully handling a request that
+  included it, the whole contents are sent as usual along with the version
+  number. Subsequent requests send the range of lines that changed since the
+  last acknowledged version:
+
+    {
+      'filetypes': [ ... ],
+      'version': 3,
+      'base_version': 2,
+      'changes': [ {
+        'start_line': 10,
+        'end_line': 12,
+        'lines': [ ... ]
+      } ]
+    }
+
+  where lines |start_line| (included) to |end_line| (excluded) of the base
+  version, both 0-based, are replaced by |lines|. Since requests may be
+  cancelled before being sent or be sent out of order, the server keeps the
+  recent versions of each file rather than only the latest one. If it doesn't
+  hold |base_version|, it raises a FileDataVersionMismatch exception and the
+  state is reset so that the next request sends the full contents again.
+  Contents sent without a version are only used for the request they are part
+  of and don't replace the versions held by the server.
+
+  Versions are acknowledged from the worker threads so all the methods are
+  thread-safe."""
+
+  def __init__( self ):
+    self._files = {}
+    # Version numbers are never reused, even after a reset, so that a late
+    # acknowledgement can't be mistaken for that of other contents.
+    self._versions = itertools.count( 1 )
+    self._lock = threading.Lock()
+
+
+  def Reset( self ):
+    with self._lock:
+      self._files.clear()
+
+
+  def ForgetBuffer( self, buffer_number ):
+    with self._lock:
+      self._files = { filepath: state
+                      for filepath, state in self._files.items()
+                      if state.buffer_number != buffer_number }
+
+
+  def GetBufferData( self, buffer_object, filepath ):
+    buffer_number = buffer_object.number
+    changedtick = vimsupport.GetBufferChangedTick( buffer_number )
+    filetypes = vimsupport.FiletypesForBuffer( buffer_object )
+
+    with self._lock:
+      state = self._files.get( filepath )
+      if state is None or state.buffer_number != buffer_number:
+        state = self._files[ filepath ] = _FileState( buffer_number )
+
+      if state.changedtick != changedtick:
+        lines = [ ToUnicode( line ) for line in buffer_object[ : ] ]
+        if lines != state.lines:
+          state.version = next( self._versions )
+          state.lines = lines
+          state.pending_versions[ state.version ] = lines
+          if len( state.pending_versions ) > _MAX_PENDING_VERSIONS:
+            state.pending_versions.popitem( last = False )
+        state.changedtick = changedtick
+
+      if state.acknowledged_version is None:
+        return {
+          # Add a newline to match what gets saved to disk. See #1455 for
+          # details.
+          'contents': '\n'.join( state.lines ) + '\n',
+          'filetypes': filetypes,
+          'version': state.version
+        }
+
+      change = _LinesChange( state.acknowledged_lines, state.lines )
+      return {
+        'filetypes': filetypes,
+        'version': state.version,
+        'base_version': state.acknowledged_version,
+        'changes': [ change ] if change else []
+      }
+
+
+  def Acknowledge( self, file_data ):
+    """Record that the server holds the versions of the files in |file_data|,
+    the file data of a request it successfully handled."""
+    with self._lock:
+      for filepath, data in file_data.items():
+        state = self._files.get( filepath )
+        if state is None:
+          continue
+        version = data.get( 'version' )
+        # Versions older than the acknowledged one were already dropped.
+        lines = state.pending_versions.get( version )
+        if lines is None:
+          continue
+        state.acknowledged_version = version
+        state.acknowledged_lines = lines
+        while next( iter( state.pending_versions ) ) != version:
+          state.pending_versions.popitem( last = False )
+        state.pending_versions.popitem( last = False )
+
+
+def FileDataToResend( file_data ):
+  """Return the |file_data| of a request that was already sent, to send it
+  again in another request. Since the server holds the versions produced by its
+  deltas once the first request is handled, they are replaced by empty deltas
+  from these versions."""
+  return { filepath: ( dict( data,
+                             base_version = data[ 'version' ],
+                             changes = [] ) if 'changes' in data else data )
+           for filepath, data in file_data.items() }
+
+
+def _LinesChange( old_lines, new_lines ):
+  """Return the smallest single range of lines in |old_lines| that must be
+  replaced to get |new_lines|, or None if they are identical."""
+  old_length = len( old_lines )
+  new_length = len( new_lines )
+  max_common = min( old_length, new_length )
+
+  start = 0
+  while start < max_common and old_lines[ start ] == new_lines[ start ]:
+    start += 1
+
+  if start == old_length == new_length:
+    return None
+
+  suffix = 0
+  while ( suffix < max_common - start and
+          old_lines[ old_length - suffix - 1 ] ==
+          new_lines[ new_length - suffix - 1 ] ):
+    suffix += 1
+
+  return {
+    'start_line': start,
+    'end_line': old_length - suffix,
+    'lines': new_lines[ start : new_length - suffix ]
+  }
@@ -0,0 +1,224 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Pure Python version of the fuzzy matching and ranking done by ycmd on
+completion candidates, so that candidates already received from the server can
+be filtered again without a round trip."""
+
+import unicodedata
+
+# Versions of the text of a candidate that a query character is matched
+# against. See _QueryCharacter.
+_TEXT, _LOWER, _BASE, _LOWER_BASE = range( 4 )
+
+
+def FilterAndSortCandidates( candidates,
+                             query,
+                             sort_property = 'insertion_text',
+                             max_candidates = 0 ):
+  """Return the |candidates| matching |query| sorted from best to worst match,
+  like the filter_and_sort_candidates handler of ycmd. |sort_property| is the
+  key of the text to match in the candidates if they are dictionaries and is
+  ignored if they are strings. Return at most |max_candidates| candidates if
+  it's positive."""
+  return CandidateIndex( candidates, sort_property ).FilterAndSort(
+    query, max_candidates )
+
+
+class CandidateIndex:
+  """Candidates filtered by successive queries, e.g. as they are typed. The
+  text of each candidate is prepared once and, when a query extends the
+  previous one, only the candidates that matched the previous one are scanned
+  again since the others can't match it either."""
+
+  def __init__( self, candidates, sort_property = 'insertion_text' ):
+    self._candidates = []
+    self._texts = []
+    self._sort_property = sort_property
+    self._query = ''
+    self._matches = []
+    self.Extend( candidates )
+
+
+  def Extend( self, candidates ):
+    """Add |candidates| to the index. They are scanned by the next query."""
+    start = len( self._candidates )
+    self._candidates.extend( candidates )
+    self._texts.extend( _IndexedText( candidate[ self._sort_property ]
+                                      if isinstance( candidate, dict ) else
+                                      candidate )
+                        for candidate in candidates )
+    self._matches = list( self._matches )
+    self._matches.extend( range( start, len( self._candidates ) ) )
+
+
+  def Candidates( self ):
+    """Return all the candidates in the order they were added."""
+    return self._candidates
+
+
+  def FilterAndSort( self, query, max_candidates = 0 ):
+    """Return the candidates matching |query| sorted from best to worst match.
+    See FilterAndSortCandidates."""
+    return [ self._candidates[ index ]
+             for index in self.FilterAndSortIndices( query, max_candidates ) ]
+
+
+  def FilterAndSortIndices( self, query, max_candidates = 0 ):
+    """Same as FilterAndSort but return the indices of the candidates in the
+    order they were added instead."""
+    if not query.startswith( self._query ):
+      self._matches = range( len( self._candidates ) )
+
+    query_characters = [ _QueryCharacter( character ) for character in query ]
+    scored_matches = []
+    for index in self._matches:
+      score = _Score( self._texts[ index ], query, query_characters )
+      if score is not None:
+        scored_matches.append( ( score, index ) )
+    self._query = query
+    self._matches = [ index for _, index in scored_matches ]
+
+    scored_matches.sort( key = lambda scored_match: scored_match[ 0 ] )
+    if max_candidates > 0:
+      del scored_matches[ max_candidates : ]
+    return [ index for _, index in scored_matches ]
+
+
+class _IndexedText:
+  """Text of a candidate along with what is needed to score it."""
+  __slots__ = ( 'text', 'versions', 'tie_breaker', '_word_boundaries' )
+
+  def __init__( self, text ):
+    self.text = text
+    lower = text.lower()
+    # Some characters are lowercased to several ones. They can't match a
+    # lowercase query character anyway.
+    if len( lower ) != len( text ):
+      lower = ''.join( character.lower()
+                       if len( character.lower() ) == 1 else character
+                       for character in text )
+    if text.isascii():
+      base, lower_base = text, lower
+    else:
+      base = ''.join( _BaseCharacter( character ) for character in text )
+      lower_base = ''.join( _BaseCharacter( character ) for character in lower )
+    self.versions = ( text, lower, base, lower_base )
+    is_lowercase = not any( character.isupper() for character in text )
+    self.tie_breaker = ( len( text ), not is_lowercase, text.swapcase() )
+    self._word_boundaries = None
+
+
+  @property
+  def word_boundaries( self ):
+    """Indices of the characters of the text starting a word."""
+    if self._word_boundaries is None:
+      self._word_boundaries = [ index for index in range( len( self.text ) )
+                                if _IsWordBoundary( self.text, index ) ]
+    return self._word_boundaries
+
+
+def _IsWordBoundary( text, index ):
+  """Like ycmd, a character starts a word if it's the first one and isn't a
+  punctuation character, if it's uppercase and the previous one isn't, or if
+  it's a letter and the previous one is a punctuation character."""
+  character = text[ index ]
+  if index == 0:
+    return not _IsPunctuation( character )
+  previous_character = text[ index - 1 ]
+  if character.isupper() and not previous_character.isupper():
+    return True
+  return ( unicodedata.category( character ).startswith( 'L' ) and
+           _IsPunctuation( previous_character ) )
+
+
+def _IsPunctuation( character ):
+  return unicodedata.category( character ).startswith( 'P' )
+
+
+def _BaseCharacter( character ):
+  """Return |character| without its accents, e.g. 'e' for 'é'."""
+  decomposition = unicodedata.normalize( 'NFD', character )
+  if all( unicodedata.combining( mark ) for mark in decomposition[ 1 : ] ):
+    return decomposition[ 0 ]
+  return character
+
+
+def _QueryCharacter( character ):
+  """Return |character| along with the version of the candidate texts it is
+  matched against. Like ycmd, smart case and smart base matching are used:
+    - 'a' matches 'a', 'A', 'á', 'Á', 'â', etc.;
+    - 'A' matches 'A', 'Á', 'Â', etc.;
+    - 'á' matches 'á' and 'Á';
+    - 'Á' only matches 'Á'."""
+  is_base = _BaseCharacter( character ) == character
+  if character.isupper():
+    return ( character, _BASE if is_base else _TEXT )
+  return ( character.lower(), _LOWER_BASE if is_base else _LOWER )
+
+
+def _Score( indexed_text, query, query_characters ):
+  """Return a key sorting the text of |indexed_text| among the others matching
+  |query| or None if it doesn't match. |query_characters| are the characters of
+  |query| returned by _QueryCharacter. All the texts are sorted alphabetically
+  for an empty query.
+  Otherwise, the criteria are those of ycmd in order:
+    - the first character of the query matches the first one of the text;
+    - more characters of the query match word boundaries of the text;
+    - the sum of the indices of the matched characters is lower;
+    - the text is shorter;
+    - the text is lowercase;
+    - the text comes first alphabetically, lowercase before uppercase."""
+  if not query:
+    return ( indexed_text.tie_breaker[ 2 ], )
+
+  index_sum = 0
+  text_index = 0
+  for query_character, version in query_characters:
+    text_index = indexed_text.versions[ version ].find( query_character,
+                                                        text_index )
+    if text_index < 0:
+      return None
+    index_sum += text_index
+    text_index += 1
+
+  first_character, version = query_characters[ 0 ]
+  first_character_differs = (
+    first_character != indexed_text.versions[ version ][ 0 ] )
+  return ( first_character_differs,
+           -_WordBoundaryMatchCount( indexed_text, query_characters ),
+           index_sum ) + indexed_text.tie_breaker
+
+
+def _WordBoundaryMatchCount( indexed_text, query_characters ):
+  """Return the length of the longest common subsequence of the query and the
+  word boundary characters of the text of |indexed_text|, like ycmd does."""
+  word_boundaries = indexed_text.word_boundaries
+  # Lengths of the longest common subsequences of the query characters seen so
+  # far and each prefix of the word boundary characters.
+  lengths = [ 0 ] * ( len( word_boundaries ) + 1 )
+  for query_character, version in query_characters:
+    text = indexed_text.versions[ version ]
+    previous_lengths = lengths
+    lengths = [ 0 ]
+    for boundary, index in enumerate( word_boundaries ):
+      if text[ index ] == query_character:
+        lengths.append( previous_lengths[ boundary ] + 1 )
+      else:
+        lengths.append( max( lengths[ boundary ],
+                             previous_lengths[ boundary + 1 ] ) )
+  return lengths[ -1 ]
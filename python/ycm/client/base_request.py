@@ -15,15 +15,32 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+import gzip
+import hashlib
+import hmac
+import http.client
+import itertools
 import logging
 import json
+import select
+import socket
+import threading
+import time
 import vim
+import zlib
 from base64 import b64decode, b64encode
+from concurrent.futures import CancelledError
 from hmac import compare_digest
+from io import BytesIO
 from urllib.parse import urljoin, urlparse, urlencode
-from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
 from ycm import vimsupport
+from ycm.buffer_sync import FileDataVersionMismatch
+from ycm.unsafe_thread_pool_executor import ( BACKGROUND,
+                                              HOUSEKEEPING,
+                                              INTERACTIVE,
+                                              UnsafeThreadPoolExecutor )
 from ycmd.utils import ToBytes, GetCurrentDirectory, ToUnicode
 from ycmd.hmac_utils import CreateRequestHmac, CreateHmac
 from ycmd.responses import ServerError, UnknownExtraConf
@@ -35,19 +52,390 @@ _CONNECT_TIMEOUT_SEC = 0.01
 # Setting this to None seems to screw up the Requests/urllib3 libs.
 _READ_TIMEOUT_SEC = 30
 _HMAC_HEADER = 'x-ycm-hmac'
+_REQUEST_ID_HEADER = 'x-ycm-request-id'
+# Name of the server capability advertising support for the cancel handler.
+CANCEL_CAPABILITY = 'cancel'
+# Name of the server capability advertising support for gzip-compressed request
+# and response bodies.
+GZIP_CAPABILITY = 'gzip'
+_CONTENT_ENCODING_HEADER = 'content-encoding'
+_ACCEPT_ENCODING_HEADER = 'accept-encoding'
+# JSON compresses nearly as well with the fastest level as with the default one
+# in a fraction of the time.
+_GZIP_COMPRESSION_LEVEL = 1
+# Name of the server capability advertising support for request bodies sent
+# with the chunked transfer encoding and their HMAC in a trailer.
+HMAC_TRAILER_CAPABILITY = 'hmac_trailer'
+# Requests with at least that much file data are serialised while being sent
+# instead of being built in memory first.
+_STREAMING_MIN_FILE_DATA_SIZE = 256 * 1024
+_STREAMING_CHUNK_SIZE = 64 * 1024
 _logger = logging.getLogger( __name__ )
 
 
+class RequestCancelled( CancelledError ):
+  """Raised by the future of a request cancelled while it was running."""
+  pass
+
+
+class _InFlightRequest:
+  """Handle used to abort a request sent by a worker thread. Cancelling it shuts
+  down the connection the request is using, which makes the worker thread
+  stop waiting for the response."""
+
+  _ids = itertools.count( 1 )
+
+  def __init__( self ):
+    self.id = next( _InFlightRequest._ids )
+    self.cancelled = False
+    self._connection = None
+    self._lock = threading.Lock()
+
+
+  def SetConnection( self, connection ):
+    with self._lock:
+      if self.cancelled:
+        raise RequestCancelled()
+      self._connection = connection
+
+
+  def Cancel( self ):
+    with self._lock:
+      self.cancelled = True
+      connection = self._connection
+      self._connection = None
+    if connection is not None and connection.sock is not None:
+      try:
+        connection.sock.shutdown( socket.SHUT_RDWR )
+      except OSError:
+        pass
+
+
+class _SendError( URLError ):
+  """Raised when the request couldn't be sent, as opposed to errors raised while
+  waiting for the response, when the server may have received the request."""
+  pass
+
+
+class _Response:
+  """The part of a server response used by _JsonFromResponse. The body is read
+  as soon as the response arrives, which is required before the connection can
+  be used for the next request."""
+
+  def __init__( self, code, reason, headers, body ):
+    self.code = code
+    self.reason = reason
+    self.headers = headers
+    self._body = body
+
+
+  def read( self ):
+    return self._body
+
+
+  def close( self ):
+    pass
+
+
+class _StreamingRequestBody:
+  """JSON body of a request serialised in chunks of bounded size while it is
+  being sent, optionally gzip-compressed. Its HMAC is computed along the way and
+  sent in a trailer once all the chunks have been sent. The body can be
+  iterated over again if the request has to be retried."""
+
+  TRAILER_NAMES = ( _HMAC_HEADER, )
+
+  def __init__( self, data, method, path, compress ):
+    self._data = data
+    self._method = ToBytes( method )
+    self._path = ToBytes( path )
+    self._compress = compress
+    self._body_hmac = None
+
+
+  def __iter__( self ):
+    hmac_secret = BaseRequest.hmac_secret
+    body_hmac = hmac.new( hmac_secret, digestmod = hashlib.sha256 )
+    compressor = None
+    if self._compress:
+      # A wbits value of 31 produces a gzip stream.
+      compressor = zlib.compressobj( _GZIP_COMPRESSION_LEVEL,
+                                     zlib.DEFLATED,
+                                     31 )
+      uncompressed_size = 0
+      compressed_size = 0
+      compression_time = 0.0
+
+    for chunk in _JsonChunks( self._data ):
+      if compressor:
+        start_time = time.perf_counter()
+        uncompressed_size += len( chunk )
+        chunk = compressor.compress( chunk )
+        compression_time += time.perf_counter() - start_time
+        compressed_size += len( chunk )
+        if not chunk:
+          continue
+      body_hmac.update( chunk )
+      yield chunk
+
+    if compressor:
+      start_time = time.perf_counter()
+      chunk = compressor.flush()
+      compression_time += time.perf_counter() - start_time
+      compressed_size += len( chunk )
+      BaseRequest.request_compression_stats.Record(
+        uncompressed_size, compressed_size, compression_time )
+      body_hmac.update( chunk )
+      yield chunk
+
+    self._body_hmac = body_hmac.digest()
+
+
+  def Trailers( self ):
+    """Return the trailer fields to send after the body."""
+    # Same as CreateRequestHmac but with the HMAC of the body computed
+    # incrementally.
+    hmac_secret = BaseRequest.hmac_secret
+    request_hmac = CreateHmac( b''.join( ( CreateHmac( self._method,
+                                                       hmac_secret ),
+                                           CreateHmac( self._path,
+                                                       hmac_secret ),
+                                           self._body_hmac ) ),
+                               hmac_secret )
+    return { _HMAC_HEADER: b64encode( request_hmac ) }
+
+
+class _CompressionStats:
+  """Sizes of the bodies compressed or decompressed and the time spent doing
+  so. Used to tune the compression threshold."""
+
+  def __init__( self ):
+    self._lock = threading.Lock()
+    self.count = 0
+    self.uncompressed_bytes = 0
+    self.compressed_bytes = 0
+    self.seconds = 0.0
+
+
+  def Record( self, uncompressed_size, compressed_size, seconds ):
+    with self._lock:
+      self.count += 1
+      self.uncompressed_bytes += uncompressed_size
+      self.compressed_bytes += compressed_size
+      self.seconds += seconds
+
+
+  def __str__( self ):
+    ratio = self.uncompressed_bytes / max( self.compressed_bytes, 1 )
+    return ( f'{ self.count } bodies, '
+             f'{ self.uncompressed_bytes } -> { self.compressed_bytes } bytes '
+             f'(ratio { ratio:.1f}), { self.seconds * 1000:.0f} ms' )
+
+
+class _UnixHTTPConnection( http.client.HTTPConnection ):
+  """HTTP connection over the Unix domain socket at |path|."""
+
+  def __init__( self, path, timeout ):
+    super().__init__( 'localhost', timeout = timeout )
+    self._path = path
+
+
+  def connect( self ):
+    sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+    try:
+      sock.settimeout( self.timeout )
+      sock.connect( self._path )
+    except OSError:
+      sock.close()
+      raise
+    self.sock = sock
+
+
+class _ConnectionPool:
+  """Pool of HTTP/1.1 keep-alive connections to ycmd. Each worker thread of the
+  request executor owns at most one connection, which it reuses for all the
+  requests it sends, so that we don't pay for a new socket and TCP handshake on
+  every request."""
+
+  def __init__( self ):
+    self._local = threading.local()
+    self._generation = 0
+    # The counters are updated by all the worker threads.
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+
+  def Reset( self ):
+    """Drop all the pooled connections, e.g. because the server was restarted.
+    Connections are owned by the worker threads so they are actually closed the
+    next time their thread sends a request."""
+    self._generation += 1
+
+
+  def Request( self,
+               method,
+               uri,
+               body,
+               headers,
+               timeout,
+               in_flight_request = None,
+               unix_socket = None ):
+    """Send the request to the server at |uri| or, if |unix_socket| is set, to
+    the server listening on that Unix domain socket."""
+    parsed_uri = urlparse( uri )
+    path = parsed_uri.path
+    if parsed_uri.query:
+      path += f'?{ parsed_uri.query }'
+    address = unix_socket or parsed_uri.netloc
+
+    connection, reused = self._GetConnection( address, unix_socket, timeout )
+    try:
+      return self._Send( connection,
+                         method,
+                         path,
+                         body,
+                         headers,
+                         in_flight_request )
+    except Exception as error:
+      self._CloseConnection()
+      if in_flight_request is not None and in_flight_request.cancelled:
+        raise RequestCancelled() from error
+      if ( not reused or
+           not _IsStaleConnectionError( error ) or
+           not ( isinstance( error, _SendError ) or method == 'GET' ) ):
+        raise
+
+    # The server closed the connection while it was idle in the pool. This
+    # happens when the server is restarted or drops idle connections. Unless
+    # the request is idempotent, it's only sent again if it couldn't be sent in
+    # the first place since otherwise the server may have processed it.
+    _logger.debug( 'Pooled connection to %s was closed, reconnecting',
+                   address )
+    connection, _ = self._GetConnection( address, unix_socket, timeout )
+    try:
+      return self._Send( connection,
+                         method,
+                         path,
+                         body,
+                         headers,
+                         in_flight_request )
+    except Exception as error:
+      self._CloseConnection()
+      if in_flight_request is not None and in_flight_request.cancelled:
+        raise RequestCancelled() from error
+      raise
+
+
+  def _GetConnection( self, address, unix_socket, timeout ):
+    local = self._local
+    connection = getattr( local, 'connection', None )
+    if ( connection is not None and
+         local.address == address and
+         local.generation == self._generation and
+         not _IsConnectionDropped( connection ) ):
+      with self._lock:
+        self.hits += 1
+      connection.timeout = timeout
+      if connection.sock is not None:
+        connection.sock.settimeout( timeout )
+      return connection, True
+
+    self._CloseConnection()
+    with self._lock:
+      self.misses += 1
+    if unix_socket:
+      local.connection = _UnixHTTPConnection( unix_socket, timeout )
+    else:
+      local.connection = http.client.HTTPConnection( address,
+                                                     timeout = timeout )
+    local.address = address
+    local.generation = self._generation
+    return local.connection, False
+
+
+  def _CloseConnection( self ):
+    connection = getattr( self._local, 'connection', None )
+    if connection is not None:
+      connection.close()
+      self._local.connection = None
+
+
+  def _Send( self, connection, method, path, body, headers, in_flight_request ):
+    if in_flight_request is not None:
+      in_flight_request.SetConnection( connection )
+
+    try:
+      if isinstance( body, _StreamingRequestBody ):
+        self._SendChunked( connection, method, path, body, headers )
+      else:
+        connection.request( method, path, body = body, headers = headers )
+    except OSError as error:
+      # Match urlopen, which wraps the errors raised while connecting and
+      # sending the request.
+      raise _SendError( error )
+
+    response = connection.getresponse()
+    response_body = response.read()
+    if in_flight_request is not None:
+      in_flight_request.SetConnection( None )
+    if response.will_close:
+      self._CloseConnection()
+    return _Response( response.status,
+                      response.reason,
+                      response.headers,
+                      response_body )
+
+
+  def _SendChunked( self, connection, method, path, body, headers ):
+    # HTTPConnection can send a chunked body but not the trailer that follows.
+    connection.putrequest( method, path, skip_accept_encoding = True )
+    for header, value in headers.items():
+      connection.putheader( header, value )
+    connection.putheader( 'transfer-encoding', 'chunked' )
+    connection.putheader( 'trailer', ', '.join( body.TRAILER_NAMES ) )
+    connection.endheaders()
+    for chunk in body:
+      connection.send( b'%X\r\n' % len( chunk ) )
+      connection.send( chunk )
+      connection.send( b'\r\n' )
+    trailer = b''.join( ToBytes( f'{ name }: ' ) + ToBytes( value ) + b'\r\n'
+                        for name, value in body.Trailers().items() )
+    connection.send( b'0\r\n' + trailer + b'\r\n' )
+
+
 class BaseRequest:
 
   def __init__( self ):
     self._should_resend = False
+    self._response_future = None
 
 
   def Start( self ):
     pass
 
 
+  def Cancel( self ):
+    """Cancel the request if its response is no longer needed. A request that
+    is still queued is never sent. A request that was sent is aborted by closing
+    its connection and, if the server supports it, the server is told to stop
+    processing it."""
+    future = self._response_future
+    if not future or future.done() or future.cancel():
+      return
+
+    in_flight_request = getattr( future, 'in_flight_request', None )
+    if in_flight_request is None:
+      return
+
+    in_flight_request.Cancel()
+    if CANCEL_CAPABILITY in BaseRequest.server_capabilities:
+      BaseRequest._TalkToHandlerAsync( { 'request_id': in_flight_request.id },
+                                       'cancel',
+                                       'POST',
+                                       priority = BACKGROUND )
+
+
   def Done( self ):
     return True
 
@@ -75,12 +463,21 @@ class BaseRequest:
     try:
       try:
         return _JsonFromFuture( future )
+      except CancelledError:
+        _logger.debug( 'Request was cancelled' )
+        return None
       except UnknownExtraConf as e:
         if vimsupport.Confirm( str( e ) ):
           _LoadExtraConfFile( e.extra_conf_file )
         else:
           _IgnoreExtraConfFile( e.extra_conf_file )
         self._should_resend = True
+      except FileDataVersionMismatch as e:
+        # The server doesn't hold the file contents our delta was computed
+        # from. Send the full contents of all files again.
+        _logger.info( e )
+        BaseRequest.buffer_sync.Reset()
+        self._should_resend = True
     except URLError as e:
       # We don't display this exception to the user since it is likely to happen
       # for each subsequent request (typically if the server crashed) and we
@@ -117,7 +514,7 @@ class BaseRequest:
                                timeout = _READ_TIMEOUT_SEC,
                                payload = None ):
     return BaseRequest._TalkToHandlerAsync(
-        '', handler, 'GET', timeout, payload )
+        '', handler, 'GET', timeout, payload, self.PRIORITY )
 
 
   # This is the blocking version of the method. See below for async.
@@ -132,7 +529,7 @@ class BaseRequest:
                          display_message = True,
                          truncate_message = False ):
     return self.HandleFuture(
-        BaseRequest.PostDataToHandlerAsync( data, handler, timeout ),
+        self.PostDataToHandlerAsync( data, handler, timeout ),
         display_message,
         truncate_message )
 
@@ -140,52 +537,94 @@ class BaseRequest:
   # This returns a future! Use HandleFuture to get the value.
   # |timeout| is num seconds to tolerate no response from server before giving
   # up; see Requests docs for details (we just pass the param along).
-  @staticmethod
-  def PostDataToHandlerAsync( data, handler, timeout = _READ_TIMEOUT_SEC ):
-    return BaseRequest._TalkToHandlerAsync( data, handler, 'POST', timeout )
+  # See _TalkToHandlerAsync for the |on_response| parameter.
+  @classmethod
+  def PostDataToHandlerAsync( cls,
+                              data,
+                              handler,
+                              timeout = _READ_TIMEOUT_SEC,
+                              on_response = None ):
+    return BaseRequest._TalkToHandlerAsync(
+        data,
+        handler,
+        'POST',
+        timeout,
+        priority = cls.PRIORITY,
+        on_response = on_response )
 
 
   # This returns a future! Use HandleFuture to get the value.
   # |method| is either 'POST' or 'GET'.
   # |timeout| is num seconds to tolerate no response from server before giving
   # up; see Requests docs for details (we just pass the param along).
+  # |priority| is the priority with which the request is scheduled among the
+  # other pending requests.
+  # |on_response| is called with the response on the worker thread before the
+  # future is resolved. It must not raise.
   @staticmethod
   def _TalkToHandlerAsync( data,
                            handler,
                            method,
                            timeout = _READ_TIMEOUT_SEC,
-                           payload = None ):
-    def _MakeRequest( data, handler, method, timeout, payload ):
+                           payload = None,
+                           priority = INTERACTIVE,
+                           on_response = None ):
+    def _MakeRequest( data,
+                      handler,
+                      method,
+                      timeout,
+                      payload,
+                      in_flight_request ):
       request_uri = _BuildUri( handler )
 
       if method == 'POST':
-        sent_data = _ToUtf8Json( data )
-        headers = BaseRequest._ExtraHeaders( method,
-                                             request_uri,
-                                             sent_data )
-        _logger.debug( 'POST %s\n%s\n%s', request_uri, headers, sent_data )
+        sent_data, headers = _PostBodyAndHeaders( data, request_uri )
+        _logger.debug( 'POST headers %s', headers )
       else:
         headers = BaseRequest._ExtraHeaders( method, request_uri )
         if payload:
           request_uri += ToBytes( f'?{urlencode( payload )}' )
 
         _logger.debug( 'GET %s (%s)\n%s', request_uri, payload, headers )
-      return urlopen(
-        Request(
-          ToUnicode( request_uri ),
-          data = sent_data if data else None,
-          headers = headers,
-          method = method ),
-        timeout = max( _CONNECT_TIMEOUT_SEC, timeout ) )
-
-
-    return BaseRequest.Executor().submit(
+      if CANCEL_CAPABILITY in BaseRequest.server_capabilities:
+        headers[ _REQUEST_ID_HEADER ] = str( in_flight_request.id )
+      if BaseRequest.compression_threshold:
+        headers[ _ACCEPT_ENCODING_HEADER ] = 'gzip'
+      response = BaseRequest.connection_pool.Request(
+        method,
+        ToUnicode( request_uri ),
+        sent_data if data else None,
+        headers,
+        max( _CONNECT_TIMEOUT_SEC, timeout ),
+        in_flight_request,
+        BaseRequest.server_unix_socket )
+      response = _JsonFromResponse( request_uri, response )
+      if on_response:
+        on_response( response )
+      return response
+
+
+    in_flight_request = _InFlightRequest()
+    future = BaseRequest.Executor().submit_with_priority(
+      priority,
       _MakeRequest,
       data,
       handler,
       method,
       timeout,
-      payload )
+      payload,
+      in_flight_request )
+    future.in_flight_request = in_flight_request
+    buffer_sync = BaseRequest.buffer_sync
+    if buffer_sync and isinstance( data, dict ) and 'file_data' in data:
+      # Before waking Vim up so that the next request builds on these versions.
+      future.add_done_callback( functools.partial( _AcknowledgeFileData,
+                                                   buffer_sync,
+                                                   data[ 'file_data' ] ) )
+    wakeup_channel = BaseRequest.wakeup_channel
+    if wakeup_channel:
+      future.add_done_callback( wakeup_channel.Notify )
+    return future
 
 
   @staticmethod
@@ -201,20 +640,41 @@ class BaseRequest:
     return headers
 
 
-  # This method exists to avoid importing the requests module at startup;
-  # reducing loading time since this module is slow to import.
+  # Interactive requests can use all the threads while the number of threads
+  # used by background and housekeeping requests is limited so that they don't
+  # delay the interactive ones.
   @classmethod
   def Executor( cls ):
     try:
       return cls.executor
     except AttributeError:
-      from ycm.unsafe_thread_pool_executor import UnsafeThreadPoolExecutor
-      cls.executor = UnsafeThreadPoolExecutor( max_workers = 30 )
+      cls.executor = UnsafeThreadPoolExecutor(
+        max_workers = 30,
+        max_workers_per_priority = { BACKGROUND: 20, HOUSEKEEPING: 2 } )
       return cls.executor
 
 
+  # Priority of the requests in the executor. One of INTERACTIVE, BACKGROUND,
+  # or HOUSEKEEPING. Requests the user is waiting for should be INTERACTIVE.
+  PRIORITY = INTERACTIVE
+
   server_location = ''
+  # Path to the Unix domain socket ycmd listens on, if any. Requests are sent
+  # there instead of server_location.
+  server_unix_socket = None
   hmac_secret = ''
+  connection_pool = _ConnectionPool()
+  server_capabilities = frozenset()
+  # Set to a BufferSync object when incremental file data is enabled.
+  buffer_sync = None
+  # Request bodies of at least this many bytes are compressed. Zero when the
+  # server doesn't support compression or it is disabled.
+  compression_threshold = 0
+  request_compression_stats = _CompressionStats()
+  response_compression_stats = _CompressionStats()
+  # Set to a WakeupChannel object notified when each request is done if Vim is
+  # connected to one.
+  wakeup_channel = None
 
 
 def BuildRequestData( buffer_number = None ):
@@ -232,8 +692,8 @@ def BuildRequestData( buffer_number = None ):
       'line_num': 1,
       'column_num': 1,
       'working_dir': working_dir,
-      'file_data': vimsupport.GetUnsavedAndSpecifiedBufferData( buffer_object,
-                                                                filepath )
+      'file_data': vimsupport.GetUnsavedAndSpecifiedBufferData(
+        buffer_object, filepath, BaseRequest.buffer_sync )
     }
 
   current_filepath = vimsupport.GetBufferFilepath( current_buffer )
@@ -244,30 +704,158 @@ def BuildRequestData( buffer_number = None ):
     'line_num': line + 1,
     'column_num': column + 1,
     'working_dir': working_dir,
-    'file_data': vimsupport.GetUnsavedAndSpecifiedBufferData( current_buffer,
-                                                              current_filepath )
+    'file_data': vimsupport.GetUnsavedAndSpecifiedBufferData(
+      current_buffer, current_filepath, BaseRequest.buffer_sync )
   }
 
 
+def _AcknowledgeFileData( buffer_sync, file_data, future ):
+  """Tell |buffer_sync| that the server holds the versions of the files in
+  |file_data| if the request of |future| succeeded. Requests that were cancelled
+  may never have been sent."""
+  if not future.cancelled() and future.exception() is None:
+    buffer_sync.Acknowledge( file_data )
+
+
 def _JsonFromFuture( future ):
-  try:
-    response = future.result()
-    response_text = response.read()
-    _ValidateResponseObject( response, response_text )
-    response.close()
+  # The response was already verified and decoded on the worker thread by
+  # _JsonFromResponse.
+  return future.result()
+
 
+def _JsonFromResponse( request_uri, response ):
+  """Verify the HMAC of the |response| to the request sent to |request_uri| and
+  decode its JSON body. This is done on the worker thread so that large
+  responses don't block Vim when the future is handled. Server errors are
+  raised as exceptions that the future will hold."""
+  response_text = response.read()
+  response.close()
+
+  if response.code == HTTP_SERVER_ERROR:
     if response_text:
-      return json.loads( response_text )
+      response_text = _DecodeBody( response, response_text )
+      raise MakeServerException( json.loads( response_text ) )
     return None
-  except HTTPError as response:
-    if response.code == HTTP_SERVER_ERROR:
-      response_text = response.read()
-      response.close()
-      if response_text:
-        raise MakeServerException( json.loads( response_text ) )
-      else:
-        return None
-    raise
+  if not 200 <= response.code < 300:
+    raise HTTPError( ToUnicode( request_uri ),
+                     response.code,
+                     response.reason,
+                     response.headers,
+                     BytesIO( response_text ) )
+
+  # The HMAC is computed over the bytes actually received.
+  _ValidateResponseObject( response, response_text )
+  if response_text:
+    return json.loads( _DecodeBody( response, response_text ) )
+  return None
+
+
+def _PostBodyAndHeaders( data, request_uri ):
+  threshold = BaseRequest.compression_threshold
+  if ( HMAC_TRAILER_CAPABILITY in BaseRequest.server_capabilities and
+       _FileDataSize( data ) >= _STREAMING_MIN_FILE_DATA_SIZE ):
+    _logger.debug( 'POST %s (streamed)', request_uri )
+    compress = bool( threshold )
+    body = _StreamingRequestBody( data,
+                                  'POST',
+                                  urlparse( request_uri ).path,
+                                  compress )
+    headers = dict( _HEADERS )
+    if compress:
+      headers[ _CONTENT_ENCODING_HEADER ] = 'gzip'
+    return body, headers
+
+  body = _ToUtf8Json( data )
+  _logger.debug( 'POST %s\n%s', request_uri, body )
+  compress = threshold and len( body ) >= threshold
+  if compress:
+    body = _Compress( body )
+  # The HMAC is computed over the bytes actually sent.
+  headers = BaseRequest._ExtraHeaders( 'POST', request_uri, body )
+  if compress:
+    headers[ _CONTENT_ENCODING_HEADER ] = 'gzip'
+  return body, headers
+
+
+def _FileDataSize( data ):
+  """Return the number of characters in the contents of the files of the
+  request |data|."""
+  if not isinstance( data, dict ):
+    return 0
+  return sum( len( file_data.get( 'contents', '' ) )
+              for file_data in data.get( 'file_data', {} ).values() )
+
+
+def _JsonChunks( data ):
+  """Serialise |data| to JSON like _ToUtf8Json but as a sequence of UTF-8
+  chunks of about _STREAMING_CHUNK_SIZE bytes."""
+  pieces = []
+  size = 0
+  for piece in _JsonPieces( data ):
+    pieces.append( piece )
+    size += len( piece )
+    if size >= _STREAMING_CHUNK_SIZE:
+      yield ToBytes( ''.join( pieces ) )
+      pieces = []
+      size = 0
+  if pieces:
+    yield ToBytes( ''.join( pieces ) )
+
+
+def _JsonPieces( value ):
+  """Yield the JSON serialisation of |value| as json.dumps would produce it,
+  with long strings split so that no piece is much larger than
+  _STREAMING_CHUNK_SIZE."""
+  if isinstance( value, str ):
+    if len( value ) <= _STREAMING_CHUNK_SIZE:
+      yield json.dumps( value )
+      return
+    # Characters are escaped independently of each other so a string can be
+    # serialised by parts.
+    yield '"'
+    for start in range( 0, len( value ), _STREAMING_CHUNK_SIZE ):
+      part = value[ start : start + _STREAMING_CHUNK_SIZE ]
+      yield json.dumps( part )[ 1 : -1 ]
+    yield '"'
+  elif isinstance( value, dict ):
+    yield '{'
+    for index, ( key, item ) in enumerate( value.items() ):
+      if index:
+        yield ', '
+      # Let json.dumps convert non-string keys as it would do for |value|.
+      yield json.dumps( { key: None } )[ 1 : -7 ]
+      yield ': '
+      yield from _JsonPieces( item )
+    yield '}'
+  elif isinstance( value, ( list, tuple ) ):
+    yield '['
+    for index, item in enumerate( value ):
+      if index:
+        yield ', '
+      yield from _JsonPieces( item )
+    yield ']'
+  else:
+    yield json.dumps( value )
+
+
+def _Compress( body ):
+  start_time = time.perf_counter()
+  compressed_body = gzip.compress( body,
+                                   compresslevel = _GZIP_COMPRESSION_LEVEL )
+  BaseRequest.request_compression_stats.Record(
+    len( body ), len( compressed_body ), time.perf_counter() - start_time )
+  return compressed_body
+
+
+def _DecodeBody( response, body ):
+  """Decompress the |body| of the |response| if the server compressed it."""
+  if response.headers.get( _CONTENT_ENCODING_HEADER ) != 'gzip':
+    return body
+  start_time = time.perf_counter()
+  decompressed_body = gzip.decompress( body )
+  BaseRequest.response_compression_stats.Record(
+    len( decompressed_body ), len( body ), time.perf_counter() - start_time )
+  return decompressed_body
 
 
 def _LoadExtraConfFile( filepath ):
@@ -303,6 +891,24 @@ def _ValidateResponseObject( response, response_text ):
     raise RuntimeError( 'Received invalid HMAC for response!' )
 
 
+def _IsConnectionDropped( connection ):
+  """Return whether the idle |connection| was closed by the server. Nothing is
+  expected to be read from an idle connection so it's readable only if it was
+  closed."""
+  if connection.sock is None:
+    return False
+  try:
+    return bool( select.select( [ connection.sock ], [], [], 0 )[ 0 ] )
+  except ( OSError, ValueError ):
+    return True
+
+
+def _IsStaleConnectionError( error ):
+  if isinstance( error, URLError ):
+    error = error.reason
+  return isinstance( error, ( ConnectionError, http.client.BadStatusLine ) )
+
+
 def _BuildUri( handler ):
   return ToBytes( urljoin( BaseRequest.server_location, handler ) )
 
@@ -311,5 +917,8 @@ def MakeServerException( data ):
   if data[ 'exception' ][ 'TYPE' ] == UnknownExtraConf.__name__:
     return UnknownExtraConf( data[ 'exception' ][ 'extra_conf_file' ] )
 
+  if data[ 'exception' ][ 'TYPE' ] == FileDataVersionMismatch.__name__:
+    return FileDataVersionMismatch( data[ 'message' ] )
+
   return ServerError( f'{ data[ "exception" ][ "TYPE" ] }: '
                       f'{ data[ "message" ] }' )
@@ -15,28 +15,87 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
+import itertools
 import json
 import logging
-from ycmd.utils import ToUnicode
-from ycm.client.base_request import ( BaseRequest,
+import unicodedata
+from ycmd import identifier_utils
+from ycmd.utils import ToBytes, ToUnicode
+from ycm.client.base_request import ( BACKGROUND,
+                                      BaseRequest,
                                       DisplayServerException,
+                                      INTERACTIVE,
                                       MakeServerException )
-from ycm import vimsupport, base
+from ycm import candidate_filter, vimsupport, base
+from ycm.buffer_sync import FileDataToResend
 from ycm.vimsupport import NO_COMPLETIONS
 
 _logger = logging.getLogger( __name__ )
 
+# Name of the server capability advertising support for returning the
+# completions a page at a time. The page is requested with a |completion_page|
+# entry in the request data:
+#
+#   { 'start': 0, 'size': 100 }
+#
+# and the response has a |total_completions| entry with the number of
+# completions in all the pages.
+COMPLETION_PAGES_CAPABILITY = 'completion_pages'
+
+# The items given to Vim are identified in their user_data by the candidates
+# returned by the server they were made from, as the ID of the request that
+# received them and their index. Their extra_data is only serialised if they are
+# resolved or completed.
+_SOURCE_IDS = itertools.count()
+
 
 class CompletionRequest( BaseRequest ):
-  def __init__( self, request_data ):
+  PRIORITY = INTERACTIVE
+
+  def __init__( self, request_data, page_size = 0 ):
     super().__init__()
     self.request_data = request_data
+    self._page_size = page_size
     self._response_future = None
+    self._line = None
+    self._candidates = None
+    self._vim_completions = None
+    self._raw_response = None
+    self._source_id = next( _SOURCE_IDS )
 
 
   def Start( self ):
-    self._response_future = self.PostDataToHandlerAsync( self.request_data,
-                                                         'completions' )
+    # Remember the line the request was sent from so that it can be refined
+    # later. See Refine.
+    self._line = vimsupport.CurrentLineContents()
+    if ( COMPLETION_PAGES_CAPABILITY in BaseRequest.server_capabilities and
+         self._page_size > 0 ):
+      self.request_data.setdefault( 'completion_page',
+                                    { 'start': 0, 'size': self._page_size } )
+    vim_data_options = _VimDataOptions()
+    self._response_future = self.PostDataToHandlerAsync(
+      self.request_data,
+      'completions',
+      on_response = lambda response: self._ConvertCompletions(
+        response, vim_data_options ) )
+
+
+  def _ConvertCompletions( self, response, vim_data_options ):
+    # Called on the worker thread before the future of the request is resolved
+    # so that the completions are ready to be given to Vim when the response is
+    # handled.
+    if not response:
+      return
+    completions = response.get( 'completions', [] )
+    try:
+      self._vim_completions = _ConvertCompletionDatasToVimDatas(
+        completions,
+        [ _UserData( self._source_id, index )
+          for index in range( len( completions ) ) ],
+        vim_data_options )
+    except Exception:
+      # The completions are converted by Response instead.
+      _logger.exception( 'Failed to convert the completions' )
 
 
   def Done( self ):
@@ -47,13 +106,18 @@ class CompletionRequest( BaseRequest ):
     if not self._response_future:
       return NO_COMPLETIONS
 
+    if self._raw_response is not None:
+      return self._raw_response
+
     response = self.HandleFuture( self._response_future,
                                   truncate_message = True )
     if not response:
       return NO_COMPLETIONS
 
-    # Vim may not be able to convert the 'errors' entry to its internal format
-    # so we remove it from the response.
+    # The response is owned by the future so we work on a copy. Vim may not be
+    # able to convert the 'errors' entry to its internal format so we remove it
+    # from the response.
+    response = dict( response )
     errors = response.pop( 'errors', [] )
     for e in errors:
       exception = MakeServerException( e )
@@ -62,13 +126,54 @@ class CompletionRequest( BaseRequest ):
 
     response[ 'line' ] = self.request_data[ 'line_num' ]
     response[ 'column' ] = self.request_data[ 'column_num' ]
+    self._raw_response = response
     return response
 
 
+  def RawCompletions( self ):
+    """Return the completions of the response as sent by the server, in the
+    same order as those of Response."""
+    return self._RawResponse()[ 'completions' ]
+
+
+  def UserDatas( self ):
+    """Return the user_data of the items made from the completions of the
+    response, in the same order as those of Response."""
+    return [ _UserData( self._source_id, index )
+             for index in self._SourceIndices() ]
+
+
+  def ExtraDataForItem( self, item ):
+    """Return the extra_data of the completion the Vim completion |item| was
+    made from or None if it's unknown."""
+    return _ExtraDataFromUserData( item.get( 'user_data' ),
+                                   self._source_id,
+                                   self._SourceCompletions() )
+
+
+  def _SourceCompletions( self ):
+    """Return the candidates returned by the server that the completions of the
+    response were taken from."""
+    return self._RawResponse()[ 'completions' ]
+
+
+  def _SourceIndices( self ):
+    """Return the indices of the completions of the response among the
+    candidates returned by _SourceCompletions."""
+    return range( len( self._RawResponse()[ 'completions' ] ) )
+
+
   def Response( self ):
-    response = self._RawResponse()
-    response[ 'completions' ] = _ConvertCompletionDatasToVimDatas(
-        response[ 'completions' ] )
+    # The raw response is shared by all the calls to this method and
+    # _RawResponse so it must not be modified.
+    response = dict( self._RawResponse() )
+    vim_completions = self._vim_completions
+    # Not converted on the worker thread if the request failed, if the
+    # conversion failed or if the request was answered locally.
+    if vim_completions is None:
+      vim_completions = _ConvertCompletionDatasToVimDatas(
+        response[ 'completions' ], self.UserDatas(), _VimDataOptions() )
+    response[ 'completions' ] = vim_completions
     # FIXME: Do we really need to do this AdjustCandidateInsertionText ? I feel
     # like Vim should do that for us
     response[ 'completions' ] = base.AdjustCandidateInsertionText(
@@ -76,6 +181,44 @@ class CompletionRequest( BaseRequest ):
     return response
 
 
+  def NextPage( self ):
+    """Return a request for the page of completions following the one
+    returned for this request, started in the background, or None if there
+    are no more completions."""
+    if not self.Done() or 'completion_page' not in self.request_data:
+      return None
+    response = self._RawResponse()
+    page_end = ( self.request_data[ 'completion_page' ][ 'start' ] +
+                 len( response[ 'completions' ] ) )
+    if page_end >= response.get( 'total_completions', 0 ):
+      return None
+    request = CompletionPageRequest( self.request_data, page_end )
+    request.Start()
+    return request
+
+
+  def Refine( self, request_data ):
+    """Return a request answered locally from the candidates of this one if
+    |request_data| is for the same identifier with more characters typed, None
+    otherwise. The request is already done and doesn't need to be started."""
+    if not self.Done():
+      return None
+    candidates = self._RefinableCandidates()
+    if not candidates:
+      return None
+    query = candidates.RefinedQuery( request_data )
+    if query is None:
+      return None
+    return RefinedCompletionRequest( request_data, candidates, query )
+
+
+  def _RefinableCandidates( self ):
+    if self._candidates is None:
+      self._candidates = _RefinableCandidates.FromResponse(
+        self.request_data, self._line, self._RawResponse(), self._source_id )
+    return self._candidates
+
+
   def OnCompleteDone( self ):
     if not self.Done():
       return
@@ -90,16 +233,17 @@ class CompletionRequest( BaseRequest ):
     completed_item = vimsupport.GetVariableValue( 'v:completed_item' )
 
     # If Vim supports user_data (8.0.1493 or later), we actually know the
-    # _exact_ element that was selected, having put its extra_data in the
-    # user_data field. Otherwise, we have to guess by matching the values in the
-    # completed item and the list of completions. Sometimes this returns
-    # multiple possibilities, which is essentially unresolvable.
+    # _exact_ element that was selected, having put what identifies its
+    # extra_data in the user_data field. Otherwise, we have to guess by matching
+    # the values in the completed item and the list of completions. Sometimes
+    # this returns multiple possibilities, which is essentially unresolvable.
     if 'user_data' not in completed_item:
       completions = self._RawResponse()[ 'completions' ]
       return _FilterToMatchingCompletions( completed_item, completions )
 
-    if completed_item[ 'user_data' ]:
-      return [ json.loads( completed_item[ 'user_data' ] ) ]
+    extra_data = self.ExtraDataForItem( completed_item )
+    if extra_data is not None:
+      return [ extra_data ]
 
     return []
 
@@ -143,6 +287,192 @@ class CompletionRequest( BaseRequest ):
       vimsupport.ReplaceChunks( fixit[ 'chunks' ], silent=True )
 
 
+class RefinedCompletionRequest( CompletionRequest ):
+  """Completion request answered by filtering the candidates returned by the
+  server for a previous request."""
+
+  def __init__( self, request_data, candidates, query ):
+    super().__init__( request_data )
+    self._candidates = candidates
+    self._query = query
+    self._completions = None
+    self._indices = None
+    # The items are identified by the candidates they were filtered from.
+    self._source_id = candidates.source_id
+
+
+  def Start( self ):
+    pass
+
+
+  def Done( self ):
+    return True
+
+
+  def Cancel( self ):
+    pass
+
+
+  def _RawResponse( self ):
+    if self._completions is None:
+      self._indices = self._candidates.FilterAndSortIndices( self._query )
+      self._completions = [ self._candidates.completions[ index ]
+                            for index in self._indices ]
+    return {
+      'line': self.request_data[ 'line_num' ],
+      'column': self.request_data[ 'column_num' ],
+      'completion_start_column': self._candidates.start_column,
+      'completions': self._completions
+    }
+
+
+  def _SourceCompletions( self ):
+    return self._candidates.completions
+
+
+  def _SourceIndices( self ):
+    self._RawResponse()
+    return self._indices
+
+
+class CompletionPageRequest( CompletionRequest ):
+  """Request for the page of completions starting at the index |start| of
+  those returned for the same |request_data| as a previous request."""
+  PRIORITY = BACKGROUND
+
+  def __init__( self, request_data, start ):
+    page_size = request_data[ 'completion_page' ][ 'size' ]
+    super().__init__( dict(
+      request_data,
+      file_data = FileDataToResend( request_data[ 'file_data' ] ),
+      completion_page = { 'start': start, 'size': page_size } ) )
+
+
+class SpeculativeCompletionRequest( CompletionRequest ):
+  """Completion request sent ahead of time for the line |line| the current
+  buffer is expected to contain when its changedtick is |changedtick|."""
+  PRIORITY = BACKGROUND
+
+  def __init__( self, request_data, line, changedtick, page_size = 0 ):
+    super().__init__( request_data, page_size )
+    self._predicted_line = line
+    self._changedtick = changedtick
+
+
+  def Start( self ):
+    super().Start()
+    self._line = self._predicted_line
+
+
+  def Predicts( self, request_data, line, changedtick ):
+    """Return True if this request was sent for the same position and contents
+    as the request for |request_data|, sent when the current line is |line|
+    and the changedtick of the buffer |changedtick|."""
+    if changedtick != self._changedtick or line != self._predicted_line:
+      return False
+    return all( request_data.get( key, False ) == self.request_data[ key ]
+                for key in [ 'filepath',
+                             'line_num',
+                             'column_num',
+                             'force_semantic' ] )
+
+
+class _RefinableCandidates:
+  """Complete set of the candidates returned by the server for a query. Any
+  query starting with that one at the same position only matches a subset of
+  them."""
+
+  def __init__( self,
+                request_data,
+                line,
+                start_column,
+                completions,
+                source_id ):
+    self.start_column = start_column
+    self.completions = completions
+    self.source_id = source_id
+    self._filepath = request_data[ 'filepath' ]
+    self._line_num = request_data[ 'line_num' ]
+    self._force_semantic = request_data.get( 'force_semantic', False )
+    # Text from the start of the line to the cursor as bytes since columns are
+    # byte offsets.
+    self._text_before_cursor = ToBytes(
+      line )[ : request_data[ 'column_num' ] - 1 ]
+    self._index = None
+
+
+  @staticmethod
+  def FromResponse( request_data, line, response, source_id ):
+    """Return the candidates of |response| or False if they can't be refined
+    because the request failed, returned nothing, or the server may have left
+    some out. |source_id| identifies the candidates in the user_data of the
+    items made from them."""
+    start_column = response[ 'completion_start_column' ]
+    if line is None or start_column < 1:
+      return False
+    if ( start_column - 1 > len( ToBytes( line ) ) or
+         start_column > request_data[ 'column_num' ] ):
+      return False
+    completions = response[ 'completions' ]
+    # The server doesn't return anything when the query is too short for the
+    # identifier completer so no candidates doesn't mean none would match.
+    if not completions or _MayBeTruncated( completions ):
+      return False
+    # Only a page of the completions was returned.
+    if response.get( 'total_completions', 0 ) > len( completions ):
+      return False
+    return _RefinableCandidates( request_data,
+                                 line,
+                                 start_column,
+                                 completions,
+                                 source_id )
+
+
+  def FilterAndSortIndices( self, query ):
+    if self._index is None:
+      self._index = candidate_filter.CandidateIndex( self.completions )
+    return self._index.FilterAndSortIndices( query )
+
+
+  def RefinedQuery( self, request_data ):
+    """Return the query to filter the candidates with to answer the request
+    for |request_data| or None if the server must be asked."""
+    if ( request_data[ 'filepath' ] != self._filepath or
+         request_data[ 'line_num' ] != self._line_num or
+         request_data.get( 'force_semantic', False ) != self._force_semantic ):
+      return None
+
+    line = vimsupport.CurrentLineContents()
+    text_before_cursor = ToBytes( line )[ : request_data[ 'column_num' ] - 1 ]
+    # Nothing before the identifier changed and more characters were typed.
+    if not text_before_cursor.startswith( self._text_before_cursor ):
+      return None
+
+    # The server would start the completion at the same column.
+    filetypes = request_data[ 'file_data' ][ self._filepath ][ 'filetypes' ]
+    prefix = ToUnicode( text_before_cursor[ : self.start_column - 1 ] )
+    text_before_cursor = ToUnicode( text_before_cursor )
+    start_codepoint = identifier_utils.StartOfLongestIdentifierEndingAtIndex(
+      text_before_cursor, len( text_before_cursor ), filetypes[ 0 ] )
+    if start_codepoint != len( prefix ):
+      return None
+    return text_before_cursor[ start_codepoint : ]
+
+
+def _MayBeTruncated( completions ):
+  """Return whether the server may have returned only the best matching
+  candidates instead of all of them."""
+  max_num_candidates = vimsupport.GetIntValue( 'g:ycm_max_num_candidates' )
+  if 0 < max_num_candidates <= len( completions ):
+    return True
+  max_num_identifier_candidates = vimsupport.GetIntValue(
+    'g:ycm_max_num_identifier_candidates' )
+  num_identifier_candidates = sum(
+    completion.get( 'extra_menu_info' ) == '[ID]'
+    for completion in completions )
+  return 0 < max_num_identifier_candidates <= num_identifier_candidates
+
+
 def _GetRequiredNamespaceImport( extra_data ):
   return extra_data.get( 'required_namespace_import' )
 
@@ -155,8 +485,9 @@ def _FilterToMatchingCompletions( completed_item, completions ):
   """Filter to completions matching the item Vim said was completed"""
   match_keys = [ 'word', 'abbr', 'menu', 'info' ]
   matched_completions = []
+  vim_data_options = _VimDataOptions()
   for completion in completions:
-    item = ConvertCompletionDataToVimData( completion )
+    item = _ConvertCompletionDataToVimData( completion, '', vim_data_options )
 
     def matcher( key ):
       return ( ToUnicode( completed_item.get( key, "" ) ) ==
@@ -183,18 +514,70 @@ def _GetCompletionInfoField( completion_data ):
   return info.replace( '\x00', '' )
 
 
+class _VimDataOptions:
+  """Vim settings affecting the conversion of completion items to Vim data.
+  They are read once on the main thread so that the items can then be converted
+  without accessing Vim, possibly on another thread."""
+
+  def __init__( self ):
+    # When we are using a popup for the preview_info, it needs to fit on the
+    # screen alongside the extra_menu_info. Let's use some heuristics.  If the
+    # length of the extra_menu_info is more than, say, 1/3 of screen, truncate
+    # it and stick it in the preview_info.
+    self.max_menu_width = None
+    if vimsupport.UsingPreviewPopup():
+      self.max_menu_width = max( int( vimsupport.DisplayWidth() / 3 ), 3 )
+    self.ambiguous_character_width = vimsupport.AmbiguousCharacterWidth()
+
+
+def _DisplayWidthOfString( string, ambiguous_character_width ):
+  """Same as Vim's strdisplaywidth except for tabs."""
+  if string.isascii() and string.isprintable():
+    return len( string )
+  width = 0
+  for character in string:
+    if unicodedata.combining( character ):
+      continue
+    east_asian_width = unicodedata.east_asian_width( character )
+    if east_asian_width in ( 'W', 'F' ):
+      width += 2
+    elif east_asian_width == 'A':
+      width += ambiguous_character_width
+    elif unicodedata.category( character ) == 'Cc':
+      # Displayed as ^X.
+      width += 2
+    else:
+      width += 1
+  return width
+
+
 def ConvertCompletionDataToVimData( completion_data ):
+  # We store the completion item extra_data as a string in the completion
+  # user_data. This allows us to identify the _exact_ item that was completed
+  # in the CompleteDone handler, by inspecting this item from v:completed_item
+  #
+  # We convert to string because completion user data items must be strings.
+  #
+  # Note: Not all versions of Vim support this (added in 8.0.1483), but adding
+  # the item to the dictionary is harmless in earlier Vims.
+  # Note: Since 8.2.0084 we don't need to use json.dumps() here.
+  return _ConvertCompletionDataToVimData(
+    completion_data,
+    json.dumps( completion_data.get( 'extra_data', {} ) ),
+    _VimDataOptions() )
+
+
+def _ConvertCompletionDataToVimData( completion_data,
+                                     user_data,
+                                     vim_data_options ):
   # See :h complete-items for a description of the dictionary fields.
   extra_menu_info = completion_data.get( 'extra_menu_info', '' )
   preview_info = _GetCompletionInfoField( completion_data )
 
-  # When we are using a popup for the preview_info, it needs to fit on the
-  # screen alongside the extra_menu_info. Let's use some heuristics.  If the
-  # length of the extra_menu_info is more than, say, 1/3 of screen, truncate it
-  # and stick it in the preview_info.
-  if vimsupport.UsingPreviewPopup():
-    max_width = max( int( vimsupport.DisplayWidth() / 3 ), 3 )
-    extra_menu_info_width = vimsupport.DisplayWidthOfString( extra_menu_info )
+  max_width = vim_data_options.max_menu_width
+  if max_width is not None:
+    extra_menu_info_width = _DisplayWidthOfString(
+      extra_menu_info, vim_data_options.ambiguous_character_width )
     if extra_menu_info_width > max_width:
       if not preview_info.startswith( extra_menu_info ):
         preview_info = extra_menu_info + '\n\n' + preview_info
@@ -210,18 +593,36 @@ def ConvertCompletionDataToVimData( completion_data ):
     'equal'    : 1,
     'dup'      : 1,
     'empty'    : 1,
-    # We store the completion item extra_data as a string in the completion
-    # user_data. This allows us to identify the _exact_ item that was completed
-    # in the CompleteDone handler, by inspecting this item from v:completed_item
-    #
-    # We convert to string because completion user data items must be strings.
-    #
-    # Note: Not all versions of Vim support this (added in 8.0.1483), but adding
-    # the item to the dictionary is harmless in earlier Vims.
-    # Note: Since 8.2.0084 we don't need to use json.dumps() here.
-    'user_data': json.dumps( completion_data.get( 'extra_data', {} ) )
+    'user_data': user_data
   }
 
 
-def _ConvertCompletionDatasToVimDatas( response_data ):
-  return [ ConvertCompletionDataToVimData( x ) for x in response_data ]
+def _ConvertCompletionDatasToVimDatas( response_data,
+                                       user_datas,
+                                       vim_data_options ):
+  return [ _ConvertCompletionDataToVimData( x, user_data, vim_data_options )
+           for x, user_data in zip( response_data, user_datas ) ]
+
+
+def _UserData( source_id, index ):
+  return f'{ source_id }:{ index }'
+
+
+def _ExtraDataFromUserData( user_data, source_id, completions ):
+  """Return the extra_data of the completion identified by |user_data| among
+  the |completions| identified by |source_id|, or None if it's not one of them.
+  The user_data of items not made by a completion request is the JSON of their
+  extra_data."""
+  if not isinstance( user_data, str ) or not user_data:
+    return None
+  item_source_id, _, index = user_data.partition( ':' )
+  if item_source_id == str( source_id ) and index.isdigit():
+    index = int( index )
+    if index < len( completions ):
+      return completions[ index ].get( 'extra_data', {} )
+    return None
+  try:
+    extra_data = json.loads( user_data )
+  except json.JSONDecodeError:
+    return None
+  return extra_data if isinstance( extra_data, dict ) else None
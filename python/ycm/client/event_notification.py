@@ -15,10 +15,14 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
-from ycm.client.base_request import BaseRequest, BuildRequestData
+from ycm.client.base_request import ( BACKGROUND,
+                                      BaseRequest,
+                                      BuildRequestData )
 
 
 class EventNotification( BaseRequest ):
+  PRIORITY = BACKGROUND
+
   def __init__( self, event_name, buffer_number = None, extra_data = None ):
     super( EventNotification, self ).__init__()
     self._event_name = event_name
@@ -15,7 +15,9 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
-from ycm.client.base_request import BaseRequest, BuildRequestData
+from ycm.client.base_request import ( BACKGROUND,
+                                      BaseRequest,
+                                      BuildRequestData )
 from ycm.vimsupport import PostVimMessage
 
 import logging
@@ -27,6 +29,10 @@ TIMEOUT_SECONDS = 60
 
 
 class MessagesPoll( BaseRequest ):
+  # Not HOUSEKEEPING since each poll holds a thread for up to TIMEOUT_SECONDS
+  # and there is one poll per filetype.
+  PRIORITY = BACKGROUND
+
   def __init__( self, buff ):
     super( MessagesPoll, self ).__init__()
     self._request_data = BuildRequestData( buff.number )
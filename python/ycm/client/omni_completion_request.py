@@ -32,6 +32,10 @@ class OmniCompletionRequest( CompletionRequest ):
     return True
 
 
+  def Refine( self, request_data ):
+    return None
+
+
   def Response( self ):
     return {
       'line': self.request_data[ 'line_num' ],
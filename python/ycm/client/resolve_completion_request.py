@@ -20,9 +20,10 @@ from ycm.client.base_request import ( BaseRequest,
                                       MakeServerException )
 from ycm.client.completion_request import ( CompletionRequest,
                                             ConvertCompletionDataToVimData )
+from ycm.unsafe_thread_pool_executor import BACKGROUND
 
+from collections import OrderedDict
 import logging
-import json
 _logger = logging.getLogger( __name__ )
 
 
@@ -51,6 +52,16 @@ class ResolveCompletionRequest( BaseRequest ):
     self.completion_request.OnCompleteDone()
 
 
+  def Refine( self, request_data ):
+    # Like OnCompleteDone above.
+    return self.completion_request.Refine( request_data )
+
+
+  def ExtraDataForItem( self, item ):
+    # Like OnCompleteDone above.
+    return self.completion_request.ExtraDataForItem( item )
+
+
   def Response( self ):
     response = self.HandleFuture( self._response_future,
                                   truncate_message = True,
@@ -67,20 +78,107 @@ class ResolveCompletionRequest( BaseRequest ):
       _logger.error( exception )
       DisplayServerException( exception, truncate_message = True )
 
+    # The response is shared by all the calls to this method so it must not be
+    # modified.
+    response = dict( response )
     response[ 'completion' ] = ConvertCompletionDataToVimData(
         response[ 'completion' ] )
     return response
 
 
+class BackgroundResolveCompletionRequest( ResolveCompletionRequest ):
+  """Resolve request sent ahead of time for an item the user may select."""
+  PRIORITY = BACKGROUND
+
+
+class ResolveAheadCache:
+  """Resolve requests sent in the background for the items of the last
+  completion response the user is likely to select next: the first ones and
+  the neighbours of the selected one. The most recently used requests are
+  kept, keyed by the user_data of the items which identifies them among the
+  candidates returned by the server. Since the items to resolve are identified
+  by the server in the context of its last completion response, the cache must
+  be reset whenever a new response is received."""
+
+  def __init__( self, max_size = 100 ):
+    self._max_size = max_size
+    self._requests = OrderedDict()
+
+
+  def Reset( self ):
+    for request in self._requests.values():
+      request.Cancel()
+    self._requests.clear()
+
+
+  def ResolveAhead( self, completion_request, count, selected = -1 ):
+    """Resolve the first |count| items of the response to
+    |completion_request| that are not resolved yet if |selected| is negative,
+    or the |count| items before and after the |selected| index otherwise."""
+    if count <= 0 or not completion_request.Done():
+      return
+    completions = list( zip( completion_request.RawCompletions(),
+                             completion_request.UserDatas() ) )
+    if selected < 0:
+      candidates = completions
+    else:
+      candidates = ( completions[ max( selected - count, 0 ) : selected ] +
+                     completions[ selected + 1 : selected + count + 1 ] )
+
+    started = 0
+    for completion, key in candidates:
+      if selected < 0 and started == count:
+        break
+      extra_data = completion.get( 'extra_data', {} )
+      if 'resolve' not in extra_data:
+        continue
+      if key in self._requests:
+        self._requests.move_to_end( key )
+        continue
+      request_data = dict( completion_request.request_data,
+                           resolve = extra_data[ 'resolve' ] )
+      request = BackgroundResolveCompletionRequest( completion_request,
+                                                    request_data )
+      request.Start()
+      self._Add( key, request )
+      started += 1
+
+
+  def Take( self, completion_request, item ):
+    """Return a request answered by the resolve request sent ahead of time
+    for |item|, or None if there is none."""
+    key = item.get( 'user_data' )
+    request = self._requests.get( key )
+    if not request:
+      return None
+    if request.Done():
+      self._requests.move_to_end( key )
+    else:
+      # The returned request is cancelled if a new completion request is sent
+      # before it's done so it can't be used again.
+      del self._requests[ key ]
+    # The request may have been sent for the completion request this one was
+    # refined from. Answer it in the context of the current one so that
+    # OnCompleteDone and Refine work as usual.
+    resolve_request = ResolveCompletionRequest( completion_request,
+                                                request.request_data )
+    resolve_request._response_future = request._response_future
+    return resolve_request
+
+
+  def _Add( self, key, request ):
+    self._requests[ key ] = request
+    while len( self._requests ) > self._max_size:
+      _, evicted_request = self._requests.popitem( last = False )
+      evicted_request.Cancel()
+
+
 def ResolveCompletionItem( completion_request, item ):
   if not completion_request.Done():
     return None
-  try:
-    completion_extra_data = json.loads( item[ 'user_data' ] )
-  except KeyError:
-    return None
-  except ( TypeError, json.JSONDecodeError ):
-    # Can happen with the omni completer
+  # None for the items of the omni completer.
+  completion_extra_data = completion_request.ExtraDataForItem( item )
+  if completion_extra_data is None:
     return None
 
   request_data = completion_request.request_data
@@ -17,7 +17,8 @@
 
 
 import logging
-from ycm.client.base_request import ( BaseRequest, DisplayServerException,
+from ycm.client.base_request import ( BACKGROUND, BaseRequest,
+                                      DisplayServerException,
                                       MakeServerException )
 
 _logger = logging.getLogger( __name__ )
@@ -26,6 +27,8 @@ _logger = logging.getLogger( __name__ )
 # FIXME: This is copy/pasta from SignatureHelpRequest - abstract a
 # SimpleAsyncRequest base that does all of this generically
 class SemanticTokensRequest( BaseRequest ):
+  PRIORITY = BACKGROUND
+
   def __init__( self, request_data ):
     super().__init__()
     self.request_data = request_data
@@ -0,0 +1,42 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+from ycm.client.base_request import BaseRequest
+
+
+class ServerCapabilitiesRequest( BaseRequest ):
+  def __init__( self ):
+    super( ServerCapabilitiesRequest, self ).__init__()
+    self._response = None
+
+
+  def Start( self ):
+    # Servers that don't implement this handler reply with a 404 error. This
+    # simply means that they have none of the optional capabilities.
+    self._response = self.GetDataFromHandler( 'capabilities',
+                                              display_message = False )
+
+
+  def Response( self ):
+    return frozenset( self._response or [] )
+
+
+def SendServerCapabilitiesRequest():
+  request = ServerCapabilitiesRequest()
+  # This is a blocking call.
+  request.Start()
+  return request.Response()
@@ -17,7 +17,11 @@
 
 import time
 from threading import Thread
-from ycm.client.base_request import BaseRequest
+from ycm.client.base_request import BaseRequest, HOUSEKEEPING
+
+
+class _HealthyRequest( BaseRequest ):
+  PRIORITY = HOUSEKEEPING
 
 
 # This class can be used to keep the ycmd server alive for the duration of the
@@ -38,4 +42,5 @@ class YcmdKeepalive:
     while True:
       time.sleep( self._ping_interval_seconds )
 
-      BaseRequest().GetDataFromHandler( 'healthy', display_message = False )
+      _HealthyRequest().GetDataFromHandler( 'healthy',
+                                            display_message = False )
@@ -30,7 +30,13 @@ class DiagnosticInterface:
     self._diagnostics = []
     self._diag_filter = DiagnosticFilter.CreateFromOptions( user_options )
     # Line and column numbers are 1-based
-    self._line_to_diags = defaultdict( list )
+    self._buffer_diags = []
+    self._line_index = _LineIntervalIndex( [] )
+    self._error_count = 0
+    self._warning_count = 0
+    # Range of lines around the visible ones whose diagnostics are highlighted
+    # when the highlight_visible_diagnostics_only option is set.
+    self._highlighted_range = None
     self._previous_diag_line_number = -1
     self._diag_message_needs_clearing = False
 
@@ -40,6 +46,18 @@ class DiagnosticInterface:
              'i' not in vim.eval( 'mode()' ) )
 
 
+  def OnWinScrolled( self ):
+    """Highlight the diagnostics around the visible lines if they were scrolled
+    out of the highlighted range."""
+    if ( self._user_options[ 'enable_diagnostic_highlighting' ] and
+         self._user_options[ 'highlight_visible_diagnostics_only' ] and
+         self.ShouldUpdateDiagnosticsUINow() and
+         not vimsupport.VisibleRangeOfBufferOverlaps(
+           self._bufnr,
+           self._highlighted_range ) ):
+      self.UpdateMatches()
+
+
   def OnCursorMoved( self ):
     if self._user_options[ 'echo_current_diagnostic' ]:
       line, _ = vimsupport.CurrentLineAndColumn()
@@ -52,11 +70,11 @@ class DiagnosticInterface:
 
 
   def GetErrorCount( self ):
-    return self._DiagnosticsCount( _DiagnosticIsError )
+    return self._error_count
 
 
   def GetWarningCount( self ):
-    return self._DiagnosticsCount( _DiagnosticIsWarning )
+    return self._warning_count
 
 
   def PopulateLocationList( self, open_on_edit = False ):
@@ -99,7 +117,8 @@ class DiagnosticInterface:
 
 
   def DiagnosticsForLine( self, line_number ):
-    return self._line_to_diags[ line_number ]
+    return sorted( self._line_index.Overlapping( line_number, line_number ),
+                   key = _DiagnosticSortKey )
 
 
   def _ApplyDiagnosticFilter( self, diags ):
@@ -117,7 +136,7 @@ class DiagnosticInterface:
   def _EchoDiagnosticForLine( self, line_num ):
     self._previous_diag_line_number = line_num
 
-    diags = self._line_to_diags[ line_num ]
+    diags = self.DiagnosticsForLine( line_num )
     text = None
     first_diag = None
     if diags:
@@ -187,13 +206,6 @@ class DiagnosticInterface:
     self._diag_message_needs_clearing = True
 
 
-  def _DiagnosticsCount( self, predicate ):
-    count = 0
-    for diags in self._line_to_diags.values():
-      count += sum( 1 for d in diags if predicate( d ) )
-    return count
-
-
   def _UpdateLocationLists( self, open_on_edit = False ):
     vimsupport.SetLocationListsForBuffer(
       self._bufnr,
@@ -202,100 +214,206 @@ class DiagnosticInterface:
 
 
   def _ClearMatches( self ):
-    props_to_remove = vimsupport.GetTextProperties( self._bufnr )
-    for prop in props_to_remove:
-      vimsupport.RemoveDiagnosticProperty( self._bufnr, prop )
+    self._highlighted_range = None
+    vimsupport.RemoveDiagnosticProperties(
+      self._bufnr,
+      vimsupport.GetTextProperties( self._bufnr ) )
 
 
   def UpdateMatches( self ):
     if not self._user_options[ 'enable_diagnostic_highlighting' ]:
       return
 
-    props_to_remove = vimsupport.GetTextProperties( self._bufnr )
-    for diags in self._line_to_diags.values():
-      # Insert squiggles in reverse order so that errors overlap warnings.
-      for diag in reversed( diags ):
-        for line, column, name, extras in _ConvertDiagnosticToTextProperties(
-            self._bufnr,
-            diag ):
-          global YCM_VIM_PROPERTY_ID
-
-          # Note the following .remove() works because the __eq__ on
-          # DiagnosticProperty does not actually check the IDs match...
-          diag_prop = vimsupport.DiagnosticProperty(
-              YCM_VIM_PROPERTY_ID,
-              name,
-              line,
-              column,
-              extras[ 'end_col' ] - column if 'end_col' in extras else column )
-          try:
-            props_to_remove.remove( diag_prop )
-          except ValueError:
-            extras.update( {
-              'id': YCM_VIM_PROPERTY_ID
-            } )
-            vimsupport.AddTextProperty( self._bufnr,
-                                        line,
-                                        column,
-                                        name,
-                                        extras )
-          YCM_VIM_PROPERTY_ID += 1
-    for prop in props_to_remove:
-      vimsupport.RemoveDiagnosticProperty( self._bufnr, prop )
+    if self._user_options[ 'highlight_visible_diagnostics_only' ]:
+      self._highlighted_range = vimsupport.RangeVisibleInBuffer( self._bufnr )
+
+    # Properties already in the buffer by type, position and length.
+    existing_props = defaultdict( list )
+    for prop in vimsupport.GetTextProperties( self._bufnr ):
+      existing_props[ _TextPropertyKey( prop ) ].append( prop )
+
+    props_to_add = self._MatchTextProperties( existing_props )
+    vimsupport.RemoveDiagnosticProperties(
+      self._bufnr,
+      [ prop for props in existing_props.values() for prop in props ] )
+
+    global YCM_VIM_PROPERTY_ID
+    # Add errors last so that they overlap warnings.
+    props_to_add.sort( key = lambda prop: 'Error' in prop[ 2 ] )
+    for *_, extras in props_to_add:
+      extras[ 'id' ] = YCM_VIM_PROPERTY_ID
+      YCM_VIM_PROPERTY_ID += 1
+    vimsupport.AddTextProperties( self._bufnr, props_to_add )
+
+
+  def _MatchTextProperties( self, existing_props ):
+    """Return the properties of the diagnostics missing from |existing_props|.
+    Those already there are removed from |existing_props| so that only the
+    stale ones are left."""
+    props_to_add = []
+    for diag in self._HighlightedDiagnostics():
+      for prop in _ConvertDiagnosticToTextProperties( self._bufnr, diag ):
+        line, column, name, extras = prop
+        # Vim only gives the extent of multi-line properties on each line so
+        # they are always added again.
+        matching_props = None
+        if extras.get( 'end_lnum', line ) == line:
+          matching_props = existing_props.get(
+            ( name, line, column, extras.get( 'end_col', column ) - column ) )
+        if matching_props:
+          matching_props.pop()
+        else:
+          props_to_add.append( prop )
+    return props_to_add
+
+
+  def _HighlightedDiagnostics( self ):
+    """Return the diagnostics to highlight by first line. Those of a line are in
+    reverse order so that their properties are added errors last."""
+    diags = self._buffer_diags
+    if self._user_options[ 'highlight_visible_diagnostics_only' ]:
+      # The buffer is not visible.
+      if self._highlighted_range is None:
+        return []
+      diags = self._line_index.Overlapping(
+        self._highlighted_range[ 'start' ][ 'line_num' ],
+        self._highlighted_range[ 'end' ][ 'line_num' ] )
+    return sorted( reversed( diags ), key = _DiagnosticStartLine )
 
 
   def _ClearSigns( self ):
-    signs_to_unplace = vimsupport.GetSignsInBuffer( self._bufnr )
-    vim.eval( f'sign_unplacelist( { signs_to_unplace } )' )
+    sign_ids = [ int( sign[ 'id' ] )
+                 for sign in vimsupport.GetSignsInBuffer( self._bufnr ) ]
+    if sign_ids:
+      vimsupport.UnplaceSigns( self._bufnr, sign_ids )
 
 
   def _UpdateSigns( self ):
-    signs_to_unplace = vimsupport.GetSignsInBuffer( self._bufnr )
-    signs_to_place = []
-    for line, diags in self._line_to_diags.items():
-      if not diags:
-        continue
+    # Vim can only display one sign by line so errors take priority.
+    line_to_sign = {}
+    for diag in self._buffer_diags:
+      name = 'YcmError' if _DiagnosticIsError( diag ) else 'YcmWarning'
+      for line in range( _DiagnosticStartLine( diag ),
+                         _DiagnosticEndLine( diag ) + 1 ):
+        if line_to_sign.get( line ) != 'YcmError':
+          line_to_sign[ line ] = name
+    signs = set( line_to_sign.items() )
+
+    # The signs are read from Vim each time since they may have been moved along
+    # with the text, or placed or unplaced by something else. A line may also
+    # have several signs, e.g. when Vim joined lines; only one of them is kept.
+    kept_signs = set()
+    sign_ids_to_unplace = []
+    for placed_sign in vimsupport.GetSignsInBuffer( self._bufnr ):
+      sign = ( int( placed_sign[ 'lnum' ] ), placed_sign[ 'name' ] )
+      if sign in signs and sign not in kept_signs:
+        kept_signs.add( sign )
+      else:
+        sign_ids_to_unplace.append( int( placed_sign[ 'id' ] ) )
+    if sign_ids_to_unplace:
+      vimsupport.UnplaceSigns( self._bufnr, sign_ids_to_unplace )
 
-      # We always go for the first diagnostic on the line because diagnostics
-      # are sorted by errors in priority and Vim can only display one sign by
-      # line.
-      name = 'YcmError' if _DiagnosticIsError( diags[ 0 ] ) else 'YcmWarning'
-      sign = {
-          'lnum': line,
-          'name': name,
-          'buffer': self._bufnr,
-          'group': 'ycm_signs'
-      }
-      try:
-        signs_to_unplace.remove( sign )
-      except ValueError:
-        signs_to_place.append( sign )
-    vim.eval( f'sign_placelist( { signs_to_place } )' )
-    vim.eval( f'sign_unplacelist( { signs_to_unplace } )' )
+    signs_to_place = sorted( signs - kept_signs )
+    if signs_to_place:
+      vimsupport.PlaceSigns( self._bufnr, signs_to_place )
 
 
   def _ConvertDiagListToDict( self ):
-    self._line_to_diags = defaultdict( list )
-    for diag in self._diagnostics:
-      location_extent = diag[ 'location_extent' ]
-      start = location_extent[ 'start' ]
-      end = location_extent[ 'end' ]
-      bufnr = vimsupport.GetBufferNumberForFilename( start[ 'filepath' ] )
-      if bufnr == self._bufnr:
-        for line_number in range( start[ 'line_num' ], end[ 'line_num' ] + 1 ):
-          self._line_to_diags[ line_number ].append( diag )
-
-    for diags in self._line_to_diags.values():
-      # We also want errors to be listed before warnings so that errors aren't
-      # hidden by the warnings; Vim won't place a sign over an existing one.
-      diags.sort( key = lambda diag: ( diag[ 'kind' ],
-                                       diag[ 'location' ][ 'column_num' ] ) )
+    self._buffer_diags = [
+      diag for diag in self._diagnostics
+      if vimsupport.GetBufferNumberForFilename(
+        diag[ 'location_extent' ][ 'start' ][ 'filepath' ] ) == self._bufnr ]
+    # We also want errors to be listed before warnings so that errors aren't
+    # hidden by the warnings; Vim won't place a sign over an existing one.
+    self._buffer_diags.sort( key = _DiagnosticSortKey )
+    self._line_index = _LineIntervalIndex(
+      ( _DiagnosticStartLine( diag ), _DiagnosticEndLine( diag ), diag )
+      for diag in self._buffer_diags )
+    self._error_count = sum( 1 for diag in self._buffer_diags
+                             if _DiagnosticIsError( diag ) )
+    self._warning_count = sum( 1 for diag in self._buffer_diags
+                               if _DiagnosticIsWarning( diag ) )
+
+
+class _LineIntervalIndex:
+  """Items spanning ranges of lines, stored as an interval tree so that the
+  ones overlapping some lines are found without going through all of them.
+
+  The tree is implicit: the items are sorted by first line and the root of the
+  subtree holding the items from |lo| (included) to |hi| (excluded) is the one
+  in the middle. The greatest last line of the items of each subtree is kept at
+  the position of its root: when it's before the lines looked for, none of these
+  items overlap them."""
+
+  def __init__( self, items_with_lines ):
+    entries = sorted( ( ( start_line, end_line, position, item )
+                        for position, ( start_line, end_line, item ) in
+                        enumerate( items_with_lines ) ),
+                      key = lambda entry: entry[ 0 ] )
+    self._start_lines = [ entry[ 0 ] for entry in entries ]
+    self._end_lines = [ entry[ 1 ] for entry in entries ]
+    self._max_end_lines = list( self._end_lines )
+    self._entries = entries
+    self._ComputeMaxEndLines( 0, len( entries ) )
+
+
+  def _ComputeMaxEndLines( self, lo, hi ):
+    """Compute the greatest last line of the items of the subtree from |lo| to
+    |hi| and of all its subtrees. Return it or None if the subtree is empty."""
+    if lo >= hi:
+      return None
+    middle = ( lo + hi ) // 2
+    for max_end_line in ( self._ComputeMaxEndLines( lo, middle ),
+                          self._ComputeMaxEndLines( middle + 1, hi ) ):
+      if max_end_line is not None:
+        self._max_end_lines[ middle ] = max( self._max_end_lines[ middle ],
+                                             max_end_line )
+    return self._max_end_lines[ middle ]
+
+
+  def Overlapping( self, start_line, end_line ):
+    """Return the items overlapping the lines |start_line| to |end_line|
+    included, in the order they were given."""
+    found = []
+    subtrees = [ ( 0, len( self._entries ) ) ]
+    while subtrees:
+      lo, hi = subtrees.pop()
+      if lo >= hi:
+        continue
+      middle = ( lo + hi ) // 2
+      if self._max_end_lines[ middle ] < start_line:
+        continue
+      subtrees.append( ( lo, middle ) )
+      # The items after the root start after it.
+      if self._start_lines[ middle ] > end_line:
+        continue
+      if self._end_lines[ middle ] >= start_line:
+        found.append( self._entries[ middle ] )
+      subtrees.append( ( middle + 1, hi ) )
+    found.sort( key = lambda entry: entry[ 2 ] )
+    return [ entry[ 3 ] for entry in found ]
+
+
+def _DiagnosticSortKey( diag ):
+  return ( diag[ 'kind' ], diag[ 'location' ][ 'column_num' ] )
+
+
+def _DiagnosticStartLine( diag ):
+  return diag[ 'location_extent' ][ 'start' ][ 'line_num' ]
+
+
+def _DiagnosticEndLine( diag ):
+  return diag[ 'location_extent' ][ 'end' ][ 'line_num' ]
 
 
 _DiagnosticIsError = CompileLevel( 'error' )
 _DiagnosticIsWarning = CompileLevel( 'warning' )
 
 
+def _TextPropertyKey( prop ):
+  return ( prop.type, prop.line, prop.column, prop.length )
+
+
 def _NormalizeDiagnostic( diag ):
   def ClampToOne( value ):
     return value if value > 0 else 1
@@ -16,20 +16,37 @@
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
 import vim
-from ycm import vimsupport
+from ycm import candidate_filter, vimsupport
 from ycmd import utils
 from ycmd.completers.completer import Completer
-from ycm.client.base_request import BaseRequest
 
 OMNIFUNC_RETURNED_BAD_VALUE = 'Omnifunc returned bad value to YCM!'
 OMNIFUNC_NOT_LIST = ( 'Omnifunc did not return a list or a dict with a "words" '
                      ' list when expected.' )
 
 
+class _CachedCandidates:
+  """Candidates returned by the omnifunc for an identifier. They are narrowed
+  down as more characters of the identifier are typed."""
+  def __init__( self, key, start_column, candidates ):
+    self.key = key
+    self.start_column = start_column
+    self.candidates = candidates
+    self._index = None
+
+
+  def Filter( self, query, sort_property, max_candidates ):
+    if self._index is None:
+      self._index = candidate_filter.CandidateIndex( self.candidates,
+                                                     sort_property )
+    return self._index.FilterAndSort( query, max_candidates )
+
+
 class OmniCompleter( Completer ):
   def __init__( self, user_options ):
     super( OmniCompleter, self ).__init__( user_options )
     self._omnifunc = None
+    self._cached_candidates = None
 
 
   def SupportedFiletypes( self ):
@@ -44,9 +61,19 @@ class OmniCompleter( Completer ):
     self._omnifunc = utils.ToUnicode( vim.eval( '&omnifunc' ) )
     if not self._omnifunc:
       return False
+    if not self.ShouldUseNowInner( request_data ):
+      self.InvalidateCache()
+      return False
     if self.ShouldUseCache():
-      return super( OmniCompleter, self ).ShouldUseNow( request_data )
-    return self.ShouldUseNowInner( request_data )
+      # Let the server complete if the omnifunc didn't return anything for the
+      # identifier.
+      cached_candidates = self._GetCachedCandidates( request_data )
+      return cached_candidates is None or bool( cached_candidates.candidates )
+    return True
+
+
+  def InvalidateCache( self ):
+    self._cached_candidates = None
 
 
   def ShouldUseNowInner( self, request_data ):
@@ -60,11 +87,57 @@ class OmniCompleter( Completer ):
 
 
   def ComputeCandidates( self, request_data ):
-    if self.ShouldUseCache():
-      return super( OmniCompleter, self ).ComputeCandidates( request_data )
-    if self.ShouldUseNowInner( request_data ):
-      return self.ComputeCandidatesInner( request_data )
-    return []
+    if not self.ShouldUseCache():
+      if self.ShouldUseNowInner( request_data ):
+        return self.ComputeCandidatesInner( request_data )
+      return []
+
+    if ( not request_data[ 'force_semantic' ] and
+         not self.ShouldUseNow( request_data ) ):
+      return []
+
+    # Neither the omnifunc nor the server are needed when more characters of
+    # the same identifier are typed.
+    cached_candidates = self._GetCachedCandidates( request_data )
+    if cached_candidates:
+      request_data[ 'start_column' ] = cached_candidates.start_column
+    else:
+      key = self._CacheKey( request_data )
+      candidates = self.ComputeCandidatesInner( request_data )
+      cached_candidates = _CachedCandidates( key,
+                                             request_data[ 'start_column' ],
+                                             candidates )
+      self._cached_candidates = cached_candidates
+
+    if not cached_candidates.candidates:
+      return []
+    sort_property = ( 'word' if isinstance( cached_candidates.candidates[ 0 ],
+                                            dict ) else '' )
+    return cached_candidates.Filter( request_data[ 'query' ],
+                                     sort_property,
+                                     self.user_options[ 'max_num_candidates' ] )
+
+
+  def _CacheKey( self, request_data ):
+    """Return what must not change for the candidates of the omnifunc to be
+    reused: the omnifunc, the buffer, the line, and the text around the
+    identifier being completed."""
+    line, column = vimsupport.CurrentLineAndColumn()
+    contents = utils.ToBytes( vimsupport.CurrentLineContents() )
+    start_column = request_data[ 'start_column' ] - 1
+    return ( self._omnifunc,
+             vimsupport.GetCurrentBufferNumber(),
+             line,
+             contents[ : start_column ],
+             contents[ column : ] )
+
+
+  def _GetCachedCandidates( self, request_data ):
+    cached_candidates = self._cached_candidates
+    if ( cached_candidates and
+         cached_candidates.key == self._CacheKey( request_data ) ):
+      return cached_candidates
+    return None
 
 
   def ComputeCandidatesInner( self, request_data ):
@@ -141,12 +214,8 @@ class OmniCompleter( Completer ):
 
 
   def FilterAndSortCandidatesInner( self, candidates, sort_property, query ):
-    request_data = {
-      'candidates': candidates,
-      'sort_property': sort_property,
-      'query': query
-    }
-
-    response = BaseRequest().PostDataToHandler( request_data,
-                                                'filter_and_sort_candidates' )
-    return response if response is not None else []
+    return candidate_filter.FilterAndSortCandidates(
+      candidates,
+      query,
+      sort_property,
+      self.user_options[ 'max_num_candidates' ] )
@@ -39,7 +39,12 @@ class ScrollingBufferRange( object ):
 
   def Request( self, force=False ):
     if self._request and not self.Ready():
-      return True
+      if self._tick == vimsupport.GetBufferChangedTick( self._bufnr ):
+        return True
+      # The buffer changed since the request was sent so its response would be
+      # discarded anyway.
+      self._request.Cancel()
+      self._request = None
 
     # Check to see if the buffer ranges would actually change anything visible.
     # This avoids a round-trip for every single line scroll event
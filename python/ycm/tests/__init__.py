@@ -53,6 +53,13 @@ DEFAULT_CLIENT_OPTIONS = {
   'g:ycm_seed_identifiers_with_syntax': 0,
   'g:ycm_goto_buffer_command': 'same-buffer',
   'g:ycm_update_diagnostics_in_insert_mode': 1,
+  'g:ycm_incremental_buffer_sync': 1,
+  'g:ycm_server_use_unix_socket': 0,
+  'g:ycm_server_compression_threshold': 16384,
+  'g:ycm_speculative_completion': 0,
+  'g:ycm_completion_resolve_ahead': 3,
+  'g:ycm_highlight_visible_diagnostics_only': 0,
+  'g:ycm_completion_page_size': 100,
   # ycmd options
   'g:ycm_auto_trigger': 1,
   'g:ycm_min_num_of_chars_for_completion': 2,
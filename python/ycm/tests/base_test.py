@@ -17,7 +17,12 @@
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
 import contextlib
-from hamcrest import assert_that, equal_to
+import os
+import random
+import string
+import time
+import unittest
+from hamcrest import assert_that, equal_to, same_instance
 from unittest import TestCase
 from unittest.mock import patch
 
@@ -26,6 +31,24 @@ vim_mock = MockVimModule()
 from ycm import base
 
 
+def _RandomCandidates():
+  random.seed( 0 )
+  return [ {
+    'word': ''.join( random.choice( string.ascii_letters + '_' )
+                     for _ in range( random.randint( 3, 30 ) ) ),
+    'abbr': ''
+  } for _ in range( 10000 ) ]
+
+
+def _AdjustOneAtATime( candidates, text_after_cursor ):
+  new_words = []
+  for candidate in candidates:
+    overlap_len = base.OverlapLength( candidate[ 'word' ], text_after_cursor )
+    new_words.append( candidate[ 'word' ][ : -overlap_len ] if overlap_len else
+                      candidate[ 'word' ] )
+  return new_words
+
+
 @contextlib.contextmanager
 def MockCurrentFiletypes( filetypes = [ '' ] ):
   with patch( 'ycm.vimsupport.CurrentFiletypes', return_value = filetypes ):
@@ -94,6 +117,13 @@ class BaseTest( TestCase ):
                      { 'word': 'foofoo', 'abbr': '' } ] ) ) )
 
 
+  def test_AdjustCandidateInsertionText_NotSuffixNotCopied( self ):
+    candidate = { 'word': 'foofoo', 'abbr': 'foofoo' }
+    with MockTextAfterCursor( 'bar' ):
+      new_candidates = base.AdjustCandidateInsertionText( [ candidate ] )
+    assert_that( new_candidates[ 0 ], same_instance( candidate ) )
+
+
   def test_AdjustCandidateInsertionText_NothingAfterCursor( self ):
     with MockTextAfterCursor( '' ):
       assert_that( [ { 'word': 'foofoo', 'abbr': '' },
@@ -130,6 +160,37 @@ class BaseTest( TestCase ):
                      { 'word': 'foobar' } ] ) ) )
 
 
+  def test_AdjustCandidateInsertionText_SameAsOverlapLength( self ):
+    candidates = _RandomCandidates()
+    for text_after_cursor in [ 'bar', 'foo_bar_baz(qux)', 'a' * 40, ')' ]:
+      with MockTextAfterCursor( text_after_cursor ):
+        new_candidates = base.AdjustCandidateInsertionText( candidates )
+
+      assert_that( [ candidate[ 'word' ] for candidate in new_candidates ],
+                   equal_to( _AdjustOneAtATime( candidates,
+                                                text_after_cursor ) ) )
+
+
+  @unittest.skipUnless( os.environ.get( 'YCM_BENCHMARK' ),
+                        'set YCM_BENCHMARK to run benchmarks' )
+  def test_AdjustCandidateInsertionText_Benchmark( self ):
+    # Compare with adjusting 10k candidates one at a time using OverlapLength.
+    # Nothing is asserted on the timings as they depend on the machine.
+    candidates = _RandomCandidates()
+    for text_after_cursor in [ 'bar', 'foo_bar_baz(qux)', 'a' * 40, ')' ]:
+      with MockTextAfterCursor( text_after_cursor ):
+        start_time = time.perf_counter()
+        base.AdjustCandidateInsertionText( candidates )
+        batched_time = time.perf_counter() - start_time
+
+      start_time = time.perf_counter()
+      _AdjustOneAtATime( candidates, text_after_cursor )
+      one_at_a_time_time = time.perf_counter() - start_time
+
+      print( '{!r}: batched {:.4f}s, one at a time {:.4f}s'.format(
+        text_after_cursor, batched_time, one_at_a_time_time ) )
+
+
   def test_OverlapLength_Basic( self ):
     assert_that( 3, equal_to( base.OverlapLength( 'foo bar', 'bar zoo' ) ) )
     assert_that( 3, equal_to( base.OverlapLength( 'foobar', 'barzoo' ) ) )
@@ -0,0 +1,266 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import Future
+from hamcrest import assert_that, equal_to, has_entries, has_key, is_not
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from ycm.tests.test_utils import MockVimBuffers, MockVimModule, VimBuffer
+MockVimModule()
+
+from ycm.buffer_sync import BufferSync, FileDataToResend
+from ycm.client.base_request import BaseRequest
+
+
+def _SendBufferData( buffer_sync, vim_buffer ):
+  """Return the file data of a request that the server successfully handled."""
+  buffer_data = buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+  buffer_sync.Acknowledge( { '/buffer': buffer_data } )
+  return buffer_data
+
+
+class BufferSyncTest( TestCase ):
+  def test_BufferSync_FirstRequestSendsContents( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo', 'bar' ],
+                            filetype = 'cpp' )
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      assert_that(
+        BufferSync().GetBufferData( vim_buffer, '/buffer' ),
+        equal_to( {
+          'contents': 'foo\nbar\n',
+          'filetypes': [ 'cpp' ],
+          'version': 1
+        } )
+      )
+
+
+  def test_BufferSync_UnchangedBuffer( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo', 'bar' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+      assert_that(
+        buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+        has_entries( {
+          'version': 1,
+          'base_version': 1,
+          'changes': []
+        } )
+      )
+
+
+  def test_BufferSync_ChangedLines( self ):
+    vim_buffer = VimBuffer( 'buffer',
+                            contents = [ 'foo', 'bar', 'baz', 'qux' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+
+      vim_buffer.contents = [ 'foo', 'zoo', 'zoo', 'baz', 'qux' ]
+      vim_buffer.changedtick = 2
+      buffer_data = _SendBufferData( buffer_sync, vim_buffer )
+      assert_that( buffer_data, is_not( has_key( 'contents' ) ) )
+      assert_that( buffer_data, has_entries( {
+        'version': 2,
+        'base_version': 1,
+        'changes': [ {
+          'start_line': 1,
+          'end_line': 2,
+          'lines': [ 'zoo', 'zoo' ]
+        } ]
+      } ) )
+
+      vim_buffer.contents = [ 'foo', 'qux' ]
+      vim_buffer.changedtick = 3
+      assert_that(
+        buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+        has_entries( {
+          'version': 3,
+          'base_version': 2,
+          'changes': [ {
+            'start_line': 1,
+            'end_line': 4,
+            'lines': []
+          } ]
+        } )
+      )
+
+
+  def test_BufferSync_ContentsUntilAcknowledged( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+
+      vim_buffer.contents = [ 'bar' ]
+      vim_buffer.changedtick = 2
+      assert_that( buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+                   has_entries( { 'contents': 'bar\n', 'version': 2 } ) )
+
+
+  def test_BufferSync_DeltaFromAcknowledgedVersion( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+
+      # Neither version 2 nor 3 is acknowledged, e.g. because the requests are
+      # still pending, so both deltas are based on version 1.
+      vim_buffer.contents = [ 'foo', 'bar' ]
+      vim_buffer.changedtick = 2
+      second_data = buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+      assert_that( second_data, has_entries( {
+        'version': 2,
+        'base_version': 1,
+        'changes': [ { 'start_line': 1, 'end_line': 1, 'lines': [ 'bar' ] } ]
+      } ) )
+
+      vim_buffer.contents = [ 'foo', 'bar', 'baz' ]
+      vim_buffer.changedtick = 3
+      third_data = buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+      assert_that( third_data, has_entries( {
+        'version': 3,
+        'base_version': 1,
+        'changes': [ {
+          'start_line': 1,
+          'end_line': 1,
+          'lines': [ 'bar', 'baz' ]
+        } ]
+      } ) )
+
+      # Acknowledgements received out of order.
+      buffer_sync.Acknowledge( { '/buffer': third_data } )
+      buffer_sync.Acknowledge( { '/buffer': second_data } )
+      assert_that( buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+                   has_entries( {
+                     'version': 3,
+                     'base_version': 3,
+                     'changes': []
+                   } ) )
+
+
+  @patch( 'ycm.client.base_request.BaseRequest.wakeup_channel', None )
+  def test_BufferSync_CancelledRequestNotAcknowledged( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo' ] )
+    buffer_sync = BufferSync()
+    executor = MagicMock()
+    executor.submit_with_priority.side_effect = lambda *args: Future()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ), \
+         patch( 'ycm.client.base_request.BaseRequest.buffer_sync',
+                buffer_sync ), \
+         patch( 'ycm.client.base_request.BaseRequest.Executor',
+                return_value = executor ):
+      future = BaseRequest._TalkToHandlerAsync( {
+        'file_data': {
+          '/buffer': buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+        }
+      }, 'event_notification', 'POST' )
+      future.set_result( {} )
+
+      # This request is cancelled while queued so the server never gets
+      # version 2.
+      vim_buffer.contents = [ 'bar' ]
+      vim_buffer.changedtick = 2
+      future = BaseRequest._TalkToHandlerAsync( {
+        'file_data': {
+          '/buffer': buffer_sync.GetBufferData( vim_buffer, '/buffer' )
+        }
+      }, 'event_notification', 'POST' )
+      future.cancel()
+
+      vim_buffer.contents = [ 'baz' ]
+      vim_buffer.changedtick = 3
+      assert_that( buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+                   has_entries( {
+                     'version': 3,
+                     'base_version': 1,
+                     'changes': [ {
+                       'start_line': 0,
+                       'end_line': 1,
+                       'lines': [ 'baz' ]
+                     } ]
+                   } ) )
+
+
+  def test_BufferSync_RepeatedLines( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'a', 'a' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+
+      vim_buffer.contents = [ 'a', 'a', 'a' ]
+      vim_buffer.changedtick = 2
+      assert_that(
+        buffer_sync.GetBufferData( vim_buffer, '/buffer' )[ 'changes' ],
+        equal_to( [ { 'start_line': 2, 'end_line': 2, 'lines': [ 'a' ] } ] )
+      )
+
+
+  def test_BufferSync_ResetSendsContentsAgain( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+      buffer_sync.Reset()
+      assert_that( buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+                   has_entries( { 'contents': 'foo\n', 'version': 2 } ) )
+
+
+  def test_BufferSync_ForgetBuffer( self ):
+    vim_buffer = VimBuffer( 'buffer', number = 3, contents = [ 'foo' ] )
+    buffer_sync = BufferSync()
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      _SendBufferData( buffer_sync, vim_buffer )
+      buffer_sync.ForgetBuffer( 3 )
+      assert_that( buffer_sync.GetBufferData( vim_buffer, '/buffer' ),
+                   has_key( 'contents' ) )
+
+
+  def test_FileDataToResend( self ):
+    assert_that(
+      FileDataToResend( {
+        '/foo': {
+          'contents': 'foo\n',
+          'filetypes': [ 'cpp' ],
+          'version': 1
+        },
+        '/bar': {
+          'filetypes': [ 'cpp' ],
+          'version': 3,
+          'base_version': 2,
+          'changes': [ {
+            'start_line': 1,
+            'end_line': 2,
+            'lines': [ 'zoo' ]
+          } ]
+        }
+      } ),
+      equal_to( {
+        '/foo': {
+          'contents': 'foo\n',
+          'filetypes': [ 'cpp' ],
+          'version': 1
+        },
+        '/bar': {
+          'filetypes': [ 'cpp' ],
+          'version': 3,
+          'base_version': 3,
+          'changes': []
+        }
+      } )
+    )
@@ -0,0 +1,149 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+from hamcrest import assert_that, contains_exactly, empty
+from unittest import TestCase
+
+from ycm.candidate_filter import CandidateIndex, FilterAndSortCandidates
+
+
+class CandidateFilterTest( TestCase ):
+  def test_FilterAndSortCandidates_Subsequence( self ):
+    assert_that( FilterAndSortCandidates( [ 'foobar', 'fbr', 'barfoo' ],
+                                          'fbr',
+                                          '' ),
+                 contains_exactly( 'fbr', 'foobar' ) )
+
+
+  def test_FilterAndSortCandidates_SmartCase( self ):
+    assert_that( FilterAndSortCandidates( [ 'FooBar', 'foobar' ], 'fb', '' ),
+                 contains_exactly( 'FooBar', 'foobar' ) )
+    assert_that( FilterAndSortCandidates( [ 'FooBar', 'foobar' ], 'fB', '' ),
+                 contains_exactly( 'FooBar' ) )
+    assert_that( FilterAndSortCandidates( [ 'FooBar', 'foobar' ], 'Fx', '' ),
+                 empty() )
+
+
+  def test_FilterAndSortCandidates_WordBoundariesFirst( self ):
+    assert_that(
+      FilterAndSortCandidates( [ 'gxxfoo', 'getFoo', 'get_foo', 'gf' ],
+                               'gf',
+                               '' ),
+      contains_exactly( 'getFoo', 'get_foo', 'gf', 'gxxfoo' ) )
+
+
+  def test_FilterAndSortCandidates_MoreWordBoundaryMatchesFirst( self ):
+    # Not all the query characters have to match word boundaries.
+    assert_that( FilterAndSortCandidates( [ 'abcx', 'aBxc' ], 'abc', '' ),
+                 contains_exactly( 'aBxc', 'abcx' ) )
+
+
+  def test_FilterAndSortCandidates_FirstCharacterFirst( self ):
+    assert_that( FilterAndSortCandidates( [ 'abc', 'bc' ], 'bc', '' ),
+                 contains_exactly( 'bc', 'abc' ) )
+
+
+  def test_FilterAndSortCandidates_FirstCharacterSmartCase( self ):
+    # The first character of the query doesn't match that of 'aAbx' since it's
+    # uppercase so the shorter text comes first.
+    assert_that( FilterAndSortCandidates( [ 'aAbx', 'bAb' ], 'Ab', '' ),
+                 contains_exactly( 'bAb', 'aAbx' ) )
+    assert_that( FilterAndSortCandidates( [ 'xAb', 'Abxx' ], 'ab', '' ),
+                 contains_exactly( 'Abxx', 'xAb' ) )
+
+
+  def test_FilterAndSortCandidates_SameOrderAsYcmd( self ):
+    assert_that( FilterAndSortCandidates( [ 'STDIN_FILENO', 'stdin' ],
+                                          'std',
+                                          '' ),
+                 contains_exactly( 'stdin', 'STDIN_FILENO' ) )
+    assert_that( FilterAndSortCandidates( [ 'Foobar', 'foobar' ], 'foo', '' ),
+                 contains_exactly( 'foobar', 'Foobar' ) )
+    assert_that( FilterAndSortCandidates( [ 'CompleterTest', 'CompleterT' ],
+                                          'co',
+                                          '' ),
+                 contains_exactly( 'CompleterT', 'CompleterTest' ) )
+    assert_that(
+      FilterAndSortCandidates( [ 'ReadFromFile', 'readFile', 'rfile', 'RF' ],
+                               'rf',
+                               '' ),
+      contains_exactly( 'readFile', 'ReadFromFile', 'RF', 'rfile' ) )
+
+
+  def test_FilterAndSortCandidates_WordBoundariesAreLetters( self ):
+    # Like ycmd, a digit after a punctuation character doesn't start a word.
+    assert_that( FilterAndSortCandidates( [ 'x_1y', 'x1yz' ], 'x1', '' ),
+                 contains_exactly( 'x1yz', 'x_1y' ) )
+    # Neither does a leading punctuation character.
+    assert_that( FilterAndSortCandidates( [ '_fxo', 'fxxo' ], '_f', '' ),
+                 contains_exactly( '_fxo' ) )
+    assert_that( FilterAndSortCandidates( [ '_abc', 'a_bc' ], 'ab', '' ),
+                 contains_exactly( 'a_bc', '_abc' ) )
+
+
+  def test_FilterAndSortCandidates_SmartBase( self ):
+    candidates = [ 'café', 'CAFÉ', 'cafe' ]
+    assert_that( FilterAndSortCandidates( candidates, 'cafe', '' ),
+                 contains_exactly( 'cafe', 'café', 'CAFÉ' ) )
+    assert_that( FilterAndSortCandidates( candidates, 'café', '' ),
+                 contains_exactly( 'café', 'CAFÉ' ) )
+    assert_that( FilterAndSortCandidates( candidates, 'CAFE', '' ),
+                 contains_exactly( 'CAFÉ' ) )
+    assert_that( FilterAndSortCandidates( candidates, 'cafÉ', '' ),
+                 contains_exactly( 'CAFÉ' ) )
+
+
+  def test_FilterAndSortCandidates_NoCasedCharactersIsLowercase( self ):
+    # A text without any uppercase character is lowercase, like in ycmd.
+    assert_that( FilterAndSortCandidates( [ 'A_', '~_' ], '_', '' ),
+                 contains_exactly( '~_', 'A_' ) )
+
+
+  def test_FilterAndSortCandidates_EmptyQuery( self ):
+    assert_that( FilterAndSortCandidates( [ 'b', 'Ab', 'a' ], '', '' ),
+                 contains_exactly( 'a', 'b', 'Ab' ) )
+
+
+  def test_FilterAndSortCandidates_SortProperty( self ):
+    candidates = [ { 'insertion_text': 'bar' }, { 'insertion_text': 'baz' } ]
+    assert_that( FilterAndSortCandidates( candidates, 'bz' ),
+                 contains_exactly( { 'insertion_text': 'baz' } ) )
+
+
+  def test_FilterAndSortCandidates_MaxCandidates( self ):
+    assert_that( FilterAndSortCandidates( [ 'ab', 'a', 'abc' ], 'a', '', 2 ),
+                 contains_exactly( 'a', 'ab' ) )
+
+
+  def test_CandidateIndex_QueryExtended( self ):
+    index = CandidateIndex( [ 'foobar', 'fbr', 'barfoo', 'qux' ], '' )
+    assert_that( index.FilterAndSort( 'f' ),
+                 contains_exactly( 'fbr', 'foobar', 'barfoo' ) )
+    assert_that( index.FilterAndSort( 'fb' ),
+                 contains_exactly( 'fbr', 'foobar' ) )
+    assert_that( index.FilterAndSort( 'fbr', 1 ), contains_exactly( 'fbr' ) )
+
+
+  def test_CandidateIndex_QueryChanged( self ):
+    index = CandidateIndex( [ { 'key': 'foo' }, { 'key': 'bar' } ], 'key' )
+    assert_that( index.FilterAndSort( 'fo' ),
+                 contains_exactly( { 'key': 'foo' } ) )
+    # Candidates that didn't match the previous query are scanned again.
+    assert_that( index.FilterAndSort( 'b' ),
+                 contains_exactly( { 'key': 'bar' } ) )
+    assert_that( index.FilterAndSort( '' ),
+                 contains_exactly( { 'key': 'bar' }, { 'key': 'foo' } ) )
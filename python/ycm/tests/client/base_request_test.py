@@ -18,10 +18,31 @@
 from ycm.tests.test_utils import MockVimBuffers, MockVimModule, VimBuffer
 MockVimModule()
 
-from hamcrest import assert_that, has_entry
+import gzip
+import threading
+from base64 import b64encode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hamcrest import ( assert_that, calling, equal_to, has_entry, has_key,
+                       is_not, raises )
 from unittest import TestCase
-from unittest.mock import patch
-from ycm.client.base_request import BuildRequestData
+from unittest.mock import MagicMock, patch
+from ycm.client.base_request import ( _ConnectionPool,
+                                      _JsonChunks,
+                                      _JsonFromResponse,
+                                      _PostBodyAndHeaders,
+                                      _StreamingRequestBody,
+                                      _Response,
+                                      _ToUtf8Json,
+                                      BaseRequest,
+                                      BuildRequestData )
+from ycmd.hmac_utils import CreateHmac, CreateRequestHmac
+from ycmd.responses import ServerError
+
+
+def _ServerResponse( code, body, hmac_secret = b'secret', headers = None ):
+  headers = dict( headers or {} )
+  headers[ 'x-ycm-hmac' ] = b64encode( CreateHmac( body, hmac_secret ) )
+  return _Response( code, 'reason', headers, body )
 
 
 class BaseRequestTest( TestCase ):
@@ -40,3 +61,291 @@ class BaseRequestTest( TestCase ):
     with MockVimBuffers( [ current_buffer ], [ current_buffer ] ):
       assert_that( BuildRequestData( current_buffer.number ),
                    has_entry( 'working_dir', '/some/dir' ) )
+
+
+  @patch( 'ycm.client.base_request.BaseRequest._TalkToHandlerAsync' )
+  def test_BaseRequest_Cancel_Queued( self, talk_to_handler_async ):
+    request = BaseRequest()
+    request._response_future = MagicMock()
+    request._response_future.done.return_value = False
+    request._response_future.cancel.return_value = True
+
+    request.Cancel()
+
+    request._response_future.cancel.assert_called_once_with()
+    request._response_future.in_flight_request.Cancel.assert_not_called()
+    talk_to_handler_async.assert_not_called()
+
+
+  @patch( 'ycm.client.base_request.BaseRequest._TalkToHandlerAsync' )
+  def test_BaseRequest_Cancel_Running( self, talk_to_handler_async ):
+    request = BaseRequest()
+    request._response_future = MagicMock()
+    request._response_future.done.return_value = False
+    request._response_future.cancel.return_value = False
+
+    request.Cancel()
+
+    request._response_future.in_flight_request.Cancel.assert_called_once_with()
+    talk_to_handler_async.assert_not_called()
+
+
+  @patch( 'ycm.client.base_request.BaseRequest.server_capabilities',
+          frozenset( [ 'cancel' ] ) )
+  @patch( 'ycm.client.base_request.BaseRequest._TalkToHandlerAsync' )
+  def test_BaseRequest_Cancel_NotifyServer( self, talk_to_handler_async ):
+    request = BaseRequest()
+    request._response_future = MagicMock()
+    request._response_future.done.return_value = False
+    request._response_future.cancel.return_value = False
+    request._response_future.in_flight_request.id = 42
+
+    request.Cancel()
+
+    request._response_future.in_flight_request.Cancel.assert_called_once_with()
+    assert_that( talk_to_handler_async.call_args[ 0 ][ :3 ],
+                 equal_to( ( { 'request_id': 42 }, 'cancel', 'POST' ) ) )
+
+
+  def test_BaseRequest_Cancel_Done( self ):
+    request = BaseRequest()
+    request._response_future = MagicMock()
+    request._response_future.done.return_value = True
+
+    request.Cancel()
+
+    request._response_future.cancel.assert_not_called()
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_JsonFromResponse_Decoded( self ):
+    response = _ServerResponse( 200, b'{"foo": [1, 2]}' )
+    assert_that( _JsonFromResponse( b'uri', response ),
+                 equal_to( { 'foo': [ 1, 2 ] } ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_JsonFromResponse_InvalidHmac( self ):
+    response = _ServerResponse( 200, b'{}', hmac_secret = b'other' )
+    assert_that( calling( _JsonFromResponse ).with_args( b'uri', response ),
+                 raises( RuntimeError, 'Received invalid HMAC' ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_JsonFromResponse_ServerError( self ):
+    response = _ServerResponse(
+      500, b'{"exception": {"TYPE": "RuntimeError"}, "message": "oops"}' )
+    assert_that( calling( _JsonFromResponse ).with_args( b'uri', response ),
+                 raises( ServerError, 'RuntimeError: oops' ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_JsonFromResponse_Compressed( self ):
+    response = _ServerResponse( 200,
+                                gzip.compress( b'{"foo": "bar"}' ),
+                                headers = { 'content-encoding': 'gzip' } )
+    assert_that( _JsonFromResponse( b'uri', response ),
+                 equal_to( { 'foo': 'bar' } ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  @patch.object( BaseRequest, 'compression_threshold', 0 )
+  def test_PostBodyAndHeaders_CompressionDisabled( self ):
+    data = { 'contents': 'x' * 100 }
+    body, headers = _PostBodyAndHeaders( data, 'http://127.0.0.1/handler' )
+    assert_that( body, equal_to( _ToUtf8Json( data ) ) )
+    assert_that( headers, is_not( has_key( 'content-encoding' ) ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_PostBodyAndHeaders_BelowThreshold( self ):
+    data = { 'contents': 'x' * 100 }
+    json_body = _ToUtf8Json( data )
+    with patch.object( BaseRequest,
+                       'compression_threshold',
+                       len( json_body ) + 1 ):
+      body, headers = _PostBodyAndHeaders( data, 'http://127.0.0.1/handler' )
+    assert_that( body, equal_to( json_body ) )
+    assert_that( headers, is_not( has_key( 'content-encoding' ) ) )
+    assert_that( headers, has_entry( 'x-ycm-hmac', b64encode(
+      CreateRequestHmac( b'POST', b'/handler', json_body, b'secret' ) ) ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  def test_PostBodyAndHeaders_AtThreshold( self ):
+    data = { 'contents': 'x' * 100 }
+    json_body = _ToUtf8Json( data )
+    with patch.object( BaseRequest,
+                       'compression_threshold',
+                       len( json_body ) ):
+      body, headers = _PostBodyAndHeaders( data, 'http://127.0.0.1/handler' )
+    assert_that( gzip.decompress( body ), equal_to( json_body ) )
+    assert_that( len( body ) < len( json_body ), equal_to( True ) )
+    assert_that( headers, has_entry( 'content-encoding', 'gzip' ) )
+    # The HMAC is computed over the compressed body.
+    assert_that( headers, has_entry( 'x-ycm-hmac', b64encode(
+      CreateRequestHmac( b'POST', b'/handler', body, b'secret' ) ) ) )
+
+
+  @patch( 'ycm.client.base_request._STREAMING_CHUNK_SIZE', 8 )
+  def test_JsonChunks_SameAsJsonDumps( self ):
+    data = {
+      'file_data': {
+        '/foo': {
+          'contents': 'int main() {\n  return "\u00e9\U0001f600";\n}\n',
+          'filetypes': [ 'cpp' ]
+        }
+      },
+      'line_num': 1,
+      'force': False,
+      'extra': None
+    }
+    chunks = list( _JsonChunks( data ) )
+    assert_that( len( chunks ) > 1, equal_to( True ) )
+    assert_that( b''.join( chunks ), equal_to( _ToUtf8Json( data ) ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  @patch( 'ycm.client.base_request._STREAMING_CHUNK_SIZE', 8 )
+  def test_StreamingRequestBody_Trailers( self ):
+    data = { 'file_data': { '/foo': { 'contents': 'foo\n' * 10,
+                                      'filetypes': [ 'cpp' ] } } }
+    request_body = _StreamingRequestBody( data, 'POST', '/handler', False )
+    body = b''.join( request_body )
+    assert_that( body, equal_to( _ToUtf8Json( data ) ) )
+    assert_that( request_body.Trailers(), equal_to( {
+      'x-ycm-hmac': b64encode(
+        CreateRequestHmac( b'POST', b'/handler', body, b'secret' ) )
+    } ) )
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  @patch( 'ycm.client.base_request._STREAMING_CHUNK_SIZE', 8 )
+  def test_StreamingRequestBody_TrailersCompressed( self ):
+    data = { 'file_data': { '/foo': { 'contents': 'foo\n' * 10,
+                                      'filetypes': [ 'cpp' ] } } }
+    request_body = _StreamingRequestBody( data, 'POST', '/handler', True )
+    body = b''.join( request_body )
+    assert_that( gzip.decompress( body ), equal_to( _ToUtf8Json( data ) ) )
+    assert_that( request_body.Trailers(), equal_to( {
+      'x-ycm-hmac': b64encode(
+        CreateRequestHmac( b'POST', b'/handler', body, b'secret' ) )
+    } ) )
+
+    # The body can be sent again if the request is retried.
+    assert_that( b''.join( request_body ), equal_to( body ) )
+    assert_that( request_body.Trailers(), equal_to( {
+      'x-ycm-hmac': b64encode(
+        CreateRequestHmac( b'POST', b'/handler', body, b'secret' ) )
+    } ) )
+
+
+class _KeepAliveHandler( BaseHTTPRequestHandler ):
+  protocol_version = 'HTTP/1.1'
+
+  def setup( self ):
+    super().setup()
+    self.server.connections += 1
+
+
+  def _Handle( self ):
+    self.rfile.read( int( self.headers.get( 'content-length', 0 ) ) )
+    self.server.requests += 1
+    # Close the connection without answering, as if it had been closed while
+    # the request was sent.
+    if self.server.requests in self.server.requests_to_drop:
+      self.close_connection = True
+      return
+    self.send_response( 200 )
+    self.send_header( 'content-length', '2' )
+    self.end_headers()
+    self.wfile.write( b'{}' )
+    # Close the connection after answering, without telling the client.
+    if self.server.requests in self.server.requests_to_close_after:
+      self.close_connection = True
+
+
+  do_GET = _Handle
+  do_POST = _Handle
+
+
+  def log_message( self, *args ):
+    pass
+
+
+class _KeepAliveServer( ThreadingHTTPServer ):
+  daemon_threads = True
+
+  def __init__( self ):
+    super().__init__( ( '127.0.0.1', 0 ), _KeepAliveHandler )
+    self.connections = 0
+    self.requests = 0
+    self.requests_to_drop = set()
+    self.requests_to_close_after = set()
+    self.connection_closed = threading.Event()
+
+
+  def shutdown_request( self, request ):
+    super().shutdown_request( request )
+    self.connection_closed.set()
+
+
+class ConnectionPoolTest( TestCase ):
+  def setUp( self ):
+    self._server = _KeepAliveServer()
+    self._thread = threading.Thread( target = self._server.serve_forever,
+                                     kwargs = { 'poll_interval': 0.01 },
+                                     daemon = True )
+    self._thread.start()
+    self._uri = f'http://127.0.0.1:{ self._server.server_address[ 1 ] }/path'
+    self._pool = _ConnectionPool()
+
+
+  def tearDown( self ):
+    self._pool._CloseConnection()
+    self._server.shutdown()
+    self._server.server_close()
+    self._thread.join()
+
+
+  def _Request( self, method = 'POST' ):
+    return self._pool.Request( method, self._uri, b'{}', {}, 5 )
+
+
+  def test_ConnectionPool_Reuse( self ):
+    for _ in range( 3 ):
+      assert_that( self._Request().read(), equal_to( b'{}' ) )
+    assert_that( self._server.connections, equal_to( 1 ) )
+    assert_that( ( self._pool.hits, self._pool.misses ), equal_to( ( 2, 1 ) ) )
+
+
+  def test_ConnectionPool_Reset( self ):
+    self._Request()
+    self._pool.Reset()
+    self._Request()
+    assert_that( self._server.connections, equal_to( 2 ) )
+    assert_that( ( self._pool.hits, self._pool.misses ), equal_to( ( 0, 2 ) ) )
+
+
+  def test_ConnectionPool_ReconnectDropped( self ):
+    self._server.requests_to_close_after.add( 1 )
+    self._Request()
+    self._server.connection_closed.wait( 5 )
+    assert_that( self._Request().read(), equal_to( b'{}' ) )
+    assert_that( self._server.connections, equal_to( 2 ) )
+    assert_that( ( self._pool.hits, self._pool.misses ), equal_to( ( 0, 2 ) ) )
+
+
+  def test_ConnectionPool_RetryGetAfterSend( self ):
+    self._server.requests_to_drop.add( 2 )
+    self._Request( 'GET' )
+    assert_that( self._Request( 'GET' ).read(), equal_to( b'{}' ) )
+    assert_that( self._server.requests, equal_to( 3 ) )
+    assert_that( self._server.connections, equal_to( 2 ) )
+
+
+  def test_ConnectionPool_NoRetryPostAfterSend( self ):
+    self._server.requests_to_drop.add( 2 )
+    self._Request()
+    assert_that( calling( self._Request ), raises( ConnectionError ) )
+    assert_that( self._server.requests, equal_to( 2 ) )
@@ -16,13 +16,17 @@
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
-from hamcrest import assert_that, equal_to
+import threading
+from hamcrest import assert_that, equal_to, has_entries
 from unittest import TestCase
+from unittest.mock import patch
 from ycm.tests import UserOptions
-from ycm.tests.test_utils import MockVimModule
+from ycm.tests.mock_utils import MockAsyncServerResponseDone
+from ycm.tests.test_utils import MockVimBuffers, MockVimModule, VimBuffer
 vim_mock = MockVimModule()
 
 from ycm.client import completion_request
+from ycm.client.base_request import BaseRequest
 
 
 class ConvertCompletionResponseToVimDatasTest( TestCase ):
@@ -319,3 +323,332 @@ class ConvertCompletionResponseToVimDatasTest( TestCase ):
         'empty'    : 1,
         'user_data': json.dumps( extra_data ),
       } )
+
+
+class DisplayWidthOfStringTest( TestCase ):
+  def test_Ascii( self ):
+    assert_that( completion_request._DisplayWidthOfString( 'foo', 1 ),
+                 equal_to( 3 ) )
+
+
+  def test_WideAndCombiningCharacters( self ):
+    assert_that( completion_request._DisplayWidthOfString( '\u6f22e\u0301', 1 ),
+                 equal_to( 3 ) )
+
+
+  def test_AmbiguousCharacters( self ):
+    assert_that( completion_request._DisplayWidthOfString( '\u00b1', 1 ),
+                 equal_to( 1 ) )
+    assert_that( completion_request._DisplayWidthOfString( '\u00b1', 2 ),
+                 equal_to( 2 ) )
+
+
+class CompletionRequestTest( TestCase ):
+  def test_Response_CalledTwice( self ):
+    request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                      'column_num': 3 } )
+    request._response_future = MockAsyncServerResponseDone( {
+      'completion_start_column': 1,
+      'completions': [ { 'insertion_text': 'foo' } ]
+    } )
+
+    first_response = request.Response()
+    assert_that( request.Response(), equal_to( first_response ) )
+    assert_that( request._RawResponse()[ 'completions' ],
+                 equal_to( [ { 'insertion_text': 'foo' } ] ) )
+
+
+  def test_Response_ExtraDataNotSerialised( self ):
+    request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                      'column_num': 3 } )
+    request._response_future = MockAsyncServerResponseDone( {
+      'completion_start_column': 1,
+      'completions': [
+        { 'insertion_text': 'foo', 'extra_data': { 'resolve': 1 } },
+        { 'insertion_text': 'bar', 'extra_data': { 'resolve': 2 } }
+      ]
+    } )
+    other_request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                            'column_num': 3 } )
+    other_request._response_future = MockAsyncServerResponseDone( {
+      'completion_start_column': 1,
+      'completions': [ { 'insertion_text': 'foo' } ]
+    } )
+
+    with UserOptions( {} ), \
+         patch( 'ycm.client.completion_request.json.dumps' ) as dumps:
+      items = request.Response()[ 'completions' ]
+      other_items = other_request.Response()[ 'completions' ]
+    dumps.assert_not_called()
+
+    assert_that( [ request.ExtraDataForItem( item ) for item in items ],
+                 equal_to( [ { 'resolve': 1 }, { 'resolve': 2 } ] ) )
+    # Items of another request or not made by a completion request.
+    assert_that( request.ExtraDataForItem( other_items[ 0 ] ),
+                 equal_to( None ) )
+    assert_that( request.ExtraDataForItem( { 'user_data': '{"foo": 1}' } ),
+                 equal_to( { 'foo': 1 } ) )
+    assert_that( request.ExtraDataForItem( { 'user_data': '' } ),
+                 equal_to( None ) )
+    assert_that( request.ExtraDataForItem( {} ), equal_to( None ) )
+
+
+  @patch( 'ycm.client.completion_request.DisplayServerException' )
+  def test_Response_ServerResponseNotModified( self, display_exception ):
+    server_response = {
+      'completion_start_column': 1,
+      'completions': [ { 'insertion_text': 'foo' } ],
+      'errors': [ { 'exception': { 'TYPE': 'RuntimeError' },
+                    'message': 'oops' } ]
+    }
+    request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                      'column_num': 3 } )
+    request._response_future = MockAsyncServerResponseDone( server_response )
+
+    request.Response()
+    request.Response()
+    assert_that( request._RawResponse(), has_entries( {
+      'line': 1,
+      'column': 3,
+      'completions': [ { 'insertion_text': 'foo' } ]
+    } ) )
+    assert_that( server_response, equal_to( {
+      'completion_start_column': 1,
+      'completions': [ { 'insertion_text': 'foo' } ],
+      'errors': [ { 'exception': { 'TYPE': 'RuntimeError' },
+                    'message': 'oops' } ]
+    } ) )
+    display_exception.assert_called_once()
+
+
+  @patch.object( BaseRequest, 'hmac_secret', b'secret' )
+  @patch.object( BaseRequest, 'server_location', 'http://127.0.0.1:1234' )
+  @patch.object( BaseRequest, 'buffer_sync', None )
+  @patch.object( BaseRequest, 'wakeup_channel', None )
+  @patch.object( BaseRequest, 'connection_pool' )
+  def test_Response_ConvertedByWorker( self, connection_pool ):
+    released = threading.Event()
+    connection_pool.Request.side_effect = lambda *args: released.wait( 5 )
+    converted_when_done = []
+    current_buffer = VimBuffer( '/foo.py', contents = [ 'foo' ] )
+    with UserOptions( {} ), \
+         MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 2 ) ), \
+         patch( 'ycm.client.base_request._JsonFromResponse',
+                return_value = {
+                  'completion_start_column': 1,
+                  'completions': [ { 'insertion_text': 'foo' } ]
+                } ):
+      request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                        'column_num': 3 } )
+      request.Start()
+      request._response_future.add_done_callback(
+        lambda future: converted_when_done.append(
+          request._vim_completions is not None ) )
+      released.set()
+      request._response_future.result( timeout = 5 )
+
+    assert_that( converted_when_done, equal_to( [ True ] ) )
+    with patch( 'ycm.client.completion_request.'
+                '_ConvertCompletionDataToVimData' ) as convert:
+      completions = request.Response()[ 'completions' ]
+    convert.assert_not_called()
+    assert_that( [ c[ 'word' ] for c in completions ], equal_to( [ 'foo' ] ) )
+
+
+  def test_Response_ConversionFailedOnWorker( self ):
+    server_response = {
+      'completion_start_column': 1,
+      'completions': [ { 'insertion_text': 'foo' } ]
+    }
+    request = completion_request.CompletionRequest( { 'line_num': 1,
+                                                      'column_num': 3 } )
+    request._response_future = MockAsyncServerResponseDone( server_response )
+    with UserOptions( {} ), \
+         patch( 'ycm.client.completion_request.'
+                '_ConvertCompletionDatasToVimDatas',
+                side_effect = RuntimeError ):
+      request._ConvertCompletions( server_response,
+                                   completion_request._VimDataOptions() )
+
+    with UserOptions( {} ):
+      completions = request.Response()[ 'completions' ]
+    assert_that( [ c[ 'word' ] for c in completions ], equal_to( [ 'foo' ] ) )
+
+
+def _RequestData( column_num ):
+  return {
+    'filepath': '/foo.py',
+    'line_num': 1,
+    'column_num': column_num,
+    'force_semantic': False,
+    'file_data': { '/foo.py': { 'filetypes': [ 'python' ] } }
+  }
+
+
+def _StartCompletionRequest( contents, column_num, completions ):
+  current_buffer = VimBuffer( '/foo.py', contents = [ contents ] )
+  with MockVimBuffers( [ current_buffer ],
+                       [ current_buffer ],
+                       ( 1, column_num - 1 ) ):
+    request = completion_request.CompletionRequest(
+      _RequestData( column_num ) )
+    request._line = contents
+    request._response_future = MockAsyncServerResponseDone( {
+      'completion_start_column': 5,
+      'completions': [ { 'insertion_text': insertion_text }
+                       for insertion_text in completions ]
+    } )
+  return request
+
+
+def _Refine( request, contents, column_num ):
+  current_buffer = VimBuffer( '/foo.py', contents = [ contents ] )
+  with MockVimBuffers( [ current_buffer ],
+                       [ current_buffer ],
+                       ( 1, column_num - 1 ) ):
+    return request.Refine( _RequestData( column_num ) )
+
+
+class CompletionRequestRefineTest( TestCase ):
+  def test_Refine_MoreCharactersTyped( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      request = _StartCompletionRequest( 'foo.b', 6, [ 'qux', 'baz', 'bar' ] )
+      refined_request = _Refine( request, 'foo.ba', 7 )
+
+      assert_that( refined_request.Done(), equal_to( True ) )
+      response = refined_request._RawResponse()
+      assert_that( response[ 'completion_start_column' ], equal_to( 5 ) )
+      assert_that( response[ 'column' ], equal_to( 7 ) )
+      assert_that( [ c[ 'insertion_text' ] for c in response[ 'completions' ] ],
+                   equal_to( [ 'bar', 'baz' ] ) )
+
+      # Further refinements still use the candidates from the server.
+      refined_request = _Refine( refined_request, 'foo.q', 6 )
+      assert_that( refined_request, equal_to( None ) )
+      refined_request = _Refine( request, 'foo.bz', 7 )
+      assert_that( [ c[ 'insertion_text' ]
+                     for c in refined_request._RawResponse()[ 'completions' ] ],
+                   equal_to( [ 'baz' ] ) )
+
+
+  def test_Refine_SameOrderAsServer( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      request = _StartCompletionRequest(
+        'foo.r', 6, [ 'rfile', 'RF', 'ReadFromFile', 'readFile' ] )
+      refined_request = _Refine( request, 'foo.rf', 7 )
+      assert_that( [ c[ 'insertion_text' ]
+                     for c in refined_request._RawResponse()[ 'completions' ] ],
+                   equal_to( [ 'readFile', 'ReadFromFile', 'RF', 'rfile' ] ) )
+
+
+  def test_Refine_ExtraDataForItem( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      current_buffer = VimBuffer( '/foo.py', contents = [ 'foo.b' ] )
+      with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 5 ) ):
+        request = completion_request.CompletionRequest( _RequestData( 6 ) )
+        request._line = 'foo.b'
+        request._response_future = MockAsyncServerResponseDone( {
+          'completion_start_column': 5,
+          'completions': [
+            { 'insertion_text': 'baz', 'extra_data': { 'resolve': 1 } },
+            { 'insertion_text': 'bar', 'extra_data': { 'resolve': 2 } }
+          ]
+        } )
+        items = request.Response()[ 'completions' ]
+      refined_request = _Refine( request, 'foo.ba', 7 )
+      with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 6 ) ):
+        refined_items = refined_request.Response()[ 'completions' ]
+
+      assert_that( [ refined_request.ExtraDataForItem( item )
+                     for item in refined_items ],
+                   equal_to( [ { 'resolve': 2 }, { 'resolve': 1 } ] ) )
+      # The items of the original request are still known.
+      assert_that( refined_request.ExtraDataForItem( items[ 0 ] ),
+                   equal_to( { 'resolve': 1 } ) )
+      assert_that( request.ExtraDataForItem( refined_items[ 0 ] ),
+                   equal_to( { 'resolve': 2 } ) )
+
+
+  def test_Refine_TextBeforeIdentifierChanged( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      request = _StartCompletionRequest( 'foo.b', 6, [ 'bar' ] )
+      assert_that( _Refine( request, 'fox.ba', 7 ), equal_to( None ) )
+
+
+  def test_Refine_NonIdentifierCharacterTyped( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      request = _StartCompletionRequest( 'foo.b', 6, [ 'bar' ] )
+      assert_that( _Refine( request, 'foo.b.', 7 ), equal_to( None ) )
+
+
+  def test_Refine_CandidatesMayBeTruncated( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10,
+                        'g:ycm_max_num_candidates': 2 } ):
+      request = _StartCompletionRequest( 'foo.b', 6, [ 'baz', 'bar' ] )
+      assert_that( _Refine( request, 'foo.ba', 7 ), equal_to( None ) )
+
+
+  def test_Refine_NoCandidates( self ):
+    with UserOptions( { 'g:ycm_max_num_identifier_candidates': 10 } ):
+      request = _StartCompletionRequest( 'f', 2, [] )
+      assert_that( _Refine( request, 'fo', 3 ), equal_to( None ) )
+
+
+class CompletionRequestPageTest( TestCase ):
+  @patch( 'ycm.client.base_request.BaseRequest.server_capabilities',
+          frozenset( [ completion_request.COMPLETION_PAGES_CAPABILITY ] ) )
+  def test_NextPage( self ):
+    current_buffer = VimBuffer( '/foo.py', contents = [ 'foo.' ] )
+    request_data = _RequestData( 5 )
+    request_data[ 'file_data' ][ '/foo.py' ].update( {
+      'version': 2,
+      'base_version': 1,
+      'changes': [ { 'start_line': 0, 'end_line': 1, 'lines': [ 'foo.' ] } ]
+    } )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 4 ) ):
+      with patch( 'ycm.client.completion_request.CompletionRequest.'
+                  'PostDataToHandlerAsync',
+                  return_value = MockAsyncServerResponseDone( {
+                    'completion_start_column': 5,
+                    'completions': [ { 'insertion_text': 'bar' },
+                                     { 'insertion_text': 'baz' } ],
+                    'total_completions': 3
+                  } ) ) as post_data:
+        request = completion_request.CompletionRequest( request_data, 2 )
+        request.Start()
+        assert_that( post_data.call_args[ 0 ][ 0 ][ 'completion_page' ],
+                     equal_to( { 'start': 0, 'size': 2 } ) )
+
+        next_page = request.NextPage()
+        sent_data = post_data.call_args[ 0 ][ 0 ]
+        assert_that( sent_data[ 'completion_page' ],
+                     equal_to( { 'start': 2, 'size': 2 } ) )
+        # The server already holds the contents of the file.
+        assert_that( sent_data[ 'file_data' ][ '/foo.py' ],
+                     has_entries( { 'version': 2,
+                                    'base_version': 2,
+                                    'changes': [] } ) )
+        # The original request is left untouched.
+        assert_that( request.request_data[ 'completion_page' ],
+                     equal_to( { 'start': 0, 'size': 2 } ) )
+        assert_that( next_page.Done(), equal_to( True ) )
+
+        # A page of the completions can't be refined.
+        with patch( 'ycm.client.completion_request._MayBeTruncated',
+                    return_value = False ):
+          assert_that( _Refine( request, 'foo.b', 6 ), equal_to( None ) )
+
+      with patch( 'ycm.client.completion_request.CompletionRequest.'
+                  'PostDataToHandlerAsync',
+                  return_value = MockAsyncServerResponseDone( {
+                    'completion_start_column': 5,
+                    'completions': [ { 'insertion_text': 'qux' } ],
+                    'total_completions': 3
+                  } ) ):
+        next_page = request.NextPage()
+        assert_that( next_page.NextPage(), equal_to( None ) )
+
+
+  def test_NextPage_NotSupported( self ):
+    request = _StartCompletionRequest( 'foo.', 5, [ 'bar' ] )
+    assert_that( request.NextPage(), equal_to( None ) )
@@ -31,7 +31,6 @@ from unittest.mock import call, MagicMock, patch
 from ycm.tests import PathToTestFile, YouCompleteMeInstance
 from ycmd.responses import ServerError
 
-import json
 
 
 @contextlib.contextmanager
@@ -238,8 +237,9 @@ class CompletionTest( TestCase ):
         )
 
         item = response[ 'completions' ][ 0 ]
-        assert_that( json.loads( item[ 'user_data' ] ),
-                     has_entries( { 'resolve': 10 } ) )
+        assert_that(
+          ycm.GetCurrentCompletionRequest().ExtraDataForItem( item ),
+          has_entries( { 'resolve': 10 } ) )
 
       with MockResolveRequest( ResolveResponse ):
         assert_that( ycm.ResolveCompletionItem( item ), equal_to( True ) )
@@ -340,8 +340,9 @@ class CompletionTest( TestCase ):
         )
 
         item = response[ 'completions' ][ 0 ]
-        assert_that( json.loads( item[ 'user_data' ] ),
-                     has_entries( { 'resolve': 10 } ) )
+        assert_that(
+          ycm.GetCurrentCompletionRequest().ExtraDataForItem( item ),
+          has_entries( { 'resolve': 10 } ) )
 
       with MockResolveRequest( ResolveResponse ):
         assert_that( ycm.ResolveCompletionItem( item ), equal_to( True ) )
@@ -415,6 +416,80 @@ class CompletionTest( TestCase ):
         post_vim_message.assert_not_called()
 
 
+  @YouCompleteMeInstance( { 'g:ycm_completion_resolve_ahead': 2 } )
+  def test_ResolveCompletionItemsAhead( self, ycm ):
+
+    def Completion( resolve = None ):
+      extra_data = { 'doc_string': 'doc_string' }
+      if resolve is not None:
+        extra_data[ 'resolve' ] = resolve
+      return {
+        'insertion_text': 'insertion_text',
+        'detailed_info': 'detailed_info',
+        'extra_data': extra_data
+      }
+
+    def CompletionResponse( *args ):
+      return {
+        'completions': [ Completion(),
+                         Completion( 1 ),
+                         Completion( 2 ),
+                         Completion( 3 ) ],
+        'completion_start_column': 3,
+        'errors': []
+      }
+
+    def ResolveResponse( *args ):
+      return {
+        'completion': {
+          'insertion_text': 'insertion_text',
+          'extra_data': {
+            'doc_string': 'doc_string with more info'
+          }
+        },
+        'errors': []
+      }
+
+    def SentResolves( post_data ):
+      return [ args[ 0 ][ 'resolve' ] for args, _ in post_data.call_args_list ]
+
+    current_buffer = VimBuffer( 'buffer' )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ):
+      with MockCompletionRequest( CompletionResponse ):
+        ycm.SendCompletionRequest()
+        assert_that( ycm.CompletionRequestReady() )
+        items = ycm.GetCompletionResponse()[ 'completions' ]
+
+      post_data = MagicMock( return_value = MagicMock( return_value = True ) )
+      with patch( 'ycm.client.resolve_completion_request.'
+                  'ResolveCompletionRequest.PostDataToHandlerAsync',
+                  post_data ):
+        with patch( 'ycm.client.base_request._JsonFromFuture',
+                    side_effect = ResolveResponse ):
+          # The first items not resolved by the server are resolved ahead.
+          ycm.ResolveCompletionItemsAhead()
+          assert_that( SentResolves( post_data ), contains_exactly( 1, 2 ) )
+
+          # Selecting one of them doesn't send a new request.
+          assert_that( ycm.ResolveCompletionItem( items[ 1 ] ),
+                       equal_to( True ) )
+          assert_that( SentResolves( post_data ), contains_exactly( 1, 2 ) )
+          assert_that( ycm.CompletionRequestReady() )
+          assert_that(
+            ycm.GetCompletionResponse(),
+            has_entries( {
+              'completion': has_entries( {
+                'info': 'doc_string with more info'
+              } )
+            } )
+          )
+
+          # Only the neighbours that were not resolved yet are.
+          ycm.ResolveCompletionItemsAhead( 1 )
+          assert_that( SentResolves( post_data ),
+                       contains_exactly( 1, 2, 3 ) )
+
+
   @YouCompleteMeInstance()
   def test_ResolveCompletionItem_NoRequest( self, ycm ):
     assert_that( ycm.GetCurrentCompletionRequest(), equal_to( None ) )
@@ -469,8 +544,9 @@ class CompletionTest( TestCase ):
         )
 
         item = response[ 'completions' ][ 0 ]
-        assert_that( json.loads( item[ 'user_data' ] ),
-                     has_entries( { 'resolve': 10 } ) )
+        assert_that(
+          ycm.GetCurrentCompletionRequest().ExtraDataForItem( item ),
+          has_entries( { 'resolve': 10 } ) )
 
       with MockResolveRequest( ServerError( 'Server error' ) ):
         ycm.ResolveCompletionItem( item )
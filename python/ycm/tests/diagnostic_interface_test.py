@@ -15,15 +15,25 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 from ycm import diagnostic_interface
-from ycm.tests.test_utils import VimBuffer, MockVimModule, MockVimBuffers
+from ycm.tests import test_utils
+from ycm.tests.test_utils import ( VimBuffer,
+                                   MockVimModule,
+                                   MockVimBuffers,
+                                   VimProp,
+                                   VimSign )
 from hamcrest import ( assert_that,
                        contains_exactly,
+                       contains_inanyorder,
                        equal_to,
                        has_entries,
                        has_item )
+import random
 from unittest import TestCase
+from unittest.mock import patch
 MockVimModule()
 
+from ycm import vimsupport  # noqa
+
 
 def SimpleDiagnosticToJson( start_line, start_col, end_line, end_col ):
   return {
@@ -196,3 +206,307 @@ class DiagnosticInterfaceTest( TestCase ):
                                                          end_line,
                                                          end_col ),
                      equal_to( expect ) )
+
+
+def _UpdateMatches( diag_interface, current_buffer, diags ):
+  for diag in diags:
+    for location in [ diag[ 'location' ],
+                      diag[ 'location_extent' ][ 'start' ],
+                      diag[ 'location_extent' ][ 'end' ] ]:
+      location[ 'filepath' ] = current_buffer.name
+    diag[ 'text' ] = 'text'
+  diag_interface.UpdateWithNewDiagnostics( diags )
+
+
+class DiagnosticInterfaceUpdateMatchesTest( TestCase ):
+  def setUp( self ):
+    test_utils.VIM_PROPS_FOR_BUFFER.clear()
+    self._diag_interface = diagnostic_interface.DiagnosticInterface(
+      1,
+      {
+        'echo_current_diagnostic': 0,
+        'enable_diagnostic_signs': 0,
+        'enable_diagnostic_highlighting': 1,
+        'always_populate_location_list': 0,
+        'update_diagnostics_in_insert_mode': 1,
+        'highlight_visible_diagnostics_only': 0,
+        'filter_diagnostics': {}
+      } )
+
+
+  def test_UpdateMatches( self ):
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo bar', 'baz qux' ] )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ):
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 2, 5, 2, 8 ) ] )
+      props = list( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ] )
+      assert_that( props, contains_inanyorder(
+        VimProp( 'YcmErrorProperty', 1, 1, 1, 4 ),
+        VimProp( 'YcmErrorProperty', 1, 1, 1, 4 ),
+        VimProp( 'YcmErrorProperty', 2, 5, 2, 8 ),
+        VimProp( 'YcmErrorProperty', 2, 5, 2, 8 ) ) )
+      assert_that( len( { prop.id for prop in props } ), equal_to( 4 ) )
+
+      # Only the properties of the changed diagnostics are replaced.
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 2, 1, 2, 4 ) ] )
+      new_props = test_utils.VIM_PROPS_FOR_BUFFER[ 1 ]
+      assert_that( new_props, contains_inanyorder(
+        VimProp( 'YcmErrorProperty', 1, 1, 1, 4 ),
+        VimProp( 'YcmErrorProperty', 1, 1, 1, 4 ),
+        VimProp( 'YcmErrorProperty', 2, 1, 2, 4 ),
+        VimProp( 'YcmErrorProperty', 2, 1, 2, 4 ) ) )
+      kept_props = [ prop for prop in props if prop.start_line == 1 ]
+      assert_that( all( any( prop is new_prop for new_prop in new_props )
+                        for prop in kept_props ),
+                   equal_to( True ) )
+
+      # Nothing is done when the diagnostics don't change.
+      props = list( new_props )
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 2, 1, 2, 4 ) ] )
+      assert_that( all( new_prop is old_prop for new_prop, old_prop in
+                        zip( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ], props ) ),
+                   equal_to( True ) )
+
+      # Diagnostics spanning several lines are always added again.
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 5, 2, 4 ) ] )
+      assert_that( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ], contains_exactly(
+        VimProp( 'YcmErrorProperty', 1, 5, 2, 4 ),
+        VimProp( 'YcmErrorProperty', 1, 5, 2, 4 ) ) )
+
+
+  def test_UpdateMatches_VisibleDiagnosticsOnly( self ):
+    self._diag_interface._user_options[
+      'highlight_visible_diagnostics_only' ] = 1
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo bar' ] * 40 )
+    visible_lines = [ 10, 12 ]
+
+    def RangeVisibleInBuffer( bufnr, grow_factor = 0.5 ):
+      if not visible_lines:
+        return None
+      start, end = visible_lines
+      num_lines = end - start + 1
+      return {
+        'start': { 'line_num': start - int( num_lines * grow_factor ) },
+        'end': { 'line_num': end + int( num_lines * grow_factor ) }
+      }
+
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ), \
+         patch( 'ycm.vimsupport.RangeVisibleInBuffer',
+                side_effect = RangeVisibleInBuffer ):
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 11, 1, 11, 4 ),
+        SimpleDiagnosticToJson( 30, 1, 30, 4 ) ] )
+      assert_that( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ], contains_exactly(
+        VimProp( 'YcmErrorProperty', 11, 1, 11, 4 ),
+        VimProp( 'YcmErrorProperty', 11, 1, 11, 4 ) ) )
+
+      # Nothing is done while the visible lines are in the highlighted ones.
+      visible_lines[ : ] = [ 11, 13 ]
+      with patch.object( self._diag_interface,
+                         'UpdateMatches' ) as update_matches:
+        self._diag_interface.OnWinScrolled()
+        update_matches.assert_not_called()
+
+      visible_lines[ : ] = [ 29, 31 ]
+      self._diag_interface.OnWinScrolled()
+      assert_that( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ], contains_exactly(
+        VimProp( 'YcmErrorProperty', 30, 1, 30, 4 ),
+        VimProp( 'YcmErrorProperty', 30, 1, 30, 4 ) ) )
+
+      # Nothing is highlighted when the buffer is not visible.
+      visible_lines.clear()
+      self._diag_interface.UpdateMatches()
+      assert_that( test_utils.VIM_PROPS_FOR_BUFFER[ 1 ], equal_to( [] ) )
+
+
+class DiagnosticInterfaceDiagnosticsForLineTest( TestCase ):
+  def test_DiagnosticsForLine( self ):
+    diag_interface = diagnostic_interface.DiagnosticInterface(
+      1,
+      {
+        'echo_current_diagnostic': 0,
+        'enable_diagnostic_signs': 0,
+        'enable_diagnostic_highlighting': 0,
+        'always_populate_location_list': 0,
+        'update_diagnostics_in_insert_mode': 1,
+        'highlight_visible_diagnostics_only': 0,
+        'filter_diagnostics': {}
+      } )
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo' ] * 20 )
+    spanning = SimpleDiagnosticToJson( 2, 1, 15, 1 )
+    warning = SimpleDiagnosticToJson( 10, 5, 10, 8 )
+    warning[ 'kind' ] = 'WARNING'
+    error = SimpleDiagnosticToJson( 10, 1, 12, 1 )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ):
+      _UpdateMatches( diag_interface,
+                      current_buffer,
+                      [ warning, spanning, error ] )
+
+      assert_that( diag_interface.DiagnosticsForLine( 1 ), equal_to( [] ) )
+      assert_that( diag_interface.DiagnosticsForLine( 2 ),
+                   contains_exactly( spanning ) )
+      assert_that( diag_interface.DiagnosticsForLine( 10 ),
+                   contains_exactly( spanning, error, warning ) )
+      assert_that( diag_interface.DiagnosticsForLine( 13 ),
+                   contains_exactly( spanning ) )
+      assert_that( diag_interface.DiagnosticsForLine( 16 ), equal_to( [] ) )
+
+      # Diagnostics spanning several lines are counted once.
+      assert_that( diag_interface.GetErrorCount(), equal_to( 2 ) )
+      assert_that( diag_interface.GetWarningCount(), equal_to( 1 ) )
+
+
+class DiagnosticInterfaceUpdateSignsTest( TestCase ):
+  def setUp( self ):
+    test_utils.VIM_SIGNS = []
+    self._diag_interface = diagnostic_interface.DiagnosticInterface(
+      1,
+      {
+        'echo_current_diagnostic': 0,
+        'enable_diagnostic_signs': 1,
+        'enable_diagnostic_highlighting': 0,
+        'always_populate_location_list': 0,
+        'update_diagnostics_in_insert_mode': 1,
+        'highlight_visible_diagnostics_only': 0,
+        'filter_diagnostics': {}
+      } )
+
+
+  def test_UpdateSigns( self ):
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo bar', 'baz qux' ] )
+    warning = SimpleDiagnosticToJson( 2, 1, 2, 4 )
+    warning[ 'kind' ] = 'WARNING'
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ), \
+         patch( 'ycm.vimsupport.PlaceSigns',
+                wraps = vimsupport.PlaceSigns ) as place_signs, \
+         patch( 'ycm.vimsupport.UnplaceSigns',
+                wraps = vimsupport.UnplaceSigns ) as unplace_signs:
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ), warning ] )
+      assert_that( test_utils.VIM_SIGNS, contains_inanyorder(
+        VimSign( 1, 'YcmError', 1 ),
+        VimSign( 2, 'YcmWarning', 1 ) ) )
+      unplace_signs.assert_not_called()
+
+      # Vim is not called when the signs don't change.
+      place_signs.reset_mock()
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ), warning ] )
+      place_signs.assert_not_called()
+      unplace_signs.assert_not_called()
+
+      # Only the changed signs are replaced.
+      error_sign = next( sign for sign in test_utils.VIM_SIGNS
+                         if sign.line == 1 )
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 2, 1, 2, 4 ) ] )
+      assert_that( test_utils.VIM_SIGNS, contains_inanyorder(
+        VimSign( 1, 'YcmError', 1 ),
+        VimSign( 2, 'YcmError', 1 ) ) )
+      assert_that( any( sign is error_sign for sign in test_utils.VIM_SIGNS ),
+                   equal_to( True ) )
+      place_signs.assert_called_once_with( 1, [ ( 2, 'YcmError' ) ] )
+
+      self._diag_interface.ClearDiagnosticsUI()
+      assert_that( test_utils.VIM_SIGNS, equal_to( [] ) )
+
+
+  def test_UpdateSigns_SignsChangedByVim( self ):
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo bar', 'baz qux', 'quux' ] )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ):
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 3, 1, 3, 4 ) ] )
+
+      # Vim moved the second sign along with the text and a stale sign was left
+      # on the last line.
+      test_utils.VIM_SIGNS[ 1 ].line = 2
+      test_utils.VIM_SIGNS.append( VimSign( 3, 'YcmWarning', 1 ) )
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ),
+        SimpleDiagnosticToJson( 3, 1, 3, 4 ) ] )
+      assert_that( test_utils.VIM_SIGNS, contains_inanyorder(
+        VimSign( 1, 'YcmError', 1 ),
+        VimSign( 3, 'YcmError', 1 ) ) )
+
+
+  def test_UpdateSigns_SeveralSignsOnSameLine( self ):
+    current_buffer = VimBuffer( '/foo',
+                                number = 1,
+                                contents = [ 'foo bar', 'baz qux' ] )
+    # E.g. after the lines of both signs were joined.
+    test_utils.VIM_SIGNS = [ VimSign( 1, 'YcmError', 1 ),
+                             VimSign( 1, 'YcmError', 1 ) ]
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ] ), \
+         patch( 'ycm.vimsupport.PlaceSigns',
+                wraps = vimsupport.PlaceSigns ) as place_signs:
+      _UpdateMatches( self._diag_interface, current_buffer, [
+        SimpleDiagnosticToJson( 1, 1, 1, 4 ) ] )
+      assert_that( test_utils.VIM_SIGNS,
+                   contains_exactly( VimSign( 1, 'YcmError', 1 ) ) )
+      place_signs.assert_not_called()
+
+      self._diag_interface.ClearDiagnosticsUI()
+      assert_that( test_utils.VIM_SIGNS, equal_to( [] ) )
+
+
+class LineIntervalIndexTest( TestCase ):
+  def test_LineIntervalIndex_Overlapping( self ):
+    random.seed( 0 )
+    for size in range( 20 ):
+      intervals = []
+      for item in range( size ):
+        start_line = random.randint( 1, 30 )
+        intervals.append( ( start_line,
+                            start_line + random.randint( 0, 10 ),
+                            item ) )
+      index = diagnostic_interface._LineIntervalIndex( intervals )
+      for start_line in range( 1, 45 ):
+        for end_line in range( start_line, 45 ):
+          assert_that(
+            index.Overlapping( start_line, end_line ),
+            equal_to( [ item for first, last, item in intervals
+                        if first <= end_line and last >= start_line ] ) )
+
+
+  def test_LineIntervalIndex_OnlyVisitsOverlappingSubtrees( self ):
+    # A long item first, then many items of one line.
+    intervals = [ ( 1, 1000, 'long' ) ] + [ ( line, line, line )
+                                            for line in range( 2, 1001 ) ]
+    index = diagnostic_interface._LineIntervalIndex( intervals )
+    index._end_lines = _CountingList( index._end_lines )
+    assert_that( index.Overlapping( 500, 500 ), equal_to( [ 'long', 500 ] ) )
+    # Only the items on the paths to the overlapping ones are checked, about
+    # twice the depth of the tree.
+    assert_that( index._end_lines.count < 40, equal_to( True ) )
+
+
+class _CountingList( list ):
+  """List counting how many times its items are read."""
+
+  def __init__( self, items ):
+    super().__init__( items )
+    self.count = 0
+
+
+  def __getitem__( self, index ):
+    self.count += 1
+    return super().__getitem__( index )
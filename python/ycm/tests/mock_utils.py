@@ -16,40 +16,24 @@
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 import json
 from unittest import mock
-HTTP_OK = 200
-
-
-class FakeResponse:
-  """A fake version of a requests response object, just about suitable for
-  mocking a server response. Not usually used directly. See
-  MockServerResponse* methods"""
-  def __init__( self, response, exception ):
-    self._json = response
-    self._exception = exception
-    self.code = HTTP_OK
-
-
-  def read( self ):
-    if self._exception:
-      raise self._exception
-    return json.dumps( self._json ).encode( 'utf-8' )
-
-
-  def close( self ):
-    pass
 
 
 class FakeFuture:
   """A fake version of a future response object, just about suitable for
-  mocking a server response as generated by PostDataToHandlerAsync.
+  mocking a server response as generated by PostDataToHandlerAsync. Like the
+  real one, it resolves to the decoded JSON response or raises the exception
+  that occurred while sending the request or decoding its response.
   Not usually used directly. See MockAsyncServerResponse* methods"""
   def __init__( self, done, response = None, exception = None ):
     self._done = done
+    self._exception = exception
 
     if not done:
       self._result = None
     else:
-      self._result = FakeResponse( response, exception )
+      # Round-trip the response through JSON so that it can't be mutated by the
+      # code under test.
+      self._result = json.loads( json.dumps( response ) )
 
 
   def done( self ):
@@ -57,9 +41,21 @@ class FakeFuture:
 
 
   def result( self ):
+    if self._exception:
+      raise self._exception
     return self._result
 
 
+  def cancel( self ):
+    # Behave like a future that is already running.
+    return False
+
+
+  def add_done_callback( self, fn ):
+    if self._done:
+      fn( self )
+
+
 def MockAsyncServerResponseDone( response ):
   """Return a MessagePoll containing a fake future object that is complete with
   the supplied response message. Suitable for mocking a response future within
@@ -17,7 +17,8 @@
 # You should have received a copy of the GNU General Public License
 # along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
 
-from hamcrest import assert_that, contains_exactly, empty, has_entries
+from hamcrest import ( assert_that, contains_exactly, empty, has_entries,
+                       has_length )
 from unittest import TestCase
 
 from ycm.tests.test_utils import MockVimBuffers, MockVimModule, VimBuffer
@@ -295,6 +296,57 @@ class OmniCompleterTest( TestCase ):
       )
 
 
+  @YouCompleteMeInstance( { 'g:ycm_cache_omnifunc': 1,
+                            'g:ycm_semantic_triggers': TRIGGERS } )
+  def test_OmniCompleter_GetCompletions_Cache_NarrowedLocally( self, ycm ):
+    omnifunc_calls = []
+
+    def Omnifunc( findstart, base ):
+      omnifunc_calls.append( findstart )
+      if findstart:
+        return 5
+      return [ 'abc', 'abd', 'xyz' ]
+
+    current_buffer = VimBuffer( 'buffer',
+                                contents = [ 'test.a' ],
+                                filetype = FILETYPE,
+                                omnifunc = Omnifunc )
+
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 6 ) ):
+      ycm.SendCompletionRequest()
+      assert_that(
+        ycm.GetCompletionResponse(),
+        has_entries( {
+          'completions': contains_exactly(
+            has_entries( { 'word': 'abc' } ),
+            has_entries( { 'word': 'abd' } )
+          ),
+          'completion_start_column': 6
+        } )
+      )
+
+    # The candidates are filtered again without calling the omnifunc when more
+    # characters are typed.
+    current_buffer.contents = [ 'test.abd' ]
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 8 ) ):
+      ycm.SendCompletionRequest()
+      assert_that(
+        ycm.GetCompletionResponse(),
+        has_entries( {
+          'completions': contains_exactly( has_entries( { 'word': 'abd' } ) ),
+          'completion_start_column': 6
+        } )
+      )
+    assert_that( omnifunc_calls, has_length( 2 ) )
+
+    # But not when the text before the identifier changed.
+    current_buffer.contents = [ 'tast.abd' ]
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 8 ) ):
+      ycm.SendCompletionRequest()
+      ycm.GetCompletionResponse()
+    assert_that( omnifunc_calls, has_length( 4 ) )
+
+
   @YouCompleteMeInstance( { 'g:ycm_cache_omnifunc': 0,
                             'g:ycm_semantic_triggers': TRIGGERS } )
   def test_OmniCompleter_GetCompletions_NoCache_ObjectList( self, ycm ):
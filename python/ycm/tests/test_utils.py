@@ -24,6 +24,7 @@ from hamcrest import ( assert_that,
                        equal_to )
 import contextlib
 import functools
+import itertools
 import json
 import os
 import re
@@ -72,6 +73,7 @@ VIM_MOCK = MagicMock()
 
 VIM_PROPS_FOR_BUFFER = defaultdict( list )
 VIM_SIGNS = []
+VIM_SIGN_IDS = itertools.count( 1 )
 
 VIM_OPTIONS = {
   '&completeopt': b'',
@@ -233,22 +235,56 @@ def _MockVimFunctionsEval( value ):
   if match:
     sign_list = eval( match.group( 'sign_list' ) )
     for sign in sign_list:
-      VIM_SIGNS.remove( sign )
+      VIM_SIGNS.remove( next( vim_sign for vim_sign in VIM_SIGNS
+                              if vim_sign.id == sign[ 'id' ] ) )
     return True # Why True?
 
   match = re.match( 'sign_placelist\\( (?P<sign_list>\\[.*\\]) \\)', value )
   if match:
     sign_list = json.loads( match.group( 'sign_list' ).replace( "'", '"' ) )
+    sign_ids = []
     for sign in sign_list:
-      VIM_SIGNS.append( VimSign( sign[ 'lnum' ],
-                                 sign[ 'name' ],
-                                 sign[ 'buffer' ] ) )
-    return True # Why True?
+      vim_sign = VimSign( sign[ 'lnum' ], sign[ 'name' ], sign[ 'buffer' ] )
+      VIM_SIGNS.append( vim_sign )
+      sign_ids.append( vim_sign.id )
+    return sign_ids
 
   return None
 
 
+def _SplitListExpression( value ):
+  """Return the items of the Vim list expression |value|, e.g. a list of
+  function calls, or None if it's not a list."""
+  if not ( value.startswith( '[ ' ) and value.endswith( ' ]' ) ):
+    return None
+  items = []
+  depth = 0
+  quote = None
+  start = 2
+  for index in range( start, len( value ) - 2 ):
+    character = value[ index ]
+    if quote:
+      if character == quote:
+        quote = None
+    elif character in '\'"':
+      quote = character
+    elif character in '([{':
+      depth += 1
+    elif character in ')]}':
+      depth -= 1
+    elif character == ',' and depth == 0:
+      items.append( value[ start : index ].strip() )
+      start = index + 1
+  items.append( value[ start : -2 ].strip() )
+  return items
+
+
 def _MockVimPropEval( value ):
+  items = _SplitListExpression( value )
+  if items and all( re.match( 'prop_(add|remove)\\(', item )
+                    for item in items ):
+    return [ _MockVimPropEval( item ) for item in items ]
+
   match = re.match( 'prop_list\\( (?P<lnum>\\d+), '
                     '{ "bufnr": (?P<bufnr>\\d+) } \\)', value )
   if match:
@@ -266,7 +302,8 @@ def _MockVimPropEval( value ):
         prop_start_line,
         prop_start_column,
         int( opts[ 'end_lnum' ] ) if opts[ 'end_lnum' ] else prop_start_line,
-        int( opts[ 'end_col' ] ) if opts[ 'end_col' ] else prop_start_column
+        int( opts[ 'end_col' ] ) if opts[ 'end_col' ] else prop_start_column,
+        opts.get( 'id' )
     )
     VIM_PROPS_FOR_BUFFER[ int( opts[ 'bufnr' ] ) ].append( vim_prop )
     return vim_prop.id
@@ -578,9 +615,11 @@ class VimProp:
                 start_line,
                 start_column,
                 end_line = None,
-                end_column = None ):
+                end_column = None,
+                prop_id = None ):
     current_buffer = VIM_MOCK.current.buffer.number
-    self.id = len( VIM_PROPS_FOR_BUFFER[ current_buffer ] ) + 1
+    self.id = ( prop_id if prop_id is not None else
+                len( VIM_PROPS_FOR_BUFFER[ current_buffer ] ) + 1 )
     self.prop_type = prop_type
     self.start_line = start_line
     self.start_column = start_column
@@ -623,6 +662,7 @@ class VimProp:
 class VimSign:
 
   def __init__( self, line, name, bufnr ):
+    self.id = next( VIM_SIGN_IDS )
     self.line = line
     self.name = name
     self.bufnr = bufnr
@@ -644,6 +684,12 @@ class VimSign:
   def __getitem__( self, key ):
     if key == 'group':
       return self.group
+    if key == 'id':
+      return self.id
+    if key == 'lnum':
+      return self.line
+    if key == 'name':
+      return self.name
 
 
 @contextlib.contextmanager
@@ -662,6 +708,10 @@ def MockVimBuffers( buffers, window_buffers, cursor_position = ( 1, 1 ) ):
     raise RuntimeError( 'Second parameter must contain at least one element '
                         'which corresponds to the current window.' )
 
+  # Buffer numbers and changedticks are reused across tests.
+  from ycm import vimsupport
+  vimsupport.ClearBufferDataCache()
+
   with patch( 'vim.buffers', VimBuffers( buffers ) ):
     with patch( 'vim.tabpages', VimTabpages(
       VimTabpage( 1, window_buffers, cursor_position ) ) ) as tabpages:
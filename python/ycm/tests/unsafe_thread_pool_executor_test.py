@@ -0,0 +1,118 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+import time
+from hamcrest import assert_that, contains_exactly, equal_to, has_length
+from unittest import TestCase
+
+from ycm.unsafe_thread_pool_executor import ( BACKGROUND,
+                                              HOUSEKEEPING,
+                                              INTERACTIVE,
+                                              UnsafeThreadPoolExecutor )
+
+
+class UnsafeThreadPoolExecutorTest( TestCase ):
+  def test_UnsafeThreadPoolExecutor_HigherPriorityFirst( self ):
+    executor = UnsafeThreadPoolExecutor( max_workers = 1 )
+    started = []
+    blocker = threading.Event()
+
+    first = executor.submit( blocker.wait )
+    futures = [
+      executor.submit_with_priority( priority, started.append, name )
+      for priority, name in [ ( HOUSEKEEPING, 'keepalive' ),
+                              ( BACKGROUND, 'parse' ),
+                              ( INTERACTIVE, 'complete' ),
+                              ( BACKGROUND, 'tokens' ) ] ]
+    blocker.set()
+    first.result( timeout = 5 )
+    for future in futures:
+      future.result( timeout = 5 )
+    executor.shutdown()
+
+    assert_that( started, contains_exactly( 'complete',
+                                            'parse',
+                                            'tokens',
+                                            'keepalive' ) )
+
+
+  def test_UnsafeThreadPoolExecutor_PriorityLimit( self ):
+    executor = UnsafeThreadPoolExecutor(
+      max_workers = 3,
+      max_workers_per_priority = { BACKGROUND: 1 } )
+    blocker = threading.Event()
+
+    background = [ executor.submit_with_priority( BACKGROUND, blocker.wait )
+                   for _ in range( 2 ) ]
+    # The interactive request is not delayed by the second background request.
+    assert_that( executor.submit( lambda: 42 ).result( timeout = 5 ),
+                 equal_to( 42 ) )
+    assert_that( [ future.running() for future in background ],
+                 contains_exactly( True, False ) )
+
+    blocker.set()
+    for future in background:
+      future.result( timeout = 5 )
+    executor.shutdown()
+
+
+  def test_UnsafeThreadPoolExecutor_ReuseIdleThreads( self ):
+    executor = UnsafeThreadPoolExecutor( max_workers = 30 )
+    for i in range( 10 ):
+      # Wait for the worker to be done with the previous item.
+      while i and not executor._work_queue._idle_workers:
+        time.sleep( 0.001 )
+      assert_that( executor.submit( lambda: i ).result( timeout = 5 ),
+                   equal_to( i ) )
+    assert_that( len( executor._threads ), equal_to( 1 ) )
+    executor.shutdown()
+
+
+  def test_UnsafeThreadPoolExecutor_ShutdownRunsPendingItems( self ):
+    executor = UnsafeThreadPoolExecutor( max_workers = 1 )
+    blocker = threading.Event()
+
+    first = executor.submit( blocker.wait )
+    pending = [ executor.submit_with_priority( priority, lambda: 42 )
+                for priority in ( INTERACTIVE, BACKGROUND, HOUSEKEEPING ) ]
+    blocker.set()
+    executor.shutdown()
+
+    assert_that( first.done() )
+    assert_that( [ future.result( timeout = 0 ) for future in pending ],
+                 contains_exactly( 42, 42, 42 ) )
+
+
+  def test_UnsafeThreadPoolExecutor_ShutdownCancelsPendingItems( self ):
+    executor = UnsafeThreadPoolExecutor( max_workers = 1 )
+    blocker = threading.Event()
+    cancelled = []
+
+    first = executor.submit( blocker.wait )
+    while not first.running():
+      time.sleep( 0.001 )
+    pending = [ executor.submit_with_priority( priority, lambda: 42 )
+                for priority in ( INTERACTIVE, BACKGROUND, HOUSEKEEPING ) ]
+    for future in pending:
+      future.add_done_callback( cancelled.append )
+    executor.shutdown( wait = False, cancel_futures = True )
+
+    assert_that( cancelled, has_length( 3 ) )
+    assert_that( all( future.cancelled() for future in pending ) )
+    blocker.set()
+    assert_that( first.result( timeout = 5 ) )
@@ -1536,6 +1536,7 @@ class VimsupportTest( TestCase ):
     filepath = os.path.realpath( 'filename' )
     contents = [ ToBytes( 'abc' ), ToBytes( 'fДa' ) ]
     vim_buffer = VimBuffer( filepath, contents = contents )
+    vimsupport.ClearBufferDataCache()
 
     with patch( 'vim.buffers', [ vim_buffer ] ):
       assert_that( vimsupport.GetUnsavedAndSpecifiedBufferData( vim_buffer,
@@ -1544,6 +1545,148 @@ class VimsupportTest( TestCase ):
                               has_entry( 'contents', 'abc\nfДa\n' ) ) )
 
 
+  @patch( 'ycm.vimsupport.MODIFIED_BUFFERS', None )
+  def test_GetUnsavedAndSpecifiedBufferData_TrackedModifiedBuffers( self ):
+    current_buffer = VimBuffer( 'current', number = 1 )
+    modified_buffer = VimBuffer( 'modified', number = 2, modified = True )
+    other_buffer = VimBuffer( 'other', number = 3 )
+
+    with MockVimBuffers( [ current_buffer, modified_buffer, other_buffer ],
+                         [ current_buffer ] ):
+      vimsupport.TrackModifiedBuffers()
+      assert_that( vimsupport.MODIFIED_BUFFERS, equal_to( { 2 } ) )
+
+      # Not reported by the autocommands so not included.
+      other_buffer.options[ 'mod' ] = True
+      assert_that(
+        list( vimsupport.GetUnsavedAndSpecifiedBufferData( current_buffer,
+                                                           '/current' ) ),
+        contains_exactly( '/current', modified_buffer.name )
+      )
+
+      vimsupport.SetBufferModified( 2, False )
+      vimsupport.SetBufferModified( 3, True )
+      assert_that(
+        list( vimsupport.GetUnsavedAndSpecifiedBufferData( current_buffer,
+                                                           '/current' ) ),
+        contains_exactly( '/current', other_buffer.name )
+      )
+
+
+  @patch( 'ycm.vimsupport.MODIFIED_BUFFERS', None )
+  def test_GetUnsavedAndSpecifiedBufferData_CheckTrackedModifiedBuffers(
+      self ):
+    current_buffer = VimBuffer( 'current', number = 1 )
+    modified_buffer = VimBuffer( 'modified', number = 2 )
+
+    with MockVimBuffers( [ current_buffer, modified_buffer ],
+                         [ current_buffer ] ):
+      vimsupport.TrackModifiedBuffers()
+      modified_buffer.options[ 'mod' ] = True
+
+      with patch.object( vimsupport._logger,
+                         'isEnabledFor',
+                         return_value = True ):
+        assert_that(
+          list( vimsupport.GetUnsavedAndSpecifiedBufferData( current_buffer,
+                                                             '/current' ) ),
+          contains_exactly( '/current', modified_buffer.name )
+        )
+      assert_that( vimsupport.MODIFIED_BUFFERS, equal_to( { 2 } ) )
+
+
+  @patch( 'ycm.vimsupport.BUFFER_NUMBER_FOR_REALPATH', None )
+  @patch( 'vim.eval', side_effect = [ '2', '-1', '-1', '3', '-1' ] )
+  def test_GetBufferNumberForFilename_TrackedBufferNumbers( self, vim_eval ):
+    vimsupport.TrackBufferNumbers()
+    for _ in range( 2 ):
+      assert_that( vimsupport.GetBufferNumberForFilename( '/foo' ),
+                   equal_to( 2 ) )
+      assert_that( vimsupport.GetBufferNumberForFilename( '/bar' ),
+                   equal_to( -1 ) )
+    assert_that( vim_eval.call_count, equal_to( 2 ) )
+
+    # Vim is asked again when a buffer may have to be created.
+    assert_that( vimsupport.GetBufferNumberForFilename(
+                   '/bar', create_buffer_if_needed = True ),
+                 equal_to( -1 ) )
+    assert_that( vim_eval.call_count, equal_to( 3 ) )
+
+    # A buffer is created for /bar.
+    vimsupport.InvalidateBufferNumber( 3 )
+    assert_that( vimsupport.GetBufferNumberForFilename( '/foo' ),
+                 equal_to( 2 ) )
+    assert_that( vimsupport.GetBufferNumberForFilename( '/bar' ),
+                 equal_to( 3 ) )
+    assert_that( vim_eval.call_count, equal_to( 4 ) )
+
+    # The buffer of /foo is wiped out.
+    vimsupport.InvalidateBufferNumber( 2 )
+    assert_that( vimsupport.GetBufferNumberForFilename( '/foo' ),
+                 equal_to( -1 ) )
+    assert_that( vimsupport.GetBufferNumberForFilename( '/bar' ),
+                 equal_to( 3 ) )
+    assert_that( vim_eval.call_count, equal_to( 5 ) )
+
+
+  @patch( 'ycm.vimsupport.BUFFER_NUMBER_FOR_REALPATH', None )
+  @patch( 'vim.eval', side_effect = [ '2', '3' ] )
+  def test_GetBufferNumberForFilename_RealPathForgotten( self, vim_eval ):
+    vimsupport.TrackBufferNumbers()
+    vimsupport.InvalidateBufferNumber( 1 )
+    with patch( 'os.path.realpath',
+                side_effect = [ '/foo', '/bar' ] ) as realpath:
+      assert_that( vimsupport.GetBufferNumberForFilename( '/link' ),
+                   equal_to( 2 ) )
+      assert_that( vimsupport.GetBufferNumberForFilename( '/link' ),
+                   equal_to( 2 ) )
+      assert_that( realpath.call_count, equal_to( 1 ) )
+
+      # The symlink now points to /bar.
+      vimsupport.InvalidateBufferNumber( 1 )
+      assert_that( vimsupport.GetBufferNumberForFilename( '/link' ),
+                   equal_to( 3 ) )
+      assert_that( realpath.call_count, equal_to( 2 ) )
+    assert_that( vim_eval.call_args[ 0 ][ 0 ], equal_to( "bufnr('/bar', 0)" ) )
+
+
+  def test_GetBufferData_CachedUntilChangedtickChanges( self ):
+    vim_buffer = VimBuffer( 'buffer', contents = [ 'foo' ], filetype = 'cpp' )
+
+    with MockVimBuffers( [ vim_buffer ], [ vim_buffer ] ):
+      assert_that( vimsupport.GetBufferData( vim_buffer ),
+                   equal_to( { 'contents': 'foo\n', 'filetypes': [ 'cpp' ] } ) )
+
+      vim_buffer.contents = [ 'bar' ]
+      assert_that( vimsupport.GetBufferData( vim_buffer ),
+                   has_entry( 'contents', 'foo\n' ) )
+
+      vim_buffer.changedtick = 2
+      assert_that( vimsupport.GetBufferData( vim_buffer ),
+                   has_entry( 'contents', 'bar\n' ) )
+
+      vim_buffer.contents = [ 'baz' ]
+      vimsupport.InvalidateBufferData( vim_buffer.number )
+      assert_that( vimsupport.GetBufferData( vim_buffer ),
+                   has_entry( 'contents', 'baz\n' ) )
+
+
+  @patch( 'ycm.vimsupport.BUFFER_DATA_CACHE_MAX_SIZE', 10 )
+  def test_GetBufferData_EvictLeastRecentlyUsed( self ):
+    first_buffer = VimBuffer( 'first', number = 1, contents = [ 'first' ] )
+    second_buffer = VimBuffer( 'second', number = 2, contents = [ 'second' ] )
+    third_buffer = VimBuffer( 'third', number = 3, contents = [ 'third' ] )
+
+    with MockVimBuffers( [ first_buffer, second_buffer, third_buffer ],
+                         [ first_buffer ] ):
+      vimsupport.GetBufferData( first_buffer )
+      vimsupport.GetBufferData( second_buffer )
+      assert_that( list( vimsupport.BUFFER_DATA_CACHE ), equal_to( [ 2 ] ) )
+
+      vimsupport.GetBufferData( third_buffer )
+      assert_that( list( vimsupport.BUFFER_DATA_CACHE ), equal_to( [ 3 ] ) )
+
+
   def test_GetBufferFilepath_NoBufferName_UnicodeWorkingDirectory( self ):
     vim_buffer = VimBuffer( '', number = 42 )
     unicode_dir = PathToTestFile( 'uni¢od€' )
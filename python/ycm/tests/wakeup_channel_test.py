@@ -0,0 +1,65 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+import socket
+from hamcrest import assert_that, equal_to, starts_with
+from unittest import TestCase
+
+from ycm.tests.test_utils import MockVimModule
+MockVimModule()
+
+from ycm.wakeup_channel import WakeupChannel
+
+
+def _Connect( address ):
+  host, port = address.split( ':' )
+  connection = socket.create_connection( ( host, int( port ) ) )
+  connection.settimeout( 1 )
+  return connection
+
+
+class WakeupChannelTest( TestCase ):
+  def test_WakeupChannel_Notify( self ):
+    wakeup_channel = WakeupChannel()
+    try:
+      channel = wakeup_channel.Open()
+      assert_that( channel[ 'address' ], starts_with( '127.0.0.1:' ) )
+      with _Connect( channel[ 'address' ] ) as connection:
+        connection.sendall( channel[ 'token' ].encode() + b'\n' )
+        assert_that( wakeup_channel.Accept(), equal_to( True ) )
+
+        wakeup_channel.Notify()
+        wakeup_channel.Notify( 'future' )
+        assert_that( connection.recv( 1 ), equal_to( b'\n' ) )
+        assert_that( connection.recv( 1 ), equal_to( b'\n' ) )
+    finally:
+      wakeup_channel.Close()
+
+
+  def test_WakeupChannel_InvalidToken( self ):
+    wakeup_channel = WakeupChannel()
+    try:
+      channel = wakeup_channel.Open()
+      with _Connect( channel[ 'address' ] ) as connection:
+        connection.sendall( b'token\n' )
+        assert_that( wakeup_channel.Accept(), equal_to( False ) )
+
+        # Notifications are ignored once the channel is closed.
+        wakeup_channel.Notify()
+        assert_that( connection.recv( 1 ), equal_to( b'' ) )
+    finally:
+      wakeup_channel.Close()
@@ -339,6 +339,181 @@ class YouCompleteMeTest( TestCase ):
     } )
 
 
+  @YouCompleteMeInstance( { 'g:ycm_server_use_unix_socket': 1 } )
+  def test_YouCompleteMe_RestartServerOverTcpIfNeeded_UnknownArgument(
+      self, ycm ):
+    StopServer( ycm )
+
+    ycm._server_unix_socket = '/tmp/ycmd.sock'
+    ycm._server_popen = MagicMock( autospec = True )
+    ycm._server_popen.poll.return_value = 2
+
+    with patch.object( ycm, '_SetUpServer' ) as set_up_server:
+      assert_that( ycm.RestartServerOverTcpIfNeeded(), equal_to( True ) )
+      set_up_server.assert_called_once_with()
+    assert_that( ycm._GetServerUnixSocketPath( 'id' ), equal_to( None ) )
+
+
+  @YouCompleteMeInstance( { 'g:ycm_server_use_unix_socket': 1 } )
+  def test_YouCompleteMe_RestartServerOverTcpIfNeeded_OtherExitCode(
+      self, ycm ):
+    StopServer( ycm )
+
+    ycm._server_unix_socket = '/tmp/ycmd.sock'
+    ycm._server_popen = MagicMock( autospec = True )
+    ycm._server_popen.poll.return_value = 3
+
+    with patch.object( ycm, '_SetUpServer' ) as set_up_server:
+      assert_that( ycm.RestartServerOverTcpIfNeeded(), equal_to( False ) )
+      set_up_server.assert_not_called()
+
+
+  @YouCompleteMeInstance( { 'g:ycm_speculative_completion': 1 } )
+  @patch( 'ycm.youcompleteme.YouCompleteMe.NativeFiletypeCompletionUsable',
+          return_value = True )
+  @patch( 'ycm.client.base_request.BaseRequest.PostDataToHandlerAsync' )
+  def test_YouCompleteMe_SendSpeculativeCompletionRequest_TriggerCompleted(
+      self, ycm, post_data_to_handler_async, *args ):
+    post_data_to_handler_async.return_value = MockAsyncServerResponseDone( {
+      'completion_start_column': 6,
+      'completions': [ { 'insertion_text': 'bar' } ]
+    } )
+    current_buffer = VimBuffer( 'buffer', contents = [ 'foo-' ],
+                                filetype = 'cpp' )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 4 ) ):
+      ycm.SendSpeculativeCompletionRequest()
+
+    request_data = post_data_to_handler_async.call_args[ 0 ][ 0 ]
+    assert_that( request_data, has_entries( {
+      'line_num': 1,
+      'column_num': 6,
+      'file_data': has_entries( {
+        current_buffer.name: has_entries( { 'contents': 'foo->\n' } )
+      } )
+    } ) )
+
+    # The trigger is completed as predicted.
+    current_buffer.contents = [ 'foo->' ]
+    current_buffer.changedtick += 1
+    post_data_to_handler_async.reset_mock()
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 5 ) ):
+      ycm.SendCompletionRequest()
+      post_data_to_handler_async.assert_not_called()
+      assert_that( ycm.GetCompletionResponse()[ 'completions' ],
+                   contains_exactly( has_entries( { 'word': 'bar' } ) ) )
+    assert_that( ycm.DebugInfo(),
+                 matches_regexp( 'Speculative completion: 1 hits, 0 misses' ) )
+
+
+  @YouCompleteMeInstance( { 'g:ycm_speculative_completion': 1 } )
+  @patch( 'ycm.youcompleteme.YouCompleteMe.NativeFiletypeCompletionUsable',
+          return_value = True )
+  @patch( 'ycm.client.base_request.BaseRequest.PostDataToHandlerAsync',
+          return_value = MockAsyncServerResponseDone( {
+            'completion_start_column': 6,
+            'completions': []
+          } ) )
+  def test_YouCompleteMe_SendSpeculativeCompletionRequest_DirtyBuffers(
+      self, ycm, post_data_to_handler_async, *args ):
+    current_buffer = VimBuffer( 'buffer',
+                                contents = [ 'int x;', 'foo-' ],
+                                filetype = 'cpp' )
+    other_buffer = VimBuffer( 'other',
+                              number = 2,
+                              contents = [ 'bar' ],
+                              filetype = 'cpp',
+                              modified = True )
+    with MockVimBuffers( [ current_buffer, other_buffer ],
+                         [ current_buffer ],
+                         ( 2, 4 ) ):
+      ycm.SendSpeculativeCompletionRequest()
+
+    request_data = post_data_to_handler_async.call_args[ 0 ][ 0 ]
+    assert_that( request_data, has_entries( {
+      'line_num': 2,
+      'column_num': 6,
+      'file_data': has_entries( {
+        current_buffer.name: equal_to( {
+          'contents': 'int x;\nfoo->\n',
+          'filetypes': [ 'cpp' ]
+        } ),
+        other_buffer.name: has_entries( { 'contents': 'bar\n' } )
+      } )
+    } ) )
+
+
+  @YouCompleteMeInstance( { 'g:ycm_speculative_completion': 1 } )
+  @patch( 'ycm.youcompleteme.YouCompleteMe.NativeFiletypeCompletionUsable',
+          return_value = True )
+  @patch( 'ycm.client.base_request.BaseRequest.PostDataToHandlerAsync',
+          return_value = MockAsyncServerResponseDone( {
+            'completion_start_column': 6,
+            'completions': [ { 'insertion_text': 'bar' } ]
+          } ) )
+  def test_YouCompleteMe_SendSpeculativeCompletionRequest_WrongPrediction(
+      self, ycm, post_data_to_handler_async, *args ):
+    current_buffer = VimBuffer( 'buffer', contents = [ 'foo-' ],
+                                filetype = 'cpp' )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 4 ) ):
+      ycm.SendSpeculativeCompletionRequest()
+
+    current_buffer.contents = [ 'foo-1' ]
+    current_buffer.changedtick += 1
+    post_data_to_handler_async.reset_mock()
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 5 ) ):
+      ycm.SendCompletionRequest()
+      post_data_to_handler_async.assert_called_once()
+    assert_that( ycm.DebugInfo(),
+                 matches_regexp( 'Speculative completion: 0 hits, 1 misses' ) )
+
+
+  @YouCompleteMeInstance( { 'g:ycm_speculative_completion': 1 } )
+  @patch( 'ycm.youcompleteme.YouCompleteMe.NativeFiletypeCompletionUsable',
+          return_value = True )
+  @patch( 'ycm.client.base_request.BaseRequest.PostDataToHandlerAsync' )
+  def test_YouCompleteMe_SendSpeculativeCompletionRequest_NoTrigger(
+      self, ycm, post_data_to_handler_async, *args ):
+    current_buffer = VimBuffer( 'buffer', contents = [ 'foo.' ],
+                                filetype = 'cpp' )
+    with MockVimBuffers( [ current_buffer ], [ current_buffer ], ( 1, 4 ) ):
+      ycm.SendSpeculativeCompletionRequest()
+      post_data_to_handler_async.assert_not_called()
+
+
+  @YouCompleteMeInstance()
+  def test_YouCompleteMe_FilterAndSortItems( self, ycm ):
+    items = [ { 'key': 'FooBar' }, { 'key': 'fooBaz' }, { 'key': 'qux' } ]
+    # Lowercase comes before uppercase on ties.
+    assert_that( ycm.FilterAndSortItems( items, 'key', 'fb' ),
+                 contains_exactly( { 'key': 'fooBaz' }, { 'key': 'FooBar' } ) )
+    assert_that( ycm.FilterAndSortItems( items, 'key', 'fbz' ),
+                 contains_exactly( { 'key': 'fooBaz' } ) )
+    assert_that( ycm.FilterAndSortItems( items, 'key', 'q', 1 ),
+                 contains_exactly( { 'key': 'qux' } ) )
+
+
+  @YouCompleteMeInstance()
+  def test_YouCompleteMe_SymbolIndex( self, ycm ):
+    index_id = ycm.CreateSymbolIndex()
+    ycm.AddToSymbolIndex( index_id, [ { 'key': 'fooBar', 'filetype': 'c' } ] )
+    assert_that( ycm.FilterAndSortSymbolIndex( index_id, 'fb' ),
+                 contains_exactly( has_entries( { 'key': 'fooBar' } ) ) )
+
+    # Symbols are merged as they are received.
+    ycm.AddToSymbolIndex( index_id, [ { 'key': 'FooBaz', 'filetype': 'py' } ] )
+    assert_that( ycm.FilterAndSortSymbolIndex( index_id, 'fb' ),
+                 contains_exactly( has_entries( { 'key': 'fooBar' } ),
+                                   has_entries( { 'key': 'FooBaz' } ) ) )
+    assert_that( ycm.FilterAndSortSymbolIndex( index_id, 'fbz' ),
+                 contains_exactly( has_entries( { 'key': 'FooBaz' } ) ) )
+    assert_that( ycm.GetSymbolIndexItems( index_id ),
+                 contains_exactly( has_entries( { 'key': 'fooBar' } ),
+                                   has_entries( { 'key': 'FooBaz' } ) ) )
+
+    ycm.DeleteSymbolIndex( index_id )
+    assert_that( ycm.CreateSymbolIndex(), equal_to( index_id + 1 ) )
+
+
   @YouCompleteMeInstance( { 'g:ycm_extra_conf_vim_data': [ 'tempname()' ] } )
   @patch( 'ycm.vimsupport.VimSupportsPopupWindows', return_value=True )
   def test_YouCompleteMe_DebugInfo_ServerRunning( self, ycm, *args ):
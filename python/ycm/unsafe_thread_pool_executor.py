@@ -10,13 +10,9 @@ import threading
 import weakref
 import sys
 
+from collections import deque
 from concurrent.futures import _base
 
-try:
-  import queue
-except ImportError:
-  import Queue as queue
-
 
 # This file provides an UnsafeThreadPoolExecutor, which operates exactly like
 # the upstream Python version of ThreadPoolExecutor with one exception: it
@@ -27,12 +23,20 @@ except ImportError:
 # only send network requests). The YCM workload is one of those workloads where
 # it's safe (the aforementioned network requests case).
 
+# Priorities of the work items. Items of a higher priority (lower value) are
+# always started before items of a lower priority.
+INTERACTIVE = 0
+BACKGROUND = 1
+HOUSEKEEPING = 2
+
+
 class _WorkItem:
-  def __init__( self, future, fn, args, kwargs ):
+  def __init__( self, future, fn, args, kwargs, priority = INTERACTIVE ):
     self.future = future
     self.fn = fn
     self.args = args
     self.kwargs = kwargs
+    self.priority = priority
 
   def run( self ):
     if not self.future.set_running_or_notify_cancel():
@@ -47,61 +51,137 @@ class _WorkItem:
       self.future.set_result( result )
 
 
+class _WorkQueue:
+  """Queue of work items with one FIFO lane per priority. An item is only
+  returned by get() when the number of running items of its priority is below
+  the limit for that priority."""
+
+  def __init__( self, max_running ):
+    self._max_running = max_running
+    self._lanes = [ deque() for _ in max_running ]
+    self._running = [ 0 for _ in max_running ]
+    self._idle_workers = 0
+    self._closed = False
+    self._condition = threading.Condition()
+
+  def put( self, work_item ):
+    with self._condition:
+      self._lanes[ work_item.priority ].append( work_item )
+      self._condition.notify()
+
+  def get( self ):
+    """Block until a work item can be started and return it. Return None once
+    the queue is closed and all its items were started."""
+    with self._condition:
+      self._idle_workers += 1
+      try:
+        while True:
+          for priority, lane in enumerate( self._lanes ):
+            running = self._running[ priority ]
+            if lane and running < self._max_running[ priority ]:
+              self._running[ priority ] = running + 1
+              return lane.popleft()
+          if self._closed and not any( self._lanes ):
+            return None
+          self._condition.wait()
+      finally:
+        self._idle_workers -= 1
+
+  def task_done( self, work_item ):
+    with self._condition:
+      self._running[ work_item.priority ] -= 1
+      # A waiting item of the same priority may now be started. Once the queue
+      # is closed, the idle workers may also have to exit.
+      if self._closed:
+        self._condition.notify_all()
+      else:
+        self._condition.notify()
+
+  def needs_worker( self ):
+    """Return True if there are more pending items than idle workers."""
+    with self._condition:
+      return sum( map( len, self._lanes ) ) > self._idle_workers
+
+  def close( self, cancel_pending = False ):
+    """Stop accepting work items. The pending items are still started unless
+    |cancel_pending| is True, in which case their futures are cancelled."""
+    with self._condition:
+      self._closed = True
+      pending = []
+      if cancel_pending:
+        for lane in self._lanes:
+          pending.extend( lane )
+          lane.clear()
+      self._condition.notify_all()
+    # Outside of the lock as cancelling runs the done callbacks of the futures.
+    for work_item in pending:
+      work_item.future.cancel()
+
+
 def _worker( executor_reference, work_queue ):
+  # |executor_reference| is only held so that its callback closes the queue
+  # when the executor is collected.
   try:
     while True:
-      work_item = work_queue.get( block=True )
-      if work_item is not None:
-        work_item.run()
-        continue
-      executor = executor_reference()
-      # Exit if:
-      #   - The executor that owns the worker has been collected OR
-      #   - The executor that owns the worker has been shutdown.
-      if executor is None or executor._shutdown:
-        # Notice other workers
-        work_queue.put( None )
+      work_item = work_queue.get()
+      # The executor that owns the worker has been collected or shutdown and
+      # there is no work left.
+      if work_item is None:
         return
-      del executor
+      try:
+        work_item.run()
+      finally:
+        work_queue.task_done( work_item )
+      del work_item
   except BaseException:
     _base.LOGGER.critical( 'Exception in worker', exc_info=True )
 
 
 class UnsafeThreadPoolExecutor( _base.Executor ):
-  def __init__( self, max_workers ):
+  def __init__( self, max_workers, max_workers_per_priority = None ):
     """Initializes a new ThreadPoolExecutor instance.
 
     Args:
         max_workers: The maximum number of threads that can be used to
             execute the given calls.
+        max_workers_per_priority: A dictionary mapping a priority to the
+            maximum number of threads that can execute calls of that priority
+            at the same time. Defaults to max_workers for all priorities.
     """
+    max_running = [ max_workers ] * ( HOUSEKEEPING + 1 )
+    for priority, limit in ( max_workers_per_priority or {} ).items():
+      max_running[ priority ] = min( limit, max_workers )
     self._max_workers = max_workers
-    self._work_queue = queue.Queue()
+    self._work_queue = _WorkQueue( max_running )
     self._threads = set()
     self._shutdown = False
     self._shutdown_lock = threading.Lock()
 
   def submit( self, fn, *args, **kwargs ):
+    return self.submit_with_priority( INTERACTIVE, fn, *args, **kwargs )
+  submit.__doc__ = _base.Executor.submit.__doc__
+
+  def submit_with_priority( self, priority, fn, *args, **kwargs ):
+    """Same as submit but the call is scheduled with the given |priority|."""
     with self._shutdown_lock:
       if self._shutdown:
         raise RuntimeError( 'cannot schedule new futures after shutdown' )
 
       f = _base.Future()
-      w = _WorkItem( f, fn, args, kwargs )
+      w = _WorkItem( f, fn, args, kwargs, priority )
 
       self._work_queue.put( w )
       self._adjust_thread_count()
       return f
-  submit.__doc__ = _base.Executor.submit.__doc__
 
   def _adjust_thread_count( self ):
     # When the executor gets lost, the weakref callback will wake up
     # the worker threads.
     def weakref_cb( _, q=self._work_queue ):
-      q.put( None )
-    # TODO(bquinlan): Should avoid creating new threads if there are more
-    # idle threads than items in the work queue.
-    if len( self._threads ) < self._max_workers:
+      q.close()
+    # Don't create a new thread if an idle one can pick up the work item.
+    if ( len( self._threads ) < self._max_workers and
+         self._work_queue.needs_worker() ):
       t = threading.Thread( target=_worker,
                             args=( weakref.ref( self, weakref_cb ),
                                    self._work_queue ) )
@@ -109,10 +189,10 @@ class UnsafeThreadPoolExecutor( _base.Executor ):
       t.start()
       self._threads.add( t )
 
-  def shutdown( self, wait=True ):
+  def shutdown( self, wait=True, *, cancel_futures=False ):
     with self._shutdown_lock:
       self._shutdown = True
-      self._work_queue.put( None )
+      self._work_queue.close( cancel_futures )
     if wait:
       for t in self._threads:
         t.join()
@@ -18,8 +18,9 @@
 import vim
 import os
 import json
+import logging
 import re
-from collections import defaultdict, namedtuple
+from collections import OrderedDict, defaultdict, namedtuple
 from functools import lru_cache as memoize
 from ycmd.utils import ( ByteOffsetToCodepointOffset,
                          GetCurrentDirectory,
@@ -51,6 +52,25 @@ NO_SELECTION_MADE_MSG = "No valid selection was made; aborting."
 # those same file names back to their originating buffer numbers.
 MADEUP_FILENAME_TO_BUFFER_NUMBER = {}
 
+# Cache of the data returned by GetBufferData, keyed on the buffer number. Each
+# entry holds the changedtick of the buffer when the data was computed, the data
+# itself, and its size. Least recently used entries are evicted when the total
+# size exceeds BUFFER_DATA_CACHE_MAX_SIZE characters.
+BUFFER_DATA_CACHE = OrderedDict()
+BUFFER_DATA_CACHE_MAX_SIZE = 64 * 1024 * 1024
+_buffer_data_cache_size = 0
+
+# Numbers of the buffers with unsaved changes, kept up to date by the
+# BufModifiedSet, BufUnload, and BufWipeout autocommands. None if these events
+# are not tracked, in which case all buffers are checked on each request.
+MODIFIED_BUFFERS = None
+
+# Buffer numbers by real path of the file, -1 for files without a buffer. Kept
+# up to date through InvalidateBufferNumber called on the BufNew, BufFilePost,
+# and BufWipeout autocommands. None if these events are not tracked, in which
+# case Vim is asked for the buffer number each time.
+BUFFER_NUMBER_FOR_REALPATH = None
+
 NO_COMPLETIONS = {
   'line': -1,
   'column': -1,
@@ -64,6 +84,8 @@ YCM_NEOVIM_NS_ID = vim.eval( 'g:ycm_neovim_ns_id' )
 # we need to keep changing this at the moment
 VIM_VIRTUAL_TEXT_VERSION_REQ = '9.0.214'
 
+_logger = logging.getLogger( __name__ )
+
 
 def CurrentLineAndColumn():
   """Returns the 0-based current line and 0-based current column."""
@@ -123,37 +145,179 @@ def BufferModified( buffer_object ):
 
 
 def GetBufferData( buffer_object ):
-  return {
+  buffer_number = buffer_object.number
+  changedtick = GetBufferChangedTick( buffer_number )
+  cached = BUFFER_DATA_CACHE.get( buffer_number )
+  if cached and changedtick and cached[ 0 ] == changedtick:
+    BUFFER_DATA_CACHE.move_to_end( buffer_number )
+    return dict( cached[ 1 ] )
+
+  buffer_data = {
     # Add a newline to match what gets saved to disk. See #1455 for details.
     'contents': JoinLinesAsUnicode( buffer_object ) + '\n',
     'filetypes': FiletypesForBuffer( buffer_object )
   }
+  # A changedtick of 0 means it couldn't be retrieved.
+  if changedtick:
+    _CacheBufferData( buffer_number, changedtick, buffer_data )
+  return dict( buffer_data )
+
+
+def _CacheBufferData( buffer_number, changedtick, buffer_data ):
+  global _buffer_data_cache_size
+  InvalidateBufferData( buffer_number )
+
+  size = len( buffer_data[ 'contents' ] )
+  if size > BUFFER_DATA_CACHE_MAX_SIZE:
+    return
+
+  BUFFER_DATA_CACHE[ buffer_number ] = ( changedtick, buffer_data, size )
+  _buffer_data_cache_size += size
+  while _buffer_data_cache_size > BUFFER_DATA_CACHE_MAX_SIZE:
+    _, ( _, _, evicted_size ) = BUFFER_DATA_CACHE.popitem( last = False )
+    _buffer_data_cache_size -= evicted_size
+
+
+def InvalidateBufferData( buffer_number ):
+  """Drop the cached data of buffer |buffer_number|. Must be called when the
+  buffer is unloaded or its filetype changes since neither of these update the
+  changedtick of the buffer."""
+  global _buffer_data_cache_size
+  cached = BUFFER_DATA_CACHE.pop( buffer_number, None )
+  if cached:
+    _buffer_data_cache_size -= cached[ 2 ]
 
 
-def GetUnsavedAndSpecifiedBufferData( included_buffer, included_filepath ):
+def ClearBufferDataCache():
+  global _buffer_data_cache_size
+  BUFFER_DATA_CACHE.clear()
+  _buffer_data_cache_size = 0
+
+
+def GetUnsavedAndSpecifiedBufferData( included_buffer,
+                                      included_filepath,
+                                      buffer_sync = None ):
   """Build part of the request containing the contents and filetypes of all
   dirty buffers as well as the buffer |included_buffer| with its filepath
-  |included_filepath|."""
-  buffers_data = { included_filepath: GetBufferData( included_buffer ) }
+  |included_filepath|. If |buffer_sync| is given, it is used to only include
+  the changes since the contents were last sent to the server."""
+  def BufferData( buffer_object, filepath ):
+    if buffer_sync:
+      return buffer_sync.GetBufferData( buffer_object, filepath )
+    return GetBufferData( buffer_object )
 
-  for buffer_object in vim.buffers:
-    if not BufferModified( buffer_object ):
-      continue
+  buffers_data = {
+    included_filepath: BufferData( included_buffer, included_filepath ) }
 
+  for buffer_object in _GetModifiedBuffers():
     filepath = GetBufferFilepath( buffer_object )
     if filepath in buffers_data:
       continue
 
-    buffers_data[ filepath ] = GetBufferData( buffer_object )
+    buffers_data[ filepath ] = BufferData( buffer_object, filepath )
 
   return buffers_data
 
 
+def TrackModifiedBuffers():
+  """Start keeping track of the modified buffers through SetBufferModified
+  instead of checking all buffers on each request."""
+  global MODIFIED_BUFFERS
+  MODIFIED_BUFFERS = { buffer_object.number for buffer_object in vim.buffers
+                       if BufferModified( buffer_object ) }
+
+
+def SetBufferModified( buffer_number, modified ):
+  if MODIFIED_BUFFERS is None:
+    return
+  if modified:
+    MODIFIED_BUFFERS.add( buffer_number )
+  else:
+    MODIFIED_BUFFERS.discard( buffer_number )
+
+
+def _GetModifiedBuffers():
+  if MODIFIED_BUFFERS is None:
+    return [ buffer_object for buffer_object in vim.buffers
+             if BufferModified( buffer_object ) ]
+
+  if _logger.isEnabledFor( logging.DEBUG ):
+    _CheckModifiedBuffers()
+
+  modified_buffers = []
+  for buffer_number in sorted( MODIFIED_BUFFERS ):
+    try:
+      modified_buffers.append( vim.buffers[ buffer_number ] )
+    except KeyError:
+      MODIFIED_BUFFERS.discard( buffer_number )
+  return modified_buffers
+
+
+def _CheckModifiedBuffers():
+  """Compare the tracked modified buffers to the ones found by checking all
+  buffers and fix the tracked ones if they differ."""
+  global MODIFIED_BUFFERS
+  modified_buffers = { buffer_object.number for buffer_object in vim.buffers
+                       if BufferModified( buffer_object ) }
+  if modified_buffers != MODIFIED_BUFFERS:
+    _logger.warning( 'Tracked modified buffers %s differ from actual ones %s',
+                     sorted( MODIFIED_BUFFERS ),
+                     sorted( modified_buffers ) )
+    MODIFIED_BUFFERS = modified_buffers
+
+
+def TrackBufferNumbers():
+  """Start caching the buffer numbers returned by GetBufferNumberForFilename.
+  InvalidateBufferNumber must then be called each time a buffer is created,
+  renamed, or wiped out."""
+  global BUFFER_NUMBER_FOR_REALPATH
+  BUFFER_NUMBER_FOR_REALPATH = {}
+
+
+def InvalidateBufferNumber( buffer_number ):
+  """Forget the files of the buffer |buffer_number| since it was renamed or
+  wiped out, and the files without a buffer since one may have been created
+  for them. The real paths of the files are also forgotten since a symlink
+  may have been changed in the meantime."""
+  _AbsoluteRealPath.cache_clear()
+  if BUFFER_NUMBER_FOR_REALPATH is None:
+    return
+  for realpath in [ realpath for realpath, number in
+                    BUFFER_NUMBER_FOR_REALPATH.items()
+                    if number in ( buffer_number, -1 ) ]:
+    del BUFFER_NUMBER_FOR_REALPATH[ realpath ]
+
+
 def GetBufferNumberForFilename( filename, create_buffer_if_needed = False ):
-  realpath = os.path.realpath( filename )
-  return MADEUP_FILENAME_TO_BUFFER_NUMBER.get( realpath, GetIntValue(
-      f"bufnr('{ EscapeForVim( realpath ) }', "
-             f"{ int( create_buffer_if_needed ) })" ) )
+  realpath = _RealPath( filename )
+  buffer_number = MADEUP_FILENAME_TO_BUFFER_NUMBER.get( realpath )
+  if buffer_number is not None:
+    return buffer_number
+
+  if BUFFER_NUMBER_FOR_REALPATH is not None:
+    buffer_number = BUFFER_NUMBER_FOR_REALPATH.get( realpath )
+    # A buffer may have to be created for a file known not to have one.
+    if ( buffer_number is not None and
+         ( buffer_number != -1 or not create_buffer_if_needed ) ):
+      return buffer_number
+
+  buffer_number = GetIntValue( f"bufnr('{ EscapeForVim( realpath ) }', "
+                                     f"{ int( create_buffer_if_needed ) })" )
+  if BUFFER_NUMBER_FOR_REALPATH is not None:
+    BUFFER_NUMBER_FOR_REALPATH[ realpath ] = buffer_number
+  return buffer_number
+
+
+def _RealPath( filename ):
+  # The real path of a relative path depends on the working directory.
+  if os.path.isabs( filename ):
+    return _AbsoluteRealPath( filename )
+  return os.path.realpath( filename )
+
+
+@memoize( maxsize = 4096 )
+def _AbsoluteRealPath( filename ):
+  return os.path.realpath( filename )
 
 
 def GetCurrentBufferFilepath():
@@ -268,6 +432,24 @@ def GetSignsInBuffer( buffer_number ):
   )[ 0 ][ 'signs' ]
 
 
+def PlaceSigns( buffer_number, signs ):
+  """Place the signs |signs|, a list of ( line, name ) tuples, in the buffer
+  |buffer_number| and return their IDs."""
+  sign_list = [ { 'lnum': line,
+                  'name': name,
+                  'buffer': buffer_number,
+                  'group': 'ycm_signs' } for line, name in signs ]
+  return [ int( sign_id ) for sign_id in
+           vim.eval( f'sign_placelist( { sign_list } )' ) ]
+
+
+def UnplaceSigns( buffer_number, sign_ids ):
+  sign_list = [ { 'id': sign_id,
+                  'buffer': buffer_number,
+                  'group': 'ycm_signs' } for sign_id in sign_ids ]
+  vim.eval( f'sign_unplacelist( { sign_list } )' )
+
+
 class DiagnosticProperty( namedtuple( 'DiagnosticProperty', [ 'id',
                                                               'type',
                                                               'line',
@@ -378,14 +560,34 @@ def AddTextProperty( buffer_number,
                      column,
                      prop_type,
                      extra_args ):
+  return GetIntValue( _AddTextPropertyExpression( buffer_number,
+                                                  line,
+                                                  column,
+                                                  prop_type,
+                                                  extra_args ) )
+
+
+def AddTextProperties( buffer_number, properties ):
+  """Add the text properties |properties| to the buffer |buffer_number| with a
+  single call to Vim. Each property is a tuple of the arguments of
+  AddTextProperty following the buffer number."""
+  _EvalAll( _AddTextPropertyExpression( buffer_number, *prop )
+            for prop in properties )
+
+
+def _AddTextPropertyExpression( buffer_number,
+                                line,
+                                column,
+                                prop_type,
+                                extra_args ):
   if not VimIsNeovim():
     extra_args.update( {
       'type': prop_type,
       'bufnr': buffer_number
     } )
-    return GetIntValue( f'prop_add( { line }, '
-                                  f'{ column }, '
-                                  f'{ json.dumps( extra_args ) } )' )
+    return ( f'prop_add( { line }, '
+                       f'{ column }, '
+                       f'{ json.dumps( extra_args ) } )' )
   else:
     extra_args[ 'hl_group' ] = prop_type
     # Neovim uses 0-based offsets
@@ -395,21 +597,27 @@ def AddTextProperty( buffer_number,
       extra_args[ 'end_col' ] = extra_args.pop( 'end_col' ) - 1
     line -= 1
     column -= 1
-    return GetIntValue( f'nvim_buf_set_extmark( { buffer_number }, '
-                                              f'{ YCM_NEOVIM_NS_ID }, '
-                                              f'{ line }, '
-                                              f'{ column }, '
-                                              f'{ extra_args } )' )
-
-
-def RemoveDiagnosticProperty( buffer_number: int, prop: DiagnosticProperty ):
-  RemoveTextProperty( buffer_number,
-                      prop.line,
-                      prop.id,
-                      prop.type )
-
-
-def RemoveTextProperty( buffer_number, line_num, prop_id, prop_type ):
+    return ( f'nvim_buf_set_extmark( { buffer_number }, '
+                                   f'{ YCM_NEOVIM_NS_ID }, '
+                                   f'{ line }, '
+                                   f'{ column }, '
+                                   f'{ extra_args } )' )
+
+
+def RemoveDiagnosticProperties( buffer_number, props ):
+  """Remove the text properties |props| returned by GetTextProperties from the
+  buffer |buffer_number| with a single call to Vim."""
+  _EvalAll( _RemoveTextPropertyExpression( buffer_number,
+                                           prop.line,
+                                           prop.id,
+                                           prop.type )
+            for prop in props )
+
+
+def _RemoveTextPropertyExpression( buffer_number,
+                                   line_num,
+                                   prop_id,
+                                   prop_type ):
   if not VimIsNeovim():
     p = {
       'bufnr': buffer_number,
@@ -418,11 +626,19 @@ def RemoveTextProperty( buffer_number, line_num, prop_id, prop_type ):
       'both': 1,
       'all': 1
     }
-    vim.eval( f'prop_remove( { p }, { line_num } )' )
+    return f'prop_remove( { p }, { line_num } )'
   else:
-    vim.eval( f'nvim_buf_del_extmark( { buffer_number }, '
-                                    f'{ YCM_NEOVIM_NS_ID }, '
-                                    f'{ prop_id } )' )
+    return ( f'nvim_buf_del_extmark( { buffer_number }, '
+                                   f'{ YCM_NEOVIM_NS_ID }, '
+                                   f'{ prop_id } )' )
+
+
+def _EvalAll( expressions ):
+  """Evaluate the Vim |expressions| in a list so that it takes a single call to
+  Vim instead of one per expression, which is costly when there are many."""
+  expressions = list( expressions )
+  if expressions:
+    vim.eval( f'[ { ", ".join( expressions ) } ]' )
 
 
 # Clamps the line and column numbers so that they are not past the contents of
@@ -1513,6 +1729,12 @@ def DisplayWidth():
   return GetIntValue( '&columns' )
 
 
+def AmbiguousCharacterWidth():
+  """Return the display width of the East Asian characters of ambiguous width
+  according to the 'ambiwidth' option."""
+  return 2 if ToUnicode( vim.options[ 'ambiwidth' ] ) == 'double' else 1
+
+
 def DisplayWidthOfString( s ):
   return GetIntValue( f"strdisplaywidth( '{ EscapeForVim( s ) }' )" )
 
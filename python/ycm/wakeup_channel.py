@@ -0,0 +1,120 @@
+# Copyright (C) 2026 YouCompleteMe contributors
+#
+# This file is part of YouCompleteMe.
+#
+# YouCompleteMe is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# YouCompleteMe is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with YouCompleteMe.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import secrets
+import socket
+import threading
+from hmac import compare_digest
+
+_logger = logging.getLogger( __name__ )
+
+# Seconds to wait for Vim to connect to the channel and send the token.
+_ACCEPT_TIMEOUT_SEC = 1
+_TOKEN_LENGTH = 16
+
+
+class WakeupChannel:
+  """Local socket Vim connects to with ch_open so that it's notified as soon as
+  a response is received from the server instead of polling for it with
+  timers. A newline is written to the socket each time Notify is called, which
+  happens on the worker threads when a request is done.
+
+  Since any local process could connect to the socket, Vim must send the token
+  returned by Open followed by a newline once connected."""
+
+  def __init__( self ):
+    self._listener = None
+    self._connection = None
+    self._token = None
+    self._lock = threading.Lock()
+
+
+  def Open( self ):
+    """Start listening on a port of the loopback interface. Return the address
+    Vim should connect to and the token it should send, or None if the socket
+    couldn't be created."""
+    try:
+      self._listener = socket.socket( socket.AF_INET, socket.SOCK_STREAM )
+      self._listener.bind( ( '127.0.0.1', 0 ) )
+      self._listener.listen( 1 )
+      self._listener.settimeout( _ACCEPT_TIMEOUT_SEC )
+    except OSError:
+      _logger.exception( 'Failed to create the wakeup channel' )
+      self.Close()
+      return None
+    self._token = secrets.token_hex( _TOKEN_LENGTH )
+    port = self._listener.getsockname()[ 1 ]
+    # Not localhost, which Vim may resolve to the IPv6 loopback address first.
+    return { 'address': f'127.0.0.1:{ port }', 'token': self._token }
+
+
+  def Accept( self ):
+    """Accept the connection from Vim. Return True if it sent the right token,
+    False otherwise in which case the channel is closed."""
+    if not self._listener:
+      return False
+    try:
+      connection, _ = self._listener.accept()
+      connection.settimeout( _ACCEPT_TIMEOUT_SEC )
+      token = connection.makefile( 'rb' ).readline().strip()
+    except OSError:
+      _logger.exception( 'Failed to accept the wakeup channel connection' )
+      self.Close()
+      return False
+
+    self._listener.close()
+    self._listener = None
+    if not compare_digest( token, self._token.encode() ):
+      _logger.error( 'Invalid token received on the wakeup channel' )
+      connection.close()
+      self.Close()
+      return False
+
+    # Notify must never block the worker threads. If the socket buffer is full,
+    # Vim has not read the previous notifications yet and will be woken up
+    # anyway.
+    connection.setblocking( False )
+    with self._lock:
+      self._connection = connection
+    return True
+
+
+  def Notify( self, *args ):
+    """Wake Vim up. Extra arguments are ignored so that this method can be used
+    as a done callback of futures."""
+    with self._lock:
+      if not self._connection:
+        return
+      try:
+        self._connection.send( b'\n' )
+      except BlockingIOError:
+        pass
+      except OSError:
+        _logger.exception( 'Failed to notify Vim on the wakeup channel' )
+        self._connection.close()
+        self._connection = None
+
+
+  def Close( self ):
+    if self._listener:
+      self._listener.close()
+      self._listener = None
+    with self._lock:
+      if self._connection:
+        self._connection.close()
+        self._connection = None
@@ -20,23 +20,31 @@ import json
 import logging
 import os
 import signal
+import socket
 import vim
 from subprocess import PIPE
-from tempfile import NamedTemporaryFile
-from ycm import base, paths, signature_help, vimsupport
+from tempfile import gettempdir, NamedTemporaryFile
+from ycm import base, candidate_filter, paths, signature_help, vimsupport
 from ycm.buffer import BufferDict
+from ycm.buffer_sync import BufferSync, INCREMENTAL_FILE_DATA_CAPABILITY
+from ycm.wakeup_channel import WakeupChannel
 from ycmd import utils
 from ycmd.request_wrap import RequestWrap
 from ycm.omni_completer import OmniCompleter
 from ycm import syntax_parse
 from ycm.client.ycmd_keepalive import YcmdKeepalive
-from ycm.client.base_request import BaseRequest, BuildRequestData
+from ycm.client.base_request import ( BaseRequest,
+                                      BuildRequestData,
+                                      GZIP_CAPABILITY )
 from ycm.client.completer_available_request import SendCompleterAvailableRequest
 from ycm.client.command_request import ( SendCommandRequest,
                                          SendCommandRequestAsync,
                                          GetCommandResponse )
-from ycm.client.completion_request import CompletionRequest
-from ycm.client.resolve_completion_request import ResolveCompletionItem
+from ycm.client.completion_request import ( CompletionRequest,
+                                            SpeculativeCompletionRequest )
+from ycm.client.resolve_completion_request import ( ResolveAheadCache,
+                                                    ResolveCompletionItem,
+                                                    ResolveCompletionRequest )
 from ycm.client.signature_help_request import ( SignatureHelpRequest,
                                                 SigHelpAvailableByFileType )
 from ycm.client.debug_info_request import ( SendDebugInfoRequest,
@@ -45,6 +53,8 @@ from ycm.client.omni_completion_request import OmniCompletionRequest
 from ycm.client.event_notification import SendEventNotificationAsync
 from ycm.client.shutdown_request import SendShutdownRequest
 from ycm.client.messages_request import MessagesPoll
+from ycm.client.server_capabilities_request import (
+    SendServerCapabilitiesRequest )
 
 
 def PatchNoProxy():
@@ -90,11 +100,33 @@ PYTHON_TOO_OLD_MESSAGE = (
 SERVER_IDLE_SUICIDE_SECONDS = 1800  # 30 minutes
 CLIENT_LOGFILE_FORMAT = 'ycm_'
 SERVER_LOGFILE_FORMAT = 'ycmd_{port}_{std}_'
+SERVER_UNIX_SOCKET_FORMAT = 'ycmd_{id}.sock'
+# Maximum length of a Unix domain socket path (sun_path minus the terminating
+# null byte) on the most restrictive platforms.
+UNIX_SOCKET_PATH_MAX_LENGTH = 103
+# Exit code of ycmd when given an argument it doesn't know about, e.g. the
+# --unix_socket one for older versions.
+EXIT_CODE_INVALID_ARGUMENTS = 2
 
 # Flag to set a file handle inheritable by child processes on Windows. See
 # https://msdn.microsoft.com/en-us/library/ms724935.aspx
 HANDLE_FLAG_INHERIT = 0x00000001
 
+# Default semantic triggers of ycmd made of several characters. When the first
+# characters of one of them are typed, the rest can be predicted. See
+# SendSpeculativeCompletionRequest.
+DEFAULT_MULTI_CHARACTER_SEMANTIC_TRIGGERS = {
+  'c': [ '->' ],
+  'cpp': [ '->', '::' ],
+  'cuda': [ '->', '::' ],
+  'objc': [ '->' ],
+  'objcpp': [ '->', '::' ],
+  'perl': [ '->' ],
+  'php': [ '->', '::' ],
+  'ruby': [ '::' ],
+  'rust': [ '::' ],
+}
+
 
 class YouCompleteMe:
   def __init__( self, default_options = {} ):
@@ -103,7 +135,14 @@ class YouCompleteMe:
     self._server_stdout = None
     self._server_stderr = None
     self._server_popen = None
+    self._server_unix_socket = None
+    self._unix_socket_unsupported = False
     self._default_options = default_options
+    self._wakeup_channel = None
+    # Indexes of the finder symbols by id. They are kept when the server is
+    # restarted.
+    self._symbol_indexes = {}
+    self._next_symbol_index_id = 0
     self._ycmd_keepalive = YcmdKeepalive()
     self._SetUpLogging()
     self._SetUpServer()
@@ -118,10 +157,18 @@ class YouCompleteMe:
     self._message_poll_requests = {}
 
     self._latest_completion_request = None
+    self._speculative_completion_request = None
+    self._speculative_completion_hits = 0
+    self._speculative_completion_misses = 0
+    self._resolve_ahead_cache = ResolveAheadCache()
+    self._next_completion_page = None
     self._latest_signature_help_request = None
     self._signature_help_available_requests = SigHelpAvailableByFileType()
     self._command_requests = {}
     self._next_command_request_id = 0
+    self._filter_items = None
+    self._filter_sort_property = None
+    self._filter_index = None
 
     self._signature_help_state = signature_help.SignatureHelpState()
     self._user_options = base.GetUserOptions( self._default_options )
@@ -141,10 +188,24 @@ class YouCompleteMe:
     with NamedTemporaryFile( delete = False, mode = 'w+' ) as options_file:
       json.dump( options_dict, options_file )
 
-    server_port = utils.GetUnusedLocalhostPort()
-
-    BaseRequest.server_location = 'http://127.0.0.1:' + str( server_port )
+    random_suffix = base64.b32encode( os.urandom( 5 ) ).decode().lower()
+    server_id = f'{ os.getpid() }_{ random_suffix }'
+    self._server_unix_socket = self._GetServerUnixSocketPath( server_id )
+    if self._server_unix_socket:
+      # The host is only used for the Host header of the requests.
+      BaseRequest.server_location = 'http://localhost'
+      server_address_arg = f'--unix_socket={ self._server_unix_socket }'
+    else:
+      server_port = utils.GetUnusedLocalhostPort()
+      server_id = server_port
+      BaseRequest.server_location = 'http://127.0.0.1:' + str( server_port )
+      server_address_arg = f'--port={ server_port }'
+    BaseRequest.server_unix_socket = self._server_unix_socket
     BaseRequest.hmac_secret = hmac_secret
+    BaseRequest.connection_pool.Reset()
+    BaseRequest.server_capabilities = frozenset()
+    BaseRequest.buffer_sync = None
+    BaseRequest.compression_threshold = 0
 
     try:
       python_interpreter = paths.PathToPythonInterpreter()
@@ -159,15 +220,15 @@ class YouCompleteMe:
 
     args = [ python_interpreter,
              paths.PathToServerScript(),
-             f'--port={ server_port }',
+             server_address_arg,
              f'--options_file={ options_file.name }',
              f'--log={ self._user_options[ "log_level" ] }',
              f'--idle_suicide_seconds={ SERVER_IDLE_SUICIDE_SECONDS }' ]
 
     self._server_stdout = utils.CreateLogfile(
-        SERVER_LOGFILE_FORMAT.format( port = server_port, std = 'stdout' ) )
+        SERVER_LOGFILE_FORMAT.format( port = server_id, std = 'stdout' ) )
     self._server_stderr = utils.CreateLogfile(
-        SERVER_LOGFILE_FORMAT.format( port = server_port, std = 'stderr' ) )
+        SERVER_LOGFILE_FORMAT.format( port = server_id, std = 'stderr' ) )
     args.append( f'--stdout={ self._server_stdout }' )
     args.append( f'--stderr={ self._server_stderr }' )
 
@@ -178,6 +239,33 @@ class YouCompleteMe:
                                           stdout = PIPE, stderr = PIPE )
 
 
+  def _GetServerUnixSocketPath( self, server_id ):
+    """Return the path of the Unix domain socket the server should listen on or
+    None if it should listen on a TCP port instead."""
+    if ( not self._user_options[ 'server_use_unix_socket' ] or
+         self._unix_socket_unsupported ):
+      return None
+    if utils.OnWindows() or not hasattr( socket, 'AF_UNIX' ):
+      self._logger.info( 'Unix domain sockets are not supported on this '
+                         'platform; using TCP to talk to ycmd' )
+      return None
+    # Prefer the per-user runtime directory since it is not readable by other
+    # users. The HMAC still authenticates every request either way.
+    directory = os.environ.get( 'XDG_RUNTIME_DIR' ) or gettempdir()
+    path = os.path.join( directory,
+                         SERVER_UNIX_SOCKET_FORMAT.format( id = server_id ) )
+    if len( os.fsencode( path ) ) > UNIX_SOCKET_PATH_MAX_LENGTH:
+      self._logger.info( 'Unix domain socket path %s is too long; '
+                         'using TCP to talk to ycmd', path )
+      return None
+    return path
+
+
+  def _RemoveServerUnixSocket( self ):
+    if self._server_unix_socket:
+      utils.RemoveIfExists( self._server_unix_socket )
+
+
   def _SetUpLogging( self ):
     def FreeFileFromOtherProcesses( file_object ):
       if utils.OnWindows():
@@ -227,13 +315,41 @@ class YouCompleteMe:
     if not self._server_is_ready_with_cache and self.IsServerAlive():
       self._server_is_ready_with_cache = BaseRequest().GetDataFromHandler(
           'ready', display_message = False )
+      if self._server_is_ready_with_cache:
+        self._NegotiateServerCapabilities()
     return self._server_is_ready_with_cache
 
 
+  def _NegotiateServerCapabilities( self ):
+    BaseRequest.server_capabilities = SendServerCapabilitiesRequest()
+    if ( self._user_options[ 'incremental_buffer_sync' ] and
+         INCREMENTAL_FILE_DATA_CAPABILITY in BaseRequest.server_capabilities ):
+      BaseRequest.buffer_sync = BufferSync()
+    if GZIP_CAPABILITY in BaseRequest.server_capabilities:
+      BaseRequest.compression_threshold = max(
+        self._user_options[ 'server_compression_threshold' ], 0 )
+
+
   def IsServerReady( self ):
     return self._server_is_ready_with_cache
 
 
+  def RestartServerOverTcpIfNeeded( self ):
+    """Start the server again listening on a TCP port if it exited because it
+    doesn't support Unix domain sockets. Return True if it was restarted."""
+    if ( not self._server_unix_socket or
+         not self._server_popen or
+         self.IsServerAlive() or
+         self._server_popen.poll() != EXIT_CODE_INVALID_ARGUMENTS ):
+      return False
+    self._logger.warning( 'ycmd does not support Unix domain sockets; '
+                          'falling back to TCP' )
+    self._unix_socket_unsupported = True
+    self._RemoveServerUnixSocket()
+    self._SetUpServer()
+    return True
+
+
   def NotifyUserIfServerCrashed( self ):
     if ( not self._server_popen or self._user_notified_about_crash or
          self.IsServerAlive() ):
@@ -276,33 +392,189 @@ class YouCompleteMe:
   def RestartServer( self ):
     vimsupport.PostVimMessage( 'Restarting ycmd server...' )
     self._ShutdownServer()
+    self._RemoveServerUnixSocket()
     self._SetUpServer()
 
 
   def SendCompletionRequest( self, force_semantic = False ):
+    if self._latest_completion_request:
+      self._latest_completion_request.Cancel()
+    if self._next_completion_page:
+      self._next_completion_page.Cancel()
+      self._next_completion_page = None
+
     request_data = BuildRequestData()
     request_data[ 'force_semantic' ] = force_semantic
 
     if not self.NativeFiletypeCompletionUsable():
       wrapped_request_data = RequestWrap( request_data )
       if self._omnicomp.ShouldUseNow( wrapped_request_data ):
+        self._resolve_ahead_cache.Reset()
         self._latest_completion_request = OmniCompletionRequest(
             self._omnicomp, wrapped_request_data )
         self._latest_completion_request.Start()
         return
 
     self._AddExtraConfDataIfNeeded( request_data )
-    self._latest_completion_request = CompletionRequest( request_data )
+    speculative_request = self._TakeSpeculativeCompletionRequest(
+      request_data )
+    if speculative_request:
+      self._resolve_ahead_cache.Reset()
+      self._latest_completion_request = speculative_request
+      return
+
+    # When more characters of the same identifier are typed, the candidates
+    # previously returned by the server are filtered again instead.
+    if self._latest_completion_request:
+      refined_request = self._latest_completion_request.Refine( request_data )
+      if refined_request:
+        self._latest_completion_request = refined_request
+        return
+
+    self._resolve_ahead_cache.Reset()
+    self._latest_completion_request = CompletionRequest(
+      request_data, self._user_options[ 'completion_page_size' ] )
     self._latest_completion_request.Start()
 
 
+  def SendSpeculativeCompletionRequest( self, idle = False ):
+    """Send a completion request ahead of time at a low priority for the text
+    the current buffer is expected to contain after the next keystrokes: the
+    rest of a semantic trigger when its first characters were just typed or,
+    if |idle|, the current text. SendCompletionRequest uses its response if
+    the prediction is right."""
+    if ( not self._user_options[ 'speculative_completion' ] or
+         not self.NativeFiletypeCompletionUsable() ):
+      return
+
+    line_num, column = vimsupport.CurrentLineAndColumn()
+    line = utils.ToBytes( vimsupport.CurrentLineContents() )
+    filetypes = vimsupport.CurrentFiletypes()
+    rest_of_trigger = self._RestOfSemanticTrigger(
+      utils.ToUnicode( line[ : column ] ), filetypes[ 0 ] )
+    if rest_of_trigger is None:
+      if not idle:
+        return
+      rest_of_trigger = ''
+
+    inserted_text = utils.ToBytes( rest_of_trigger )
+    predicted_line = utils.ToUnicode(
+      line[ : column ] + inserted_text + line[ column : ] )
+    buffer_number = vimsupport.GetCurrentBufferNumber()
+    # Each typed character increments the changedtick.
+    changedtick = ( vimsupport.GetBufferChangedTick( buffer_number ) +
+                    len( rest_of_trigger ) )
+
+    current_buffer = vim.current.buffer
+    filepath = vimsupport.GetBufferFilepath( current_buffer )
+    position = {
+      'filepath': filepath,
+      'line_num': line_num + 1,
+      'column_num': column + len( inserted_text ) + 1,
+      'force_semantic': False
+    }
+    speculative_request = self._speculative_completion_request
+    if speculative_request and speculative_request.Predicts(
+        position, predicted_line, changedtick ):
+      return
+    if speculative_request:
+      speculative_request.Cancel()
+
+    request_data = BuildRequestData()
+    request_data.update( position )
+    lines = [ utils.ToUnicode( buffer_line )
+              for buffer_line in current_buffer[ : ] ]
+    lines[ line_num ] = predicted_line
+    # The predicted contents may never be in the buffer so they are sent without
+    # a version. The server doesn't keep them and they are not used as the base
+    # of the next changes.
+    request_data[ 'file_data' ][ filepath ] = {
+      # Add a newline to match what gets saved to disk. See #1455 for details.
+      'contents': '\n'.join( lines ) + '\n',
+      'filetypes': filetypes
+    }
+
+    self._AddExtraConfDataIfNeeded( request_data )
+    self._speculative_completion_request = SpeculativeCompletionRequest(
+      request_data,
+      predicted_line,
+      changedtick,
+      self._user_options[ 'completion_page_size' ] )
+    self._speculative_completion_request.Start()
+
+
+  def _RestOfSemanticTrigger( self, text_before_cursor, filetype ):
+    """Return the characters completing a semantic trigger of |filetype| if
+    |text_before_cursor| ends with its first ones, None otherwise."""
+    triggers = set( DEFAULT_MULTI_CHARACTER_SEMANTIC_TRIGGERS.get( filetype,
+                                                                   [] ) )
+    for filetypes, user_triggers in (
+        self._user_options[ 'semantic_triggers' ].items() ):
+      if filetype in filetypes.split( ',' ):
+        triggers.update( trigger for trigger in user_triggers
+                         if not trigger.startswith( 're!' ) )
+
+    for trigger in sorted( triggers, key = len, reverse = True ):
+      if text_before_cursor.endswith( trigger ):
+        continue
+      for length in range( len( trigger ) - 1, 0, -1 ):
+        if text_before_cursor.endswith( trigger[ : length ] ):
+          return trigger[ length : ]
+    return None
+
+
+  def _TakeSpeculativeCompletionRequest( self, request_data ):
+    """Return the pending speculative completion request if it answers the
+    request for |request_data|, directly or by refining its candidates, None
+    otherwise."""
+    speculative_request = self._speculative_completion_request
+    if not speculative_request:
+      return None
+    self._speculative_completion_request = None
+
+    line = vimsupport.CurrentLineContents()
+    changedtick = vimsupport.GetBufferChangedTick(
+      vimsupport.GetCurrentBufferNumber() )
+    if speculative_request.Predicts( request_data, line, changedtick ):
+      self._speculative_completion_hits += 1
+      return speculative_request
+
+    refined_request = speculative_request.Refine( request_data )
+    if refined_request:
+      self._speculative_completion_hits += 1
+      return refined_request
+
+    self._speculative_completion_misses += 1
+    speculative_request.Cancel()
+    return None
+
+
   def CompletionRequestReady( self ):
     return bool( self._latest_completion_request and
                  self._latest_completion_request.Done() )
 
 
   def GetCompletionResponse( self ):
-    return self._latest_completion_request.Response()
+    completion_request = self._latest_completion_request
+    response = completion_request.Response()
+    # Only a page of the completions may have been returned. Fetch the next one
+    # in the background so that it's ready when the user scrolls past the end
+    # of the menu.
+    if ( self._next_completion_page is None and
+         isinstance( completion_request, CompletionRequest ) ):
+      self._next_completion_page = completion_request.NextPage()
+    return response
+
+
+  def ShowNextCompletionPage( self ):
+    """Make the request for the page of completions following the current one
+    the current completion request. Return False if there is no such page."""
+    if not self._next_completion_page:
+      return False
+    self._resolve_ahead_cache.Reset()
+    self._latest_completion_request = self._next_completion_page
+    self._next_completion_page = None
+    return True
 
 
   def SignatureHelpAvailableRequestComplete( self, filetype, send_new=True ):
@@ -345,6 +617,8 @@ class YouCompleteMe:
 
       self._AddExtraConfDataIfNeeded( request_data )
 
+      if self._latest_signature_help_request:
+        self._latest_signature_help_request.Cancel()
       self._latest_signature_help_request = SignatureHelpRequest( request_data )
       self._latest_signature_help_request.Start()
       return True
@@ -454,6 +728,12 @@ class YouCompleteMe:
     self._command_requests.pop( request_id, None )
 
 
+  def CancelCommandRequest( self, request_id ):
+    request = self._command_requests.pop( request_id, None )
+    if request:
+      request.Cancel()
+
+
   def GetDefinedSubcommands( self ):
     request = BaseRequest()
     subcommands = request.PostDataToHandler( BuildRequestData(),
@@ -576,6 +856,8 @@ class YouCompleteMe:
 
   def OnBufferUnload( self, deleted_buffer_number ):
     SendEventNotificationAsync( 'BufferUnload', deleted_buffer_number )
+    if BaseRequest.buffer_sync:
+      BaseRequest.buffer_sync.ForgetBuffer( deleted_buffer_number )
 
 
   def UpdateMatches( self ):
@@ -614,6 +896,8 @@ class YouCompleteMe:
 
 
   def OnInsertLeave( self ):
+    # The buffer may change anywhere before the next completion request.
+    self._omnicomp.InvalidateCache()
     async_diags = any( self._message_poll_requests.get( filetype )
                       for filetype in vimsupport.CurrentFiletypes() )
     if ( not self._user_options[ 'update_diagnostics_in_insert_mode' ] and
@@ -633,8 +917,35 @@ class YouCompleteMe:
         utils.RemoveIfExists( self._client_logfile )
 
 
+  def OpenWakeupChannel( self ):
+    """Create the channel notifying Vim when responses are received. Return the
+    address Vim should connect to and the token it should send then, or None if
+    it couldn't be created. See WakeupChannel."""
+    self.CloseWakeupChannel()
+    self._wakeup_channel = WakeupChannel()
+    return self._wakeup_channel.Open()
+
+
+  def AcceptWakeupChannel( self ):
+    """Return True if Vim is now connected to the wakeup channel."""
+    if not self._wakeup_channel or not self._wakeup_channel.Accept():
+      self.CloseWakeupChannel()
+      return False
+    BaseRequest.wakeup_channel = self._wakeup_channel
+    return True
+
+
+  def CloseWakeupChannel( self ):
+    BaseRequest.wakeup_channel = None
+    if self._wakeup_channel:
+      self._wakeup_channel.Close()
+      self._wakeup_channel = None
+
+
   def OnVimLeave( self ):
+    self.CloseWakeupChannel()
     self._ShutdownServer()
+    self._RemoveServerUnixSocket()
     self._CleanLogfile()
 
 
@@ -664,7 +975,8 @@ class YouCompleteMe:
     if not completion_request:
       return False
 
-    request  = ResolveCompletionItem( completion_request, item )
+    request = ( self._resolve_ahead_cache.Take( completion_request, item ) or
+                ResolveCompletionItem( completion_request, item ) )
     if not request:
       return False
 
@@ -672,6 +984,22 @@ class YouCompleteMe:
     return True
 
 
+  def ResolveCompletionItemsAhead( self, selected = -1 ):
+    """Resolve in the background the items of the current completion response
+    the user is likely to select next: the first ones if |selected| is
+    negative, the neighbours of the item at the |selected| index otherwise.
+    ResolveCompletionItem then uses their responses."""
+    completion_request = self.GetCurrentCompletionRequest()
+    if isinstance( completion_request, ResolveCompletionRequest ):
+      completion_request = completion_request.completion_request
+    if not completion_request:
+      return
+    self._resolve_ahead_cache.ResolveAhead(
+      completion_request,
+      self._user_options[ 'completion_resolve_ahead' ],
+      selected )
+
+
   def GetErrorCount( self ):
     return self.CurrentBuffer().GetErrorCount()
 
@@ -751,6 +1079,17 @@ class YouCompleteMe:
                     str( vimsupport.VimSupportsVirtualText() ) )
     debug_info += ( '\nPopup windows supported: ' +
                     str( vimsupport.VimSupportsPopupWindows() ) )
+    connection_pool = BaseRequest.connection_pool
+    debug_info += ( '\nServer connection pool: '
+                    f'{ connection_pool.hits } hits, '
+                    f'{ connection_pool.misses } misses' )
+    debug_info += ( '\nSpeculative completion: '
+                    f'{ self._speculative_completion_hits } hits, '
+                    f'{ self._speculative_completion_misses } misses' )
+    debug_info += ( '\nRequest body compression: ' +
+                    str( BaseRequest.request_compression_stats ) )
+    debug_info += ( '\nResponse body compression: ' +
+                    str( BaseRequest.response_compression_stats ) )
     return debug_info
 
 
@@ -908,12 +1247,45 @@ class YouCompleteMe:
                           sort_property,
                           query,
                           max_items = 0 ):
-    return BaseRequest().PostDataToHandler( {
-      'candidates': items,
-      'sort_property': sort_property,
-      'max_num_candidates': max_items,
-      'query': vimsupport.ToUnicode( query )
-    }, 'filter_and_sort_candidates' )
+    # The same items are usually filtered again each time a character of the
+    # query is typed so the index of the last ones is kept.
+    if ( self._filter_items != items or
+         self._filter_sort_property != sort_property ):
+      self._filter_items = items
+      self._filter_sort_property = sort_property
+      self._filter_index = candidate_filter.CandidateIndex( items,
+                                                            sort_property )
+    return self._filter_index.FilterAndSort( vimsupport.ToUnicode( query ),
+                                             max_items )
+
+
+  def CreateSymbolIndex( self ):
+    """Create an empty index of the symbols found by the finder and return its
+    id. Symbols are matched against queries on their 'key' property. Keeping
+    them in Python means that they don't have to be sent again from Vim for
+    each query."""
+    index_id = self._next_symbol_index_id
+    self._next_symbol_index_id += 1
+    self._symbol_indexes[ index_id ] = candidate_filter.CandidateIndex( [],
+                                                                        'key' )
+    return index_id
+
+
+  def AddToSymbolIndex( self, index_id, symbols ):
+    self._symbol_indexes[ index_id ].Extend( symbols )
+
+
+  def FilterAndSortSymbolIndex( self, index_id, query, max_items = 0 ):
+    return self._symbol_indexes[ index_id ].FilterAndSort(
+      vimsupport.ToUnicode( query ), max_items )
+
+
+  def GetSymbolIndexItems( self, index_id ):
+    return self._symbol_indexes[ index_id ].Candidates()
+
+
+  def DeleteSymbolIndex( self, index_id ):
+    self._symbol_indexes.pop( index_id, None )
 
 
   def ToggleSignatureHelp( self ):